@@ -1,5 +1,21 @@
 # backend/controllers/cart_controller.py
 
+from bson import ObjectId
+from backend.services.db_connection import get_collection
+from backend.services.data_version import bump
+from backend.services.reserva_service import (
+    reservar, liberar, get_reservas, convertir, devolver, marcar_pedido
+)
+from backend.services.checkout_service import (
+    checkout as checkout_carrito, checkout_en_sesion, normalizar_lineas
+)
+from backend.services.transaction_service import run_in_transaction
+from config.env import COLLECTION_MATERIALES, COLLECTION_PEDIDOS
+
+materiales = get_collection(COLLECTION_MATERIALES)
+pedidos = get_collection(COLLECTION_PEDIDOS)
+
+
 def calculate_total(cart_items):
     return sum(item["price"] * item["quantity"] for item in cart_items)
 
@@ -11,3 +27,94 @@ def add_to_cart(cart, product, quantity):
         "quantity": quantity
     })
     return cart
+
+
+# 🛒 CARRITO CON APARTADO DE EXISTENCIA
+
+def agregar_al_carrito(carrito_id, material_id, cantidad=1):
+    """Aparta existencia para el carrito; lanza StockInsuficienteError si no alcanza."""
+    reservar(carrito_id, material_id, cantidad)
+
+
+def quitar_del_carrito(carrito_id, material_id=None):
+    """Devuelve al inventario un material del carrito, o todo el carrito si material_id es None."""
+    return liberar(carrito_id, material_id)
+
+
+def _precios_actuales(material_ids):
+    docs = materiales.find({"_id": {"$in": list(material_ids)}}, {"descripcion": 1, "costo_promedio": 1})
+    return {d["_id"]: d for d in docs}
+
+
+def get_carrito(carrito_id):
+    """
+    Líneas vigentes del carrito con el precio actual del material (no el del
+    momento en que se agregó): [{material_id, name, price, quantity, expira_en}].
+    """
+    apartados = get_reservas(carrito_id)
+    actuales = _precios_actuales(r["material_id"] for r in apartados)
+    items = []
+    for r in apartados:
+        material = actuales.get(r["material_id"]) or {}
+        items.append({
+            "material_id": str(r["material_id"]),
+            "name": material.get("descripcion", "Material eliminado"),
+            "price": material.get("costo_promedio", r.get("precio", 0)) or 0,
+            "quantity": r["cantidad"],
+            "expira_en": r["expira_en"],
+        })
+    return items
+
+
+def confirmar_pedido(carrito_id, user_id):
+    """
+    Convierte los apartados vigentes del carrito en un pedido (order_schema)
+    en una sola transacción y devuelve su _id. Lanza ValueError si el carrito
+    está vacío, sus apartados vencieron o algún material ya no existe.
+    """
+    def _confirmar(session):
+        convertidas = convertir(carrito_id, session)
+        if not convertidas:
+            raise ValueError("El carrito está vacío o sus apartados vencieron.")
+        try:
+            lineas = normalizar_lineas(
+                {"material_id": r["material_id"], "quantity": r["cantidad"]} for r in convertidas
+            )
+            # Lo apartado ya salió de existencia: se descuenta de reservado
+            pedido, fallas = checkout_en_sesion(
+                lineas, user_id, session, campo="reservado", extra={"carrito_id": carrito_id}
+            )
+            if pedido is None:
+                raise ValueError(f"No se pudo registrar el pedido: {len(fallas)} líneas con fallas.")
+        except Exception:
+            # Sin transacción, checkout_en_sesion ya repuso lo descontado de
+            # reservado; falta devolver los apartados al inventario
+            if session is None:
+                devolver(convertidas)
+            raise
+        marcar_pedido([r["_id"] for r in convertidas], pedido["_id"], session)
+        return str(pedido["_id"])
+
+    pedido_id = run_in_transaction(_confirmar)
+    bump(COLLECTION_MATERIALES)
+    return pedido_id
+
+
+def checkout(cart_items, user_id, parcial=False):
+    """
+    Checkout de un carrito sin apartados (líneas de add_to_cart). Valida los
+    precios contra el costo_promedio vigente y devuelve las fallas por línea.
+    """
+    resultado = checkout_carrito(cart_items, user_id, parcial=parcial)
+    if resultado["pedido_id"]:
+        bump(COLLECTION_MATERIALES)
+    return resultado
+
+
+def get_pedido(pedido_id):
+    pedido = pedidos.find_one({"_id": ObjectId(pedido_id)})
+    if pedido:
+        pedido["_id"] = str(pedido["_id"])
+        for item in pedido.get("items", []):
+            item["product_id"] = str(item["product_id"])
+    return pedido
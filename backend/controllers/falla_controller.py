@@ -1,33 +1,213 @@
 from backend.services.db_connection import get_collection
-from config.env import COLLECTION_FALLAS
+from config.env import COLLECTION_FALLAS, COLLECTION_MATERIALES
 from bson import ObjectId
+from datetime import datetime
+from backend.services.stock_service import (
+    agrupar_lineas, descontar_existencias, reponer_existencias
+)
+from backend.services.transaction_service import run_in_transaction
+from backend.services.consumo_service import invalidar_consumo
+from backend.services.data_version import bump
+from backend.models.records import Falla, CODEC_RAW
+from backend.services import falla_vista_service
+from backend.services.falla_fechas import como_fecha, normalizar_fechas
 
 collection = get_collection(COLLECTION_FALLAS)
+_lectura = collection.with_options(codec_options=CODEC_RAW)
+
+# Índices compuestos para las consultas de reportes; todos terminan en
+# (fecha, _id) para servir el orden y la paginación por llave sin ordenar en memoria.
+FALLA_INDEXES = [
+    [("lugar_id", 1), ("fecha", -1), ("_id", -1)],
+    [("vehiculo.eco", 1), ("fecha", -1), ("_id", -1)],
+    [("vehiculo.placas", 1), ("fecha", -1), ("_id", -1)],
+    [("usuario_reporta.correo", 1), ("fecha", -1), ("_id", -1)],
+    [("fecha", -1), ("_id", -1)],
+]
+_indexes_ready = False
+
+def ensure_falla_indexes():
+    """
+    Crea los índices de reportes y convierte a fecha las `fecha` antiguas en
+    texto o ausentes, que la paginación no sabría ordenar (idempotente, una
+    vez por proceso).
+    """
+    global _indexes_ready
+    if not _indexes_ready:
+        for keys in FALLA_INDEXES:
+            collection.create_index(keys)
+        normalizar_fechas()
+        # La vista materializada se consulta con los mismos filtros y orden
+        falla_vista_service.ensure_vista_indexes(FALLA_INDEXES)
+        _indexes_ready = True
 
 def _format_falla(falla):
     if not falla:
         return None
+    falla = Falla.desde(falla)
     falla["_id"] = str(falla["_id"])
     if "lugar_id" in falla and isinstance(falla["lugar_id"], ObjectId):
         falla["lugar_id"] = str(falla["lugar_id"])
     return falla
 
 def get_all_fallas(limit=100):
-    fallas = collection.find().limit(limit)
+    fallas = _lectura.find().limit(limit)
     return [_format_falla(f) for f in fallas]
 
+def _encode_cursor(falla):
+    return f"{falla['fecha'].isoformat()}|{falla['_id']}"
+
+def _decode_cursor(cursor):
+    fecha, falla_id = cursor.split("|", 1)
+    return datetime.fromisoformat(fecha), ObjectId(falla_id)
+
+def _ref_filter(value):
+    """lugar_id puede estar guardado como ObjectId o como texto."""
+    if ObjectId.is_valid(value):
+        return {"$in": [ObjectId(value), str(value)]}
+    return value
+
+def _filtro_fallas(lugar_id=None, eco=None, placas=None, correo=None,
+                   desde=None, hasta=None, cursor=None):
+    condiciones = []
+    if lugar_id:
+        condiciones.append({"lugar_id": _ref_filter(lugar_id)})
+    if eco:
+        condiciones.append({"vehiculo.eco": eco})
+    if placas:
+        condiciones.append({"vehiculo.placas": placas})
+    if correo:
+        condiciones.append({"usuario_reporta.correo": correo})
+    # `fecha` es siempre fecha BSON (falla_fechas), así que el rango y la
+    # llave (fecha, _id) cubren todas las fallas
+    rango = {}
+    if desde:
+        rango["$gte"] = desde
+    if hasta:
+        rango["$lte"] = hasta
+    if rango:
+        condiciones.append({"fecha": rango})
+    if cursor:
+        fecha, falla_id = _decode_cursor(cursor)
+        condiciones.append({"$or": [
+            {"fecha": {"$lt": fecha}},
+            {"fecha": fecha, "_id": {"$lt": falla_id}},
+        ]})
+    return {"$and": condiciones} if condiciones else {}
+
+def _pagina(items, limit):
+    next_cursor = _encode_cursor(items[limit - 1]) if len(items) > limit else None
+    return {"items": items[:limit], "next_cursor": next_cursor}
+
+def query_fallas(lugar_id=None, eco=None, placas=None, correo=None,
+                 desde=None, hasta=None, cursor=None, limit=50):
+    """
+    Consulta fallas por lugar, vehículo, reportante y rango de fechas, ordenadas
+    de la más reciente a la más antigua con paginación por llave (fecha, _id).
+    Devuelve {"items": [...], "next_cursor": str | None}.
+    """
+    ensure_falla_indexes()
+    filtro = _filtro_fallas(lugar_id, eco, placas, correo, desde, hasta, cursor)
+    # Se pide un documento extra para saber si hay página siguiente
+    items = [
+        _format_falla(f) for f in
+        _lectura.find(filtro).sort([("fecha", -1), ("_id", -1)]).limit(limit + 1)
+    ]
+    return _pagina(items, limit)
+
+def query_fallas_detalle(lugar_id=None, eco=None, placas=None, correo=None,
+                         desde=None, hasta=None, cursor=None, limit=50, materializada=False):
+    """
+    Igual que query_fallas, pero cada falla llega con `lugar`, `reporta`,
+    `revisa` y el `material` vigente de cada línea de materiales_usados,
+    resueltos en la misma agregación. Con materializada=True se lee de la vista
+    `fallas_detalle` (tan reciente como su último refresco).
+    """
+    ensure_falla_indexes()
+    filtro = _filtro_fallas(lugar_id, eco, placas, correo, desde, hasta, cursor)
+    orden = [("fecha", -1), ("_id", -1)]
+    if materializada:
+        docs = falla_vista_service.fallas_detalle.find(filtro).sort(orden).limit(limit + 1)
+    else:
+        docs = falla_vista_service.detalle(filtro, orden, limit + 1)
+    return _pagina([_format_falla(f) for f in docs], limit)
+
 def get_falla_by_id(id):
     falla = collection.find_one({"_id": ObjectId(id)})
     return _format_falla(falla)
 
-def create_falla(data):
-    result = collection.insert_one(data)
-    return str(result.inserted_id)
+def _fecha_requerida(valor, ahora):
+    """`fecha` se guarda siempre como fecha BSON; sin fecha se usa el momento del registro."""
+    if valor is None:
+        return ahora
+    fecha = como_fecha(valor)
+    if fecha is None:
+        raise ValueError(f"Fecha de falla no válida: {valor!r}")
+    return fecha
+
+def _normalizar_materiales(materiales_usados):
+    """Guarda las referencias a materiales como ObjectId."""
+    return [
+        {**m, "id_material": ObjectId(m["id_material"])}
+        for m in materiales_usados or []
+    ]
+
+def create_falla(data, permitir_pendientes=False):
+    """
+    Registra una falla y descuenta del inventario los materiales usados en la misma
+    transacción. Si falta stock se lanza StockInsuficienteError, salvo que
+    permitir_pendientes=True: entonces las líneas sin stock quedan en
+    `materiales_pendientes` y no se descuentan.
+    """
+    materiales_usados = _normalizar_materiales(data.get("materiales_usados"))
+    fecha = _fecha_requerida(data.get("fecha"), datetime.utcnow())
+    cantidades = agrupar_lineas(materiales_usados)
+
+    def _registrar(session):
+        aplicadas, faltantes = descontar_existencias(
+            cantidades, session=session, parcial=permitir_pendientes
+        )
+        ahora = datetime.utcnow()
+        falla = {
+            **data,
+            "fecha": fecha,
+            "materiales_usados": materiales_usados,
+            "created_at": data.get("created_at", ahora),
+            "updated_at": ahora,
+        }
+        if faltantes:
+            falla["materiales_pendientes"] = [
+                {"id_material": f["id_material"], "cantidad": f["cantidad"]} for f in faltantes
+            ]
+        try:
+            result = collection.insert_one(falla, session=session)
+        except Exception:
+            if session is None:
+                reponer_existencias(aplicadas)
+            raise
+        return str(result.inserted_id)
+
+    falla_id = run_in_transaction(_registrar)
+    invalidar_consumo()
+    bump(COLLECTION_MATERIALES)
+    bump(COLLECTION_FALLAS)
+    return falla_id
 
 def update_falla(id, data):
-    result = collection.update_one({"_id": ObjectId(id)}, {"$set": data})
+    if "fecha" in data:
+        data = {**data, "fecha": _fecha_requerida(data["fecha"], datetime.utcnow())}
+    # updated_at permite que el refresco incremental de fallas_detalle la recoja
+    result = collection.update_one({"_id": ObjectId(id)}, {"$set": {**data, "updated_at": datetime.utcnow()}})
+    if result.modified_count:
+        invalidar_consumo()
+        bump(COLLECTION_FALLAS)
     return result.modified_count > 0
 
 def delete_falla(id):
     result = collection.delete_one({"_id": ObjectId(id)})
+    falla_vista_service.quitar_de_vista(ObjectId(id))
+    if result.deleted_count:
+        invalidar_consumo()
+        bump(COLLECTION_FALLAS)
     return result.deleted_count > 0
+
@@ -1,31 +1,60 @@
 from backend.services.db_connection import get_collection
 from config.env import COLLECTION_LUGARES
 from bson import ObjectId
+from backend.services.bulk_service import update_by_filter, apply_patches
+from backend.services.versioning import versioned_update, stamp_new
+from backend.services.data_version import bump
+from backend.models.records import Lugar, CODEC_RAW
+from backend.services.prefix_search import buscar_por_prefijo, LIMITE
 
 collection = get_collection(COLLECTION_LUGARES)
+_lectura = collection.with_options(codec_options=CODEC_RAW)
 
 def _format_lugar(lugar):
     if not lugar:
         return None
+    lugar = Lugar.desde(lugar)
     lugar["_id"] = str(lugar["_id"])
     return lugar
 
 def get_all_lugares(limit=100):
-    lugares = collection.find().limit(limit)
+    lugares = _lectura.find().limit(limit)
     return [_format_lugar(l) for l in lugares]
 
 def get_lugar_by_id(id):
     lugar = collection.find_one({"_id": ObjectId(id)})
     return _format_lugar(lugar)
 
+def buscar_lugares(prefijo, limit=LIMITE):
+    """Lugares cuyo nombre empieza con el prefijo; sólo los campos del selector."""
+    lugares = buscar_por_prefijo(_lectura, ["nombre"], prefijo, {"nombre": 1, "tipo": 1, "ubicacion": 1}, limit)
+    return [_format_lugar(l) for l in lugares]
+
 def create_lugar(data):
-    result = collection.insert_one(data)
+    result = collection.insert_one(stamp_new(data))
+    bump(COLLECTION_LUGARES)
     return str(result.inserted_id)
 
-def update_lugar(id, data):
-    result = collection.update_one({"_id": ObjectId(id)}, {"$set": data})
-    return result.modified_count > 0
+def update_lugar(id, data, expected_version=None):
+    """Actualiza un lugar con compare-and-set opcional sobre `version` (ver update_material)."""
+    resultado = versioned_update(collection, id, data, expected_version, _format_lugar)
+    if resultado["ok"]:
+        bump(COLLECTION_LUGARES)
+    return resultado
 
 def delete_lugar(id):
     result = collection.delete_one({"_id": ObjectId(id)})
+    bump(COLLECTION_LUGARES)
     return result.deleted_count > 0
+
+def bulk_update_lugares(filtro, set_data=None, inc_data=None):
+    """Aplica $set/$inc a todos los lugares que cumplan el filtro."""
+    resultado = update_by_filter(collection, filtro, set_data, inc_data)
+    bump(COLLECTION_LUGARES)
+    return resultado
+
+def bulk_patch_lugares(patches):
+    """Aplica una lista de parches por ID en un solo bulk_write."""
+    resultado = apply_patches(collection, patches)
+    bump(COLLECTION_LUGARES)
+    return resultado
@@ -4,9 +4,13 @@ from backend.services.db_connection import get_collection
 from config.env import COLLECTION_USERS
 import hashlib
 from bson import ObjectId
+from backend.services.data_version import bump
+from backend.models.records import Usuario, CODEC_RAW
+from backend.services.prefix_search import buscar_por_prefijo, LIMITE
 
 # Conexión a la colección de usuarios
 collection = get_collection(COLLECTION_USERS)
+_lectura = collection.with_options(codec_options=CODEC_RAW)
 
 
 # 🔒 Función para hashear contraseñas
@@ -17,9 +21,10 @@ def _hash_password(password: str) -> str:
 
 # 📋 Obtener todos los usuarios
 def get_all_users(limit=100):
-    users = collection.find({}, {"password": 0}).limit(limit)
+    users = _lectura.find({}, {"password": 0}).limit(limit)
     users_list = []
-    for user in users:
+    for raw in users:
+        user = Usuario.from_raw(raw)
         user["_id"] = str(user["_id"])
         if "correo" not in user or not user["correo"]:
             if "email" in user and user["email"]:
@@ -28,6 +33,26 @@ def get_all_users(limit=100):
     return users_list
 
 
+# 🔎 Buscar usuarios por prefijo del correo (selectores del panel de administración)
+def buscar_usuarios(prefijo, limit=LIMITE):
+    users = buscar_por_prefijo(_lectura, ["correo"], prefijo, {"correo": 1, "nombre": 1, "role": 1}, limit)
+    users_list = []
+    for raw in users:
+        user = Usuario.from_raw(raw)
+        user["_id"] = str(user["_id"])
+        users_list.append(user)
+    return users_list
+
+
+def get_user_by_id(user_id):
+    user = collection.find_one({"_id": ObjectId(user_id)}, {"password": 0})
+    if not user:
+        return None
+    user = Usuario.from_doc(user)
+    user["_id"] = str(user["_id"])
+    return user
+
+
 # ➕ Crear un usuario
 def create_user(user_data):
     """Crea un nuevo usuario con contraseña hasheada."""
@@ -36,6 +61,7 @@ def create_user(user_data):
             user_data["password"] = _hash_password(user_data["password"])
 
         result = collection.insert_one(user_data)
+        bump(COLLECTION_USERS)
         return str(result.inserted_id)
     except Exception as e:
         raise Exception(f"Error al crear usuario: {e}")
@@ -48,6 +74,7 @@ def update_user(correo, update_data):
             update_data["password"] = _hash_password(update_data["password"])
 
         result = collection.update_one({"correo": correo}, {"$set": update_data})
+        bump(COLLECTION_USERS)
         return result.modified_count > 0
     except Exception as e:
         raise Exception(f"Error al actualizar usuario: {e}")
@@ -56,6 +83,7 @@ def update_user(correo, update_data):
 def delete_user(correo):
     try:
         result = collection.delete_one({"correo": correo})
+        bump(COLLECTION_USERS)
         return result.deleted_count > 0
     except Exception as e:
         raise Exception(f"Error al eliminar usuario: {e}")
@@ -1,9 +1,11 @@
 # backend/models/order_model.py
 
+from datetime import datetime
+
 def order_schema(user_id, items, total):
     return {
         "user_id": user_id,
-        "items": items,  # Lista de dicts: [{product_id, quantity}]
+        "items": items,  # Lista de dicts: [{product_id, quantity, price, name}]
         "total": float(total),
         "status": "pendiente",
         "created_at": datetime.utcnow()
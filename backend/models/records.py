@@ -0,0 +1,189 @@
+# backend/models/records.py
+#
+# Registros compactos para las filas que los controladores devuelven a la GUI.
+# Cada clase guarda sus campos conocidos en __slots__ (sin __dict__ por
+# instancia) y se comporta como un dict mutable: r["campo"], r.get(),
+# r.update(), dict(r) y pd.DataFrame(lista_de_registros) siguen funcionando.
+# Los campos que no están declarados se conservan en un dict aparte que sólo
+# se crea si el documento los trae.
+
+from collections.abc import MutableMapping
+import bson
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+# Lecturas en crudo: el lote del cursor se queda en bytes y cada documento se
+# decodifica uno a uno al construir su registro (ver Registro.from_raw)
+CODEC_RAW = CodecOptions(document_class=RawBSONDocument)
+_CODEC_DICT = CodecOptions(tz_aware=False)
+
+
+class Registro(MutableMapping):
+    """Base de los registros; las subclases definen CAMPOS y los mismos __slots__."""
+
+    __slots__ = ("_extra",)
+    CAMPOS = ()
+    _campos = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._campos = frozenset(cls.CAMPOS)
+
+    def __init__(self, **campos):
+        self._extra = None
+        for clave, valor in campos.items():
+            self[clave] = valor
+
+    @classmethod
+    def from_doc(cls, doc):
+        """Construye el registro a partir de un documento ya decodificado."""
+        registro = cls.__new__(cls)
+        registro._extra = None
+        for clave, valor in doc.items():
+            registro[clave] = valor
+        return registro
+
+    @classmethod
+    def from_raw(cls, raw):
+        """Construye el registro desde un RawBSONDocument sin guardar su dict inflado."""
+        return cls.from_doc(bson.decode(raw.raw, _CODEC_DICT))
+
+    @classmethod
+    def desde(cls, doc):
+        """Acepta un RawBSONDocument, un dict o un registro ya construido."""
+        if isinstance(doc, cls):
+            return doc
+        if isinstance(doc, RawBSONDocument):
+            return cls.from_raw(doc)
+        return cls.from_doc(doc)
+
+    def __getitem__(self, clave):
+        if clave in self._campos:
+            try:
+                return getattr(self, clave)
+            except AttributeError:
+                raise KeyError(clave) from None
+        if self._extra is None:
+            raise KeyError(clave)
+        return self._extra[clave]
+
+    def __setitem__(self, clave, valor):
+        if clave in self._campos:
+            setattr(self, clave, valor)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[clave] = valor
+
+    def __delitem__(self, clave):
+        if clave in self._campos:
+            try:
+                delattr(self, clave)
+            except AttributeError:
+                raise KeyError(clave) from None
+        elif self._extra is not None and clave in self._extra:
+            del self._extra[clave]
+        else:
+            raise KeyError(clave)
+
+    def __iter__(self):
+        for campo in self.CAMPOS:
+            if hasattr(self, campo):
+                yield campo
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __contains__(self, clave):
+        if clave in self._campos:
+            return hasattr(self, clave)
+        return self._extra is not None and clave in self._extra
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def copy(self):
+        return type(self).from_doc(self)
+
+
+class Material(Registro):
+    __slots__ = CAMPOS = (
+        "_id", "clave_material", "descripcion", "generico", "clasificacion",
+        "existencia", "reservado", "costo_promedio", "lugar_id", "version", "created_at", "updated_at",
+    )
+
+
+class Lugar(Registro):
+    __slots__ = CAMPOS = (
+        "_id", "nombre", "estado", "ubicacion", "tipo", "descripcion",
+        "fecha_creacion", "inventario", "version", "created_at", "updated_at",
+    )
+
+
+class Falla(Registro):
+    __slots__ = CAMPOS = (
+        "_id", "lugar_id", "usuario_reporta", "usuario_revisa", "vehiculo", "fecha",
+        "nombre_conductor", "descripcion", "observaciones", "reviso_por",
+        "materiales_usados", "materiales_pendientes", "created_at", "updated_at",
+        # Referencias resueltas por la vista de detalle (falla_vista_service)
+        "lugar", "reporta", "revisa",
+    )
+
+
+class Usuario(Registro):
+    __slots__ = CAMPOS = (
+        "_id", "nombre", "correo", "email", "rol", "role", "fecha_creacion",
+        "created_at", "updated_at",
+    )
+
+
+if __name__ == "__main__":
+    # Huella en memoria de lo que una sesión guarda: 5 000 materiales como dict vs registro
+    import tracemalloc
+    from datetime import datetime
+    from bson import ObjectId
+
+    N = 5000
+    ahora = datetime(2025, 8, 18, 0, 40, 29)
+    crudos = [
+        RawBSONDocument(bson.encode({
+            "_id": ObjectId(), "clave_material": f"TV{i:05d}", "descripcion": f"MATERIAL {i}",
+            "generico": "AEROSOL", "clasificacion": "CARROCERIA Y PINTURA", "existencia": i % 50,
+            "costo_promedio": 12.5 + i, "lugar_id": ObjectId(), "version": 1,
+            "created_at": ahora, "updated_at": ahora,
+        }))
+        for i in range(N)
+    ]
+
+    def medir(construir):
+        tracemalloc.start()
+        filas = construir()
+        actual, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return filas, actual
+
+    def como_dict():
+        filas = [bson.decode(r.raw) for r in crudos]
+        for f in filas:
+            f["_id"] = str(f["_id"])
+        return filas
+
+    def como_registro():
+        filas = [Material.from_raw(r) for r in crudos]
+        for f in filas:
+            f["_id"] = str(f["_id"])
+        return filas
+
+    dicts, bytes_dict = medir(como_dict)
+    registros, bytes_registro = medir(como_registro)
+    assert [dict(r) for r in registros] == dicts
+
+    print(f"{N} materiales por sesión")
+    print(f"  dict     : {bytes_dict / 1024:8.1f} KB ({bytes_dict / N:6.0f} B/fila)")
+    print(f"  registro : {bytes_registro / 1024:8.1f} KB ({bytes_registro / N:6.0f} B/fila)")
+    print(f"  ahorro   : {1 - bytes_registro / bytes_dict:.0%}")
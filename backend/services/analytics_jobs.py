@@ -0,0 +1,62 @@
+# backend/services/analytics_jobs.py
+#
+# Cálculos pesados de analytics_view. Son funciones puras (sin Streamlit ni
+# MongoDB) para poder ejecutarse en los procesos de job_executor.
+
+import numpy as np
+import pandas as pd
+
+
+def ajustar_polinomio(x_min, x_max, n_puntos, grado, ruido, semilla=0):
+    """Genera la serie sintética del módulo de regresión polinómica y ajusta el modelo."""
+    from sklearn.linear_model import LinearRegression
+    from sklearn.preprocessing import PolynomialFeatures
+    from sklearn.metrics import mean_squared_error, r2_score
+
+    rng = np.random.default_rng(semilla)
+    X_base = np.linspace(x_min, x_max, n_puntos)
+    y_base = np.polyval([-0.01, 0.5, 5], X_base)
+    y = y_base + rng.normal(0, ruido, n_puntos)
+    X = X_base.reshape(-1, 1)
+
+    X_poly = PolynomialFeatures(degree=grado).fit_transform(X)
+    modelo = LinearRegression().fit(X_poly, y)
+    y_pred = modelo.predict(X_poly)
+
+    return {
+        "x": X_base,
+        "y": y,
+        "y_pred": y_pred,
+        "r2": float(r2_score(y, y_pred)),
+        "rmse": float(np.sqrt(mean_squared_error(y, y_pred))),
+    }
+
+
+def calcular_tendencia(inicio, fin, semilla=0):
+    """Serie temporal diaria con medias móviles y su tendencia lineal."""
+    from sklearn.linear_model import LinearRegression
+    from sklearn.metrics import r2_score
+
+    rng = np.random.default_rng(semilla)
+    fechas = pd.date_range(start=inicio, end=fin, freq='D')
+    tendencia_base = np.linspace(100, 200, len(fechas))
+    estacionalidad = 25 * np.sin(2 * np.pi * np.arange(len(fechas)) / 30)
+    valores = tendencia_base + estacionalidad + rng.normal(0, 8, len(fechas))
+
+    datos = pd.DataFrame({
+        'fecha': fechas,
+        'valor': valores,
+        'media_movil_7': pd.Series(valores).rolling(window=7).mean(),
+        'media_movil_30': pd.Series(valores).rolling(window=30).mean()
+    })
+
+    X_temp = np.arange(len(datos)).reshape(-1, 1)
+    modelo = LinearRegression().fit(X_temp, valores)
+    tendencia_lineal = modelo.predict(X_temp)
+
+    return {
+        "datos": datos,
+        "tendencia_lineal": tendencia_lineal,
+        "pendiente_diaria": float(modelo.coef_[0]),
+        "r2": float(r2_score(valores, tendencia_lineal)),
+    }
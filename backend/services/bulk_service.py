@@ -0,0 +1,49 @@
+# backend/services/bulk_service.py
+
+from datetime import datetime
+from pymongo import UpdateOne
+from bson import ObjectId
+
+
+def build_update(set_data=None, inc_data=None):
+    """
+    Construye la expresión de actualización a partir de $set y $inc. También
+    incrementa `version` para que las ediciones abiertas detecten el cambio.
+    """
+    if not set_data and not inc_data:
+        raise ValueError("La edición masiva requiere al menos un campo en $set o $inc.")
+    return {
+        "$set": {**(set_data or {}), "updated_at": datetime.utcnow()},
+        "$inc": {**(inc_data or {}), "version": 1},
+    }
+
+
+def _counts(result):
+    return {"matched": result.matched_count, "modified": result.modified_count}
+
+
+def update_by_filter(collection, filtro, set_data=None, inc_data=None):
+    """Aplica la misma actualización a todos los documentos que cumplan el filtro."""
+    if not filtro:
+        raise ValueError("La edición masiva por filtro requiere un filtro no vacío.")
+    result = collection.update_many(filtro, build_update(set_data, inc_data))
+    return _counts(result)
+
+
+def apply_patches(collection, patches):
+    """
+    Ejecuta una lista de parches por ID en un único bulk_write desordenado.
+    Cada parche es {"_id": ..., "set": {...}, "inc": {...}} y opcionalmente
+    "filtro" con condiciones extra (p. ej. una guarda de existencia).
+    """
+    operaciones = [
+        UpdateOne(
+            {**p.get("filtro", {}), "_id": ObjectId(p["_id"])},
+            build_update(p.get("set"), p.get("inc"))
+        )
+        for p in patches
+    ]
+    if not operaciones:
+        return {"matched": 0, "modified": 0}
+    result = collection.bulk_write(operaciones, ordered=False)
+    return _counts(result)
@@ -0,0 +1,303 @@
+# backend/services/checkout_service.py
+#
+# Checkout: convierte las líneas de un carrito en un pedido (order_schema).
+# Dentro de la transacción se hacen cuatro viajes fijos sin importar cuántas
+# líneas tenga el carrito:
+#
+#   1. find con $in       -> precio, existencia y lugar vigentes de cada material
+#   2. bulk_write ordenado -> un $inc con guarda `campo >= cantidad` por línea
+#   3. bulk_write          -> contadores de inventario de los lugares tocados
+#   4. insert_one          -> el pedido
+#
+# Las líneas con precio desactualizado, sin material o sin existencia se
+# devuelven como fallas por línea en lugar de abortar a ciegas. Bajo
+# contención, la lectura y las guardas ven la misma instantánea: si otra
+# transacción toca el material, MongoDB reporta un conflicto y
+# with_transaction reintenta todo el checkout.
+#
+# En servidores standalone no hay instantánea, y un bulk_write no dice qué
+# operación no coincidió; ahí se descuenta línea por línea (stock_service
+# para la existencia), que sí sabe qué línea falló y compensa lo aplicado.
+
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+from backend.services.db_connection import get_collection
+from backend.services.inventario_service import aplicar_cambios, CAMPOS_MATERIAL
+from backend.services.stock_service import descontar_existencias, reponer_existencias
+from backend.services.transaction_service import run_in_transaction
+from backend.models.order_model import order_schema
+from config.env import COLLECTION_MATERIALES, COLLECTION_PEDIDOS
+from config import settings
+
+materiales = get_collection(COLLECTION_MATERIALES)
+pedidos = get_collection(COLLECTION_PEDIDOS)
+
+PROYECCION = {**CAMPOS_MATERIAL, "descripcion": 1, "reservado": 1}
+
+# Motivos de falla por línea
+NO_EXISTE, PRECIO, STOCK = "no_existe", "precio", "stock"
+
+
+def normalizar_lineas(items):
+    """
+    Acepta las líneas del carrito ({product_id|material_id, quantity, price?,
+    name?}) y suma las repetidas. Ordenadas por ID para que dos checkouts
+    concurrentes bloqueen los materiales en el mismo orden.
+    """
+    lineas = {}
+    for item in items:
+        material_id = ObjectId(item.get("material_id") or item.get("product_id"))
+        cantidad = int(item.get("quantity") or item.get("cantidad") or 0)
+        if cantidad <= 0:
+            raise ValueError("La cantidad de cada línea debe ser mayor que cero.")
+        linea = lineas.setdefault(material_id, {
+            "material_id": material_id, "cantidad": 0, "precio": item.get("price"),
+        })
+        linea["cantidad"] += cantidad
+    if not lineas:
+        raise ValueError("El carrito está vacío.")
+    return [lineas[k] for k in sorted(lineas)]
+
+
+def _falla(linea, motivo, actual=None, campo="existencia"):
+    return {
+        "material_id": str(linea["material_id"]),
+        "motivo": motivo,
+        "cantidad": linea["cantidad"],
+        "precio": linea.get("precio"),
+        "precio_actual": (actual or {}).get("costo_promedio"),
+        "disponible": (actual or {}).get(campo, 0) if actual else 0,
+    }
+
+
+def validar(lineas, actuales, campo="existencia", tolerancia=None):
+    """
+    Separa las líneas aplicables de las fallas. El precio se compara con el
+    costo_promedio vigente sólo si la línea trae precio y hay tolerancia.
+    """
+    validas, fallas = [], []
+    for linea in lineas:
+        actual = actuales.get(linea["material_id"])
+        if actual is None:
+            fallas.append(_falla(linea, NO_EXISTE))
+            continue
+        precio_actual = actual.get("costo_promedio") or 0
+        if (tolerancia is not None and linea.get("precio") is not None
+                and abs(float(linea["precio"]) - precio_actual) > tolerancia):
+            fallas.append(_falla(linea, PRECIO, actual, campo))
+            continue
+        if (actual.get(campo) or 0) < linea["cantidad"]:
+            fallas.append(_falla(linea, STOCK, actual, campo))
+            continue
+        validas.append(linea)
+    return validas, fallas
+
+
+def _descontar_bulk(lineas, actuales, campo, ahora, session):
+    """Un solo bulk_write ordenado con la guarda de cada línea."""
+    operaciones = [
+        UpdateOne(
+            {"_id": l["material_id"], campo: {"$gte": l["cantidad"]}},
+            {"$inc": {campo: -l["cantidad"], "version": 1}, "$set": {"updated_at": ahora}}
+        )
+        for l in lineas
+    ]
+    resultado = materiales.bulk_write(operaciones, ordered=True, session=session)
+    if resultado.matched_count != len(operaciones):
+        # La instantánea validó todas las guardas: si alguna no coincidió,
+        # abortar la transacción antes de registrar un pedido incompleto
+        raise RuntimeError("Las existencias cambiaron durante el checkout.")
+    if campo == "existencia":
+        aplicar_cambios([
+            (actuales[l["material_id"]],
+             {**actuales[l["material_id"]], "existencia": actuales[l["material_id"]]["existencia"] - l["cantidad"]})
+            for l in lineas
+        ], session=session)
+
+
+def _reponer(lineas, campo, ahora):
+    """Compensación sin transacción: devuelve a `campo` lo descontado."""
+    if campo == "existencia":
+        reponer_existencias({l["material_id"]: l["cantidad"] for l in lineas})
+        return
+    for l in lineas:
+        materiales.update_one(
+            {"_id": l["material_id"]},
+            {"$inc": {campo: l["cantidad"], "version": 1}, "$set": {"updated_at": ahora}}
+        )
+
+
+def _descontar_por_linea(lineas, campo, ahora, fallas, parcial):
+    """Standalone: guarda por línea, para saber cuáles se aplicaron; devuelve esas líneas."""
+    if campo == "existencia":
+        cantidades = {l["material_id"]: l["cantidad"] for l in lineas}
+        aplicadas, faltantes = descontar_existencias(cantidades, parcial=True)
+        sin_stock = {f["id_material"]: f["existencia"] for f in faltantes}
+    else:
+        aplicadas, sin_stock = set(), {}
+        try:
+            for l in lineas:
+                resultado = materiales.update_one(
+                    {"_id": l["material_id"], campo: {"$gte": l["cantidad"]}},
+                    {"$inc": {campo: -l["cantidad"], "version": 1}, "$set": {"updated_at": ahora}}
+                )
+                if resultado.matched_count:
+                    aplicadas.add(l["material_id"])
+                else:
+                    sin_stock[l["material_id"]] = None
+        except Exception:
+            _reponer([l for l in lineas if l["material_id"] in aplicadas], campo, ahora)
+            raise
+
+    for l in lineas:
+        if l["material_id"] in sin_stock:
+            fallas.append(_falla(l, STOCK, {campo: sin_stock[l["material_id"]] or 0}, campo))
+    aplicadas = [l for l in lineas if l["material_id"] in aplicadas]
+    if sin_stock and not parcial:
+        _reponer(aplicadas, campo, ahora)
+        return []
+    return aplicadas
+
+
+def _insertar_pedido(user_id, lineas, actuales, session, extra=None):
+    items = [{
+        "product_id": l["material_id"],
+        "name": actuales[l["material_id"]].get("descripcion"),
+        "price": float(actuales[l["material_id"]].get("costo_promedio") or 0),
+        "quantity": l["cantidad"],
+    } for l in lineas]
+    pedido = order_schema(user_id, items, sum(i["price"] * i["quantity"] for i in items))
+    pedido.update(extra or {})
+    pedido["_id"] = pedidos.insert_one(pedido, session=session).inserted_id
+    return pedido
+
+
+def checkout_en_sesion(lineas, user_id, session, campo="existencia", parcial=False,
+                       tolerancia=None, extra=None):
+    """
+    Núcleo del checkout para usar dentro de una transacción ajena (p. ej. al
+    convertir apartados, con campo="reservado"). Devuelve (pedido, fallas);
+    pedido es None si no se registró.
+    """
+    actuales = {
+        d["_id"]: d for d in materiales.find(
+            {"_id": {"$in": [l["material_id"] for l in lineas]}}, PROYECCION, session=session
+        )
+    }
+    validas, fallas = validar(lineas, actuales, campo, tolerancia)
+    if not validas or (fallas and not parcial):
+        return None, fallas
+
+    ahora = datetime.utcnow()
+    if session is None:
+        validas = _descontar_por_linea(validas, campo, ahora, fallas, parcial)
+        if not validas:
+            return None, fallas
+    else:
+        _descontar_bulk(validas, actuales, campo, ahora, session)
+
+    try:
+        pedido = _insertar_pedido(user_id, validas, actuales, session, extra)
+    except Exception:
+        if session is None:
+            _reponer(validas, campo, ahora)
+        raise
+    return pedido, fallas
+
+
+def checkout(items, user_id, parcial=False, tolerancia=settings.CHECKOUT_TOLERANCIA_PRECIO):
+    """
+    Registra el pedido del carrito en una transacción. Con parcial=False basta
+    una falla para no registrar nada; con parcial=True se piden sólo las
+    líneas válidas. Devuelve {"pedido_id", "total", "lineas", "fallas"}.
+    """
+    lineas = normalizar_lineas(items)
+    pedido, fallas = run_in_transaction(
+        lambda session: checkout_en_sesion(lineas, user_id, session, parcial=parcial, tolerancia=tolerancia)
+    )
+    return {
+        "pedido_id": str(pedido["_id"]) if pedido else None,
+        "total": pedido["total"] if pedido else 0,
+        "lineas": len(pedido["items"]) if pedido else 0,
+        "fallas": fallas,
+    }
+
+
+if __name__ == "__main__":
+    # Checkouts por segundo con carritos de 50 líneas: 8 hilos compiten por
+    # los mismos 120 materiales. Se compara contra el descuento línea por
+    # línea (un find_one_and_update por material) y se verifica que las
+    # unidades vendidas coincidan con lo que falta en existencia.
+    import random
+    import threading
+    import time
+    from backend.services import stock_service
+
+    materiales = stock_service.materiales = get_collection("bench_checkout")
+    pedidos = get_collection("bench_pedidos")
+    N, HILOS, CHECKOUTS, LINEAS = 120, 8, 40, 50
+
+    def preparar():
+        materiales.drop()
+        pedidos.drop()
+        materiales.insert_many([
+            {"descripcion": f"MATERIAL {i}", "existencia": 2000, "costo_promedio": 10.0 + i, "version": 1}
+            for i in range(N)
+        ])
+        return [m["_id"] for m in materiales.find({}, {"_id": 1})]
+
+    def carrito(azar, ids):
+        return [{"product_id": m, "quantity": azar.randint(1, 5), "price": None}
+                for m in azar.sample(ids, LINEAS)]
+
+    def por_linea(items, user_id):
+        # Línea base: mismo pedido, pero un viaje por material
+        lineas = normalizar_lineas(items)
+
+        def _aplicar(session):
+            cantidades = {l["material_id"]: l["cantidad"] for l in lineas}
+            descontar_existencias(cantidades, session=session)
+            actuales = {d["_id"]: d for d in materiales.find({"_id": {"$in": list(cantidades)}}, PROYECCION,
+                                                             session=session)}
+            return _insertar_pedido(user_id, lineas, actuales, session)
+        return run_in_transaction(_aplicar)
+
+    def medir(nombre, funcion):
+        ids = preparar()
+        inicial = sum(m["existencia"] for m in materiales.find())
+        rechazados, errores = [0], []
+
+        def trabajador(semilla):
+            azar = random.Random(semilla)
+            for _ in range(CHECKOUTS):
+                try:
+                    resultado = funcion(carrito(azar, ids), f"hilo{semilla}")
+                    if isinstance(resultado, dict) and resultado["fallas"]:
+                        rechazados[0] += 1
+                except ValueError:
+                    rechazados[0] += 1
+                except Exception as e:
+                    errores.append(repr(e))
+
+        inicio = time.perf_counter()
+        hilos = [threading.Thread(target=trabajador, args=(i,)) for i in range(HILOS)]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        segundos = time.perf_counter() - inicio
+
+        vendidas = sum(i["quantity"] for p in pedidos.find() for i in p["items"])
+        final = sum(m["existencia"] for m in materiales.find())
+        total = HILOS * CHECKOUTS
+        print(f"  {nombre:10} {total / segundos:8.1f} checkouts/s · {rechazados[0]} con fallas · "
+              f"{pedidos.count_documents({})} pedidos")
+        assert inicial - final == vendidas, "las existencias no cuadran con los pedidos"
+        assert not errores, errores[:5]
+
+    print(f"{HILOS} hilos × {CHECKOUTS} checkouts de {LINEAS} líneas sobre {N} materiales")
+    medir("por línea", por_linea)
+    medir("bulk", lambda items, user_id: checkout(items, user_id))
+    materiales.drop()
+    pedidos.drop()
@@ -0,0 +1,132 @@
+# backend/services/consumo_service.py
+
+from datetime import datetime, timedelta
+from backend.services.db_connection import get_collection
+from backend.utils.cache import TTLCache
+from backend.services.data_version import get_version
+from config.env import COLLECTION_FALLAS, COLLECTION_MATERIALES
+
+fallas = get_collection(COLLECTION_FALLAS)
+
+# Dimensiones por las que se puede desglosar el consumo
+DIMENSIONES = {
+    "lugar": "$lugar_id",
+    "vehiculo": "$vehiculo.eco",
+}
+
+# Las agregaciones recorren fallas completas; se guardan 10 minutos o hasta
+# que cambie la versión de fallas (o de materiales, para la existencia del top)
+_cache = TTLCache(maxsize=64, ttl=600)
+
+
+def invalidar_consumo():
+    _cache.invalidate()
+
+
+def _match_ventana(dias):
+    return {"$match": {"fecha": {"$gte": datetime.utcnow() - timedelta(days=dias)}}}
+
+
+def _lineas_consumidas():
+    """
+    Una fila por línea en `linea`: las de materiales_usados y, en negativo,
+    las de materiales_pendientes, que quedaron sin stock y no se descontaron.
+    Al sumar por material sólo queda lo consumido de verdad.
+    """
+    pendientes = {"$map": {
+        "input": {"$ifNull": ["$materiales_pendientes", []]},
+        "as": "p",
+        "in": {"id_material": "$$p.id_material", "cantidad": {"$multiply": ["$$p.cantidad", -1]}, "pendiente": True},
+    }}
+    return [
+        {"$set": {"linea": {"$concatArrays": [{"$ifNull": ["$materiales_usados", []]}, pendientes]}}},
+        {"$unwind": "$linea"},
+    ]
+
+
+def consumo_mensual(dimension="lugar", dias=365):
+    """
+    Consumo por material, dimensión (lugar o vehículo) y mes a partir de
+    fallas.materiales_usados, sin lo que quedó en materiales_pendientes. Cada
+    fila: material, dimension, mes, cantidad, fallas.
+    """
+    def _calcular():
+        pipeline = [
+            _match_ventana(dias),
+            *_lineas_consumidas(),
+            {"$group": {
+                "_id": {
+                    "material": "$linea.id_material",
+                    "dimension": DIMENSIONES[dimension],
+                    "mes": {"$dateToString": {"format": "%Y-%m", "date": "$fecha"}},
+                },
+                "nombre": {"$first": "$linea.nombre"},
+                "cantidad": {"$sum": "$linea.cantidad"},
+                "fallas": {"$sum": {"$cond": ["$linea.pendiente", 0, 1]}},
+            }},
+            {"$match": {"cantidad": {"$gt": 0}}},
+            {"$sort": {"_id.mes": 1}},
+        ]
+        return [
+            {
+                "material": str(row["_id"]["material"]),
+                "nombre": row.get("nombre"),
+                "dimension": str(row["_id"].get("dimension")),
+                "mes": row["_id"]["mes"],
+                "cantidad": row["cantidad"],
+                "fallas": row["fallas"],
+            }
+            for row in fallas.aggregate(pipeline)
+        ]
+
+    return _cache.get_or_compute(("mensual", get_version(COLLECTION_FALLAS), dimension, dias), _calcular)
+
+
+def top_consumo(n=10, dias=90):
+    """
+    Los n materiales más consumidos en la ventana, con su existencia actual y
+    una estimación de días de stock restantes al ritmo de consumo observado.
+    """
+    def _calcular():
+        pipeline = [
+            _match_ventana(dias),
+            *_lineas_consumidas(),
+            {"$group": {
+                "_id": "$linea.id_material",
+                "nombre": {"$first": "$linea.nombre"},
+                "cantidad": {"$sum": "$linea.cantidad"},
+            }},
+            {"$match": {"cantidad": {"$gt": 0}}},
+            {"$sort": {"cantidad": -1}},
+            {"$limit": n},
+            {"$lookup": {
+                "from": COLLECTION_MATERIALES,
+                "localField": "_id",
+                "foreignField": "_id",
+                "pipeline": [{"$project": {
+                    "clave_material": 1, "descripcion": 1, "existencia": 1, "lugar_id": 1
+                }}],
+                "as": "material",
+            }},
+            {"$unwind": {"path": "$material", "preserveNullAndEmptyArrays": True}},
+        ]
+        filas = []
+        for row in fallas.aggregate(pipeline):
+            material = row.get("material") or {}
+            consumo_diario = row["cantidad"] / dias
+            existencia = material.get("existencia", 0)
+            filas.append({
+                "material": str(row["_id"]),
+                "clave_material": material.get("clave_material"),
+                "descripcion": material.get("descripcion") or row.get("nombre"),
+                "lugar_id": str(material.get("lugar_id", "")),
+                "cantidad": row["cantidad"],
+                "consumo_diario": consumo_diario,
+                "existencia": existencia,
+                "dias_restantes": existencia / consumo_diario if consumo_diario else None,
+            })
+        return filas
+
+    # La existencia sale de materiales: su versión también forma parte de la llave
+    clave = ("top", get_version(COLLECTION_FALLAS), get_version(COLLECTION_MATERIALES), n, dias)
+    return _cache.get_or_compute(clave, _calcular)
@@ -0,0 +1,69 @@
+# backend/services/data_version.py
+#
+# Contador de versión por colección. Cada escritura hecha por los controladores
+# lo incrementa; las cachés de datos y figuras lo incluyen en su llave, así que
+# un cambio en la colección las deja obsoletas sin tener que borrarlas a mano.
+#
+# Las escrituras hechas fuera de este proceso (cliente de escritorio, scripts)
+# se detectan con sondear(), que compara una firma barata de la colección.
+
+import threading
+import time
+from backend.services.db_connection import get_collection
+from config import settings
+
+_lock = threading.Lock()
+_versiones = {}
+_firmas = {}          # coleccion -> (documentos, último updated_at) visto en MongoDB
+_ultimo_sondeo = {}   # coleccion -> time.monotonic() del último sondeo
+
+
+def bump(coleccion):
+    """Marca la colección como modificada y devuelve la versión nueva."""
+    with _lock:
+        _versiones[coleccion] = version = _versiones.get(coleccion, 0) + 1
+        # La escritura ya subió la versión: el siguiente sondeo sólo toma la firma nueva
+        _firmas.pop(coleccion, None)
+    return version
+
+
+def get_version(coleccion):
+    return _versiones.get(coleccion, 0)
+
+
+def _firma(coleccion):
+    """
+    Número de documentos y updated_at más reciente: dos lecturas servidas por
+    índice/metadatos. El índice de updated_at lo crea el ensure_*_indexes de
+    cada colección grande (materiales, fallas, pronósticos), no el sondeo.
+    """
+    col = get_collection(coleccion)
+    ultimo = col.find_one({}, {"updated_at": 1, "_id": 0}, sort=[("updated_at", -1)])
+    return col.estimated_document_count(), (ultimo or {}).get("updated_at")
+
+
+def sondear(colecciones, forzar=False):
+    """
+    Sube la versión de las colecciones cuya firma cambió desde el último sondeo.
+    Cada colección se consulta a lo sumo una vez por AUTO_REFRESH_MIN_INTERVAL
+    segundos para todo el proceso, sin importar cuántos dashboards estén
+    abiertos; forzar=True ignora ese intervalo. Devuelve {coleccion: version}.
+    """
+    ahora = time.monotonic()
+    for coleccion in colecciones:
+        with _lock:
+            reciente = ahora - _ultimo_sondeo.get(coleccion, float("-inf")) < settings.AUTO_REFRESH_MIN_INTERVAL
+            if reciente and not forzar:
+                continue
+            _ultimo_sondeo[coleccion] = ahora
+
+        firma = _firma(coleccion)
+        with _lock:
+            anterior = _firmas.get(coleccion)
+            _firmas[coleccion] = firma
+            cambio = anterior is not None and anterior != firma
+        if cambio:
+            bump(coleccion)
+            with _lock:
+                _firmas[coleccion] = firma
+    return {coleccion: get_version(coleccion) for coleccion in colecciones}
@@ -2,9 +2,20 @@
 
 from pymongo import MongoClient
 from config import env
+from backend.services.instrumentation import monitor
+
+# Un solo cliente por proceso: MongoClient mantiene su propio pool de conexiones
+# y las sesiones/transacciones sólo funcionan con el cliente que las creó.
+_client = None
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = MongoClient(env.MONGO_URI, event_listeners=[monitor])
+    return _client
 
 def get_db():
-    client = MongoClient(env.MONGO_URI)
+    client = get_client()
     db = client[env.DB_NAME]
     return db
 
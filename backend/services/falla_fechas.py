@@ -0,0 +1,93 @@
+# backend/services/falla_fechas.py
+#
+# `fecha` de las fallas siempre como fecha BSON. La paginación por llave
+# (fecha, _id) compara con $lt/$gt, que MongoDB sólo aplica dentro de un mismo
+# tipo: una falla antigua con la fecha en texto o sin fecha quedaría fuera de
+# los reportes. Las escrituras pasan por como_fecha() y los documentos
+# anteriores se migran una vez (también al arrancar, ver ensure_falla_indexes):
+#     python -m backend.services.falla_fechas [--solo-reportar]
+#
+# Si el texto no se puede interpretar se usa created_at o, en último caso, el
+# momento de creación del ObjectId; el valor original queda en fecha_original.
+
+from datetime import date, datetime, timezone
+from bson import ObjectId
+from pymongo import UpdateOne
+from backend.services.db_connection import get_collection
+from config.env import COLLECTION_FALLAS
+
+fallas = get_collection(COLLECTION_FALLAS)
+
+FORMATOS = ("%d/%m/%Y %H:%M", "%d/%m/%Y", "%Y-%m-%d %H:%M:%S", "%Y/%m/%d")
+SIN_FECHA = {"fecha": {"$not": {"$type": "date"}}}
+
+
+def como_fecha(valor):
+    """datetime (UTC, sin zona) a partir de datetime, date o texto; None si no se puede."""
+    if isinstance(valor, datetime):
+        if valor.tzinfo is not None:
+            valor = valor.astimezone(timezone.utc).replace(tzinfo=None)
+        return valor
+    if isinstance(valor, date):
+        return datetime(valor.year, valor.month, valor.day)
+    if not isinstance(valor, str) or not valor.strip():
+        return None
+    texto = valor.strip()
+    try:
+        return como_fecha(datetime.fromisoformat(texto.replace("Z", "+00:00")))
+    except ValueError:
+        pass
+    for formato in FORMATOS:
+        try:
+            return datetime.strptime(texto, formato)
+        except ValueError:
+            continue
+    return None
+
+
+def _fecha_de_respaldo(falla):
+    creada = como_fecha(falla.get("created_at"))
+    if creada is not None:
+        return creada
+    if isinstance(falla["_id"], ObjectId):
+        return como_fecha(falla["_id"].generation_time)
+    return datetime.utcnow()
+
+
+def normalizar_fechas(solo_reportar=False, lote=1000):
+    """
+    Convierte a fecha BSON toda `fecha` que no lo sea. Devuelve
+    {"revisadas", "interpretadas", "respaldo"}: respaldo cuenta las que no se
+    pudieron interpretar y tomaron created_at o la fecha del _id.
+    """
+    resumen = {"revisadas": 0, "interpretadas": 0, "respaldo": 0}
+    operaciones = []
+    for falla in fallas.find(SIN_FECHA, {"fecha": 1, "created_at": 1}):
+        resumen["revisadas"] += 1
+        fecha = como_fecha(falla.get("fecha"))
+        cambios = {"fecha": fecha}
+        if fecha is None:
+            resumen["respaldo"] += 1
+            cambios = {"fecha": _fecha_de_respaldo(falla), "fecha_original": falla.get("fecha")}
+        else:
+            resumen["interpretadas"] += 1
+        if solo_reportar:
+            continue
+        # updated_at: el refresco incremental de fallas_detalle también la recoge
+        cambios["updated_at"] = datetime.utcnow()
+        operaciones.append(UpdateOne({"_id": falla["_id"], **SIN_FECHA}, {"$set": cambios}))
+        if len(operaciones) >= lote:
+            fallas.bulk_write(operaciones, ordered=False)
+            operaciones = []
+    if operaciones:
+        fallas.bulk_write(operaciones, ordered=False)
+    return resumen
+
+
+if __name__ == "__main__":
+    import sys
+    solo_reportar = "--solo-reportar" in sys.argv
+    resumen = normalizar_fechas(solo_reportar=solo_reportar)
+    accion = "por corregir" if solo_reportar else "corregidas"
+    print(f"✅ Fallas sin fecha válida: {resumen['revisadas']} {accion} "
+          f"({resumen['interpretadas']} interpretadas, {resumen['respaldo']} con fecha de respaldo)")
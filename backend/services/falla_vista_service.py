@@ -0,0 +1,187 @@
+# backend/services/falla_vista_service.py
+#
+# Vista de fallas con sus referencias resueltas en una sola agregación:
+#
+#   lugar_id                      -> lugar {nombre, tipo, ubicacion}
+#   usuario_reporta / revisa .id  -> usuario vigente {nombre, correo, rol}
+#   materiales_usados.id_material -> material {clave, descripción, existencia, costo}
+#
+# Cada $lookup usa un sub-pipeline con proyección, así que sólo viajan los
+# campos que se muestran. Las búsquedas comparan _id por igualdad (el de
+# materiales con localField/foreignField, MongoDB 5.0+), que usa el índice.
+#
+# La misma agregación puede persistirse con $merge en `fallas_detalle`
+# (vista materializada a demanda). El refresco incremental sólo recalcula las
+# fallas con updated_at posterior a la última ejecución o que apuntan a
+# lugares/materiales modificados desde entonces. Ejecutar periódicamente:
+#     python -m backend.services.falla_vista_service [--completo]
+
+from datetime import datetime, timedelta
+from backend.services.db_connection import get_collection
+from config.env import (
+    COLLECTION_FALLAS, COLLECTION_FALLAS_DETALLE, COLLECTION_LUGARES,
+    COLLECTION_MATERIALES, COLLECTION_PROCESOS, COLLECTION_USERS
+)
+
+fallas = get_collection(COLLECTION_FALLAS)
+fallas_detalle = get_collection(COLLECTION_FALLAS_DETALLE)
+lugares = get_collection(COLLECTION_LUGARES)
+materiales = get_collection(COLLECTION_MATERIALES)
+procesos = get_collection(COLLECTION_PROCESOS)
+
+PROCESO_ID = "fallas_detalle"
+# Margen para no perder escrituras que estaban en curso durante el refresco anterior
+MARGEN_REFRESCO = timedelta(seconds=5)
+
+# Índices de `fallas` que sirven los $match del refresco incremental
+FALLA_REFERENCIA_INDEXES = [
+    [("updated_at", 1)],
+    [("materiales_usados.id_material", 1)],
+]
+
+
+def _como_oid(expresion):
+    """Las referencias pueden estar guardadas como ObjectId o como texto."""
+    return {"$convert": {"input": expresion, "to": "objectId", "onError": None, "onNull": None}}
+
+
+def _lookup_usuario(campo, destino):
+    return {"$lookup": {
+        "from": COLLECTION_USERS,
+        "let": {"uid": _como_oid(f"${campo}.id")},
+        "pipeline": [
+            {"$match": {"$expr": {"$eq": ["$_id", "$$uid"]}}},
+            {"$project": {"_id": 0, "nombre": 1, "correo": 1, "rol": 1}},
+        ],
+        "as": destino,
+    }}
+
+
+def etapas_detalle():
+    """Etapas que se agregan tras el $match/$sort/$limit de las fallas a mostrar."""
+    return [
+        {"$lookup": {
+            "from": COLLECTION_LUGARES,
+            "let": {"lid": _como_oid("$lugar_id")},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$_id", "$$lid"]}}},
+                {"$project": {"_id": 0, "nombre": 1, "tipo": 1, "ubicacion": 1}},
+            ],
+            "as": "lugar",
+        }},
+        _lookup_usuario("usuario_reporta", "reporta"),
+        _lookup_usuario("usuario_revisa", "revisa"),
+        # $in dentro de $expr no usa el índice: se normalizan los ids a un
+        # arreglo y el $lookup va por localField/foreignField (igualdad, con índice)
+        {"$set": {"_ids_material": {"$map": {
+            "input": {"$ifNull": ["$materiales_usados", []]},
+            "as": "linea",
+            "in": _como_oid("$$linea.id_material"),
+        }}}},
+        {"$lookup": {
+            "from": COLLECTION_MATERIALES,
+            "localField": "_ids_material",
+            "foreignField": "_id",
+            "pipeline": [
+                {"$project": {"clave_material": 1, "descripcion": 1, "existencia": 1, "costo_promedio": 1}},
+            ],
+            "as": "_materiales",
+        }},
+        {"$set": {
+            "lugar": {"$first": "$lugar"},
+            "reporta": {"$first": "$reporta"},
+            "revisa": {"$first": "$revisa"},
+            # Cada línea conserva su cantidad y recibe el material vigente
+            "materiales_usados": {"$map": {
+                "input": {"$ifNull": ["$materiales_usados", []]},
+                "as": "linea",
+                "in": {"$mergeObjects": ["$$linea", {"material": {"$first": {"$filter": {
+                    "input": "$_materiales",
+                    "as": "m",
+                    "cond": {"$eq": ["$$m._id", _como_oid("$$linea.id_material")]},
+                }}}}]},
+            }},
+        }},
+        {"$unset": ["_materiales", "_ids_material", "materiales_usados.material._id"]},
+    ]
+
+
+def detalle(filtro, orden, limit):
+    """Fallas que cumplen el filtro, ya unidas con lugar, usuarios y materiales."""
+    pipeline = [{"$match": filtro}, {"$sort": dict(orden)}, {"$limit": limit}, *etapas_detalle()]
+    return list(fallas.aggregate(pipeline))
+
+
+def ensure_vista_indexes(indices_consulta):
+    """Índices de referencia en `fallas` y los de consulta en la vista materializada."""
+    for keys in FALLA_REFERENCIA_INDEXES:
+        fallas.create_index(keys)
+    for keys in indices_consulta:
+        fallas_detalle.create_index(keys)
+
+
+def _filtro_incremental(desde):
+    """Fallas modificadas desde `desde` o cuyas referencias cambiaron desde entonces."""
+    condiciones = [{"updated_at": {"$gt": desde}}]
+    cambiados = {"updated_at": {"$gt": desde}}
+    material_ids = materiales.distinct("_id", cambiados)
+    if material_ids:
+        condiciones.append({"materiales_usados.id_material": {"$in": material_ids}})
+    lugar_ids = lugares.distinct("_id", cambiados)
+    if lugar_ids:
+        condiciones.append({"lugar_id": {"$in": lugar_ids + [str(l) for l in lugar_ids]}})
+    return {"$or": condiciones}
+
+
+def refrescar_vista(completo=False):
+    """
+    Actualiza `fallas_detalle` con $merge. En modo incremental sólo se
+    recalculan las fallas afectadas desde la última ejecución; completo=True
+    rehace toda la vista (también recoge cambios de nombre de usuarios, que no
+    llevan updated_at). Devuelve el número de fallas recalculadas.
+    """
+    inicio = datetime.utcnow()
+    # MongoDB guarda milisegundos: así la marca leída de vuelta es idéntica
+    inicio = inicio.replace(microsecond=inicio.microsecond // 1000 * 1000)
+    estado = procesos.find_one({"_id": PROCESO_ID}) or {}
+    ultima = estado.get("ultima_ejecucion")
+
+    filtro = {}
+    if ultima and not completo:
+        filtro = _filtro_incremental(ultima - MARGEN_REFRESCO)
+    recalculadas = fallas.count_documents(filtro)
+
+    if recalculadas:
+        fallas.aggregate([
+            {"$match": filtro},
+            *etapas_detalle(),
+            {"$set": {"refrescado_en": inicio}},
+            {"$merge": {"into": COLLECTION_FALLAS_DETALLE, "on": "_id",
+                        "whenMatched": "replace", "whenNotMatched": "insert"}},
+        ])
+    if not filtro:
+        # Las fallas borradas no aparecen en ningún $match: en un refresco
+        # completo queda fuera todo lo que no se reescribió en esta ejecución
+        fallas_detalle.delete_many({"refrescado_en": {"$ne": inicio}})
+
+    procesos.update_one({"_id": PROCESO_ID}, {"$set": {
+        "ultima_ejecucion": inicio,
+        "recalculadas": recalculadas,
+        "completo": bool(completo or not ultima),
+    }}, upsert=True)
+    return recalculadas
+
+
+def quitar_de_vista(falla_id):
+    """Borra una falla eliminada de la vista materializada."""
+    fallas_detalle.delete_one({"_id": falla_id})
+
+
+def get_ultimo_refresco():
+    return procesos.find_one({"_id": PROCESO_ID}) or {}
+
+
+if __name__ == "__main__":
+    import sys
+    total = refrescar_vista(completo="--completo" in sys.argv)
+    print(f"✅ Vista de fallas actualizada: {total} fallas recalculadas")
@@ -0,0 +1,210 @@
+# backend/services/forecast_service.py
+#
+# Motor de pronóstico de reorden por material y lugar. Ejecutar cada noche:
+#     python -m backend.services.forecast_service
+# El dashboard sólo lee los resultados precalculados de la colección `pronosticos`.
+
+from datetime import datetime, timedelta
+import numpy as np
+from pymongo import UpdateOne
+from backend.services.db_connection import get_collection
+from config.env import (
+    COLLECTION_FALLAS, COLLECTION_MATERIALES, COLLECTION_PRONOSTICOS, COLLECTION_PROCESOS
+)
+from config import settings
+
+fallas = get_collection(COLLECTION_FALLAS)
+materiales = get_collection(COLLECTION_MATERIALES)
+pronosticos = get_collection(COLLECTION_PRONOSTICOS)
+procesos = get_collection(COLLECTION_PROCESOS)
+
+PROCESO_ID = "pronosticos"
+# Margen para no perder escrituras que estaban en curso durante el refresco anterior
+MARGEN_REFRESCO = timedelta(seconds=5)
+
+
+def _inicio_semana(fecha):
+    dia = datetime(fecha.year, fecha.month, fecha.day)
+    return dia - timedelta(days=dia.weekday())
+
+
+def matriz_demanda(desde, material_ids=None):
+    """
+    Construye la matriz de demanda semanal (series x semanas) a partir de
+    fallas.materiales_usados. Devuelve (claves, semanas, D) donde claves[i]
+    es (material_id, lugar_id) de la fila i.
+    """
+    match = {"fecha": {"$gte": desde}}
+    if material_ids is not None:
+        match["materiales_usados.id_material"] = {"$in": list(material_ids)}
+
+    pipeline = [
+        {"$match": match},
+        {"$unwind": "$materiales_usados"},
+        {"$group": {
+            "_id": {
+                "material": "$materiales_usados.id_material",
+                "lugar": "$lugar_id",
+                "semana": {"$dateTrunc": {"date": "$fecha", "unit": "week", "startOfWeek": "monday"}},
+            },
+            "cantidad": {"$sum": "$materiales_usados.cantidad"},
+        }},
+    ]
+    filas = list(fallas.aggregate(pipeline))
+    if material_ids is not None:
+        filas = [f for f in filas if f["_id"]["material"] in material_ids]
+
+    inicio = _inicio_semana(desde)
+    n_semanas = (_inicio_semana(datetime.utcnow()) - inicio).days // 7 + 1
+    claves = sorted({(f["_id"]["material"], f["_id"].get("lugar")) for f in filas}, key=str)
+    indice = {clave: i for i, clave in enumerate(claves)}
+
+    D = np.zeros((len(claves), n_semanas))
+    for f in filas:
+        semana = (f["_id"]["semana"] - inicio).days // 7
+        if 0 <= semana < n_semanas:
+            D[indice[(f["_id"]["material"], f["_id"].get("lugar"))], semana] += f["cantidad"]
+    return claves, n_semanas, D
+
+
+def holt_batch(D, alpha=0.3, beta=0.1):
+    """
+    Suavizamiento exponencial doble (Holt) de todas las series a la vez: el
+    bucle recorre semanas y cada paso opera sobre el vector completo de SKUs.
+    Devuelve (nivel, tendencia, sigma) con sigma = RMSE de los errores a un paso.
+    """
+    n, T = D.shape
+    nivel = D[:, 0].astype(float)
+    tendencia = np.zeros(n)
+    errores = np.zeros((n, max(T - 1, 1)))
+    for t in range(1, T):
+        pronostico = nivel + tendencia
+        errores[:, t - 1] = D[:, t] - pronostico
+        nuevo_nivel = alpha * D[:, t] + (1 - alpha) * pronostico
+        tendencia = beta * (nuevo_nivel - nivel) + (1 - beta) * tendencia
+        nivel = nuevo_nivel
+    sigma = np.sqrt(np.mean(errores ** 2, axis=1))
+    return nivel, tendencia, sigma
+
+
+def puntos_de_reorden(demanda_semanal, sigma, existencia,
+                      lead_time=None, revision=None, z=None):
+    """
+    Punto de reorden = demanda durante el lead time + stock de seguridad.
+    Cantidad sugerida = lo necesario para cubrir lead time + periodo de revisión.
+    Todos los argumentos son vectores alineados por serie.
+    """
+    lead_time = lead_time or settings.FORECAST_LEAD_TIME_WEEKS
+    revision = revision or settings.FORECAST_REVIEW_WEEKS
+    z = settings.FORECAST_SERVICE_Z if z is None else z
+
+    stock_seguridad = z * sigma * np.sqrt(lead_time)
+    reorden = demanda_semanal * lead_time + stock_seguridad
+    objetivo = reorden + demanda_semanal * revision
+    sugerido = np.where(existencia <= reorden, np.ceil(objetivo - existencia), 0)
+    return reorden, np.maximum(sugerido, 0)
+
+
+def calcular_pronosticos(material_ids=None):
+    """Calcula pronóstico, punto de reorden y pedido sugerido para cada serie."""
+    desde = datetime.utcnow() - timedelta(weeks=settings.FORECAST_HISTORY_WEEKS)
+    claves, _, D = matriz_demanda(desde, material_ids)
+    if not claves:
+        return []
+
+    nivel, tendencia, sigma = holt_batch(D)
+    demanda = np.maximum(nivel + tendencia, 0)
+
+    ids = list({material for material, _ in claves})
+    existencias = {
+        m["_id"]: m.get("existencia", 0)
+        for m in materiales.find({"_id": {"$in": ids}}, {"existencia": 1})
+    }
+    existencia = np.array([existencias.get(material, 0) for material, _ in claves], dtype=float)
+    reorden, sugerido = puntos_de_reorden(demanda, sigma, existencia)
+
+    ahora = datetime.utcnow()
+    return [
+        {
+            "material_id": material,
+            "lugar_id": lugar,
+            "demanda_semanal": float(demanda[i]),
+            "tendencia": float(tendencia[i]),
+            "sigma": float(sigma[i]),
+            "existencia": float(existencia[i]),
+            "punto_reorden": float(reorden[i]),
+            "cantidad_sugerida": int(sugerido[i]),
+            "requiere_pedido": bool(sugerido[i] > 0),
+            "updated_at": ahora,
+        }
+        for i, (material, lugar) in enumerate(claves)
+    ]
+
+
+def _materiales_con_cambios(desde):
+    """Materiales con fallas nuevas o modificadas, o cuya existencia cambió (updated_at)."""
+    cambiados = {"updated_at": {"$gt": desde}}
+    return (set(fallas.distinct("materiales_usados.id_material", cambiados))
+            | set(materiales.distinct("_id", cambiados)))
+
+
+def refrescar_pronosticos(completo=False):
+    """
+    Recalcula y guarda los pronósticos. En modo incremental sólo se recalculan
+    los materiales con fallas nuevas o modificadas, o con cambios en el propio
+    material (existencia), desde la última ejecución. Al cambiar de semana se
+    recalcula todo, para que las series sin movimiento también avancen su ventana.
+    """
+    inicio = datetime.utcnow()
+    estado = procesos.find_one({"_id": PROCESO_ID}) or {}
+    ultima = estado.get("ultima_ejecucion")
+    if ultima and _inicio_semana(ultima) != _inicio_semana(inicio):
+        completo = True
+
+    material_ids = None
+    if ultima and not completo:
+        material_ids = _materiales_con_cambios(ultima - MARGEN_REFRESCO)
+        if not material_ids:
+            procesos.update_one({"_id": PROCESO_ID}, {"$set": {"ultima_ejecucion": inicio}}, upsert=True)
+            return 0
+
+    resultados = calcular_pronosticos(material_ids)
+    if resultados:
+        pronosticos.bulk_write([
+            UpdateOne(
+                {"material_id": r["material_id"], "lugar_id": r["lugar_id"]},
+                {"$set": r},
+                upsert=True
+            )
+            for r in resultados
+        ], ordered=False)
+    pronosticos.create_index([("material_id", 1), ("lugar_id", 1)], unique=True)
+    pronosticos.create_index([("requiere_pedido", -1), ("cantidad_sugerida", -1)])
+    pronosticos.create_index([("updated_at", -1)])   # firma de data_version.sondear
+
+    procesos.update_one({"_id": PROCESO_ID}, {"$set": {"ultima_ejecucion": inicio}}, upsert=True)
+    return len(resultados)
+
+
+def get_pronosticos(solo_pedidos=False, limit=100):
+    """Lee los pronósticos precalculados, priorizando los que requieren pedido."""
+    filtro = {"requiere_pedido": True} if solo_pedidos else {}
+    docs = pronosticos.find(filtro).sort([("requiere_pedido", -1), ("cantidad_sugerida", -1)]).limit(limit)
+    resultado = []
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+        doc["material_id"] = str(doc["material_id"])
+        doc["lugar_id"] = str(doc.get("lugar_id"))
+        resultado.append(doc)
+    return resultado
+
+
+def get_ultima_ejecucion():
+    estado = procesos.find_one({"_id": PROCESO_ID}) or {}
+    return estado.get("ultima_ejecucion")
+
+
+if __name__ == "__main__":
+    import sys
+    total = refrescar_pronosticos(completo="--completo" in sys.argv)
+    print(f"✅ Pronósticos actualizados: {total} series")
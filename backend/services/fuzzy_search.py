@@ -0,0 +1,371 @@
+# backend/services/fuzzy_search.py
+#
+# Búsqueda tolerante a errores de captura ("aerosl rojo" -> "AEROSOL ROJO").
+# El índice vive en memoria y se arma una vez por proceso:
+#
+#   documento -> palabras normalizadas (sin acentos, minúsculas)
+#   palabra   -> documentos que la contienen
+#   trigrama  -> palabras del vocabulario que lo contienen
+#
+# Cada error (incluida una transposición) rompe a lo sumo 4 trigramas, así
+# que una palabra con k errores conserva al menos uno de cualesquiera 4k+1 de
+# sus trigramas: basta unir las palabras de los 4k+1 trigramas
+# más raros y verificar la distancia de edición sólo sobre ellas. El trabajo
+# depende del vocabulario (decenas de miles de palabras), no del número de
+# materiales.
+#
+# Las escrituras de los controladores se aplican al índice en el momento
+# (upsert/eliminar). Si la colección cambió por otro lado (versión de
+# data_version distinta), la siguiente búsqueda relee sólo los documentos con
+# updated_at posterior a la última sincronización; el índice se reconstruye
+# completo únicamente si el número de documentos ya no cuadra (borrados o
+# inserciones sin updated_at hechos fuera de la app).
+
+import heapq
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from bson import ObjectId
+from backend.services.data_version import get_version
+from config import settings
+
+_PALABRA = re.compile(r"[a-z0-9]+")
+MAX_EXPANSION_PREFIJO = 256     # Palabras que puede abarcar el prefijo de la última palabra
+MAX_CANDIDATOS_PUNTAJE = 5000   # Arriba de esto se puntúan primero las coincidencias exactas
+# Margen para no perder escrituras en curso durante la sincronización anterior
+MARGEN_SINCRONIZACION = timedelta(seconds=5)
+
+_indices = {}
+_indices_lock = threading.Lock()
+
+
+def normalizar(texto):
+    """'Aerosól ROJO-400ml' -> ['aerosol', 'rojo', '400ml']"""
+    texto = unicodedata.normalize("NFKD", str(texto or "")).lower()
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return _PALABRA.findall(texto)
+
+
+def _trigramas(palabra, prefijo=False):
+    marcada = f"${palabra}" if prefijo else f"${palabra}$"
+    return {marcada[i:i + 3] for i in range(len(marcada) - 2)}
+
+
+def _tolerancia(palabra):
+    """Ediciones permitidas según el largo: las palabras cortas deben escribirse bien."""
+    if len(palabra) <= 3:
+        return 0
+    if len(palabra) <= 6:
+        return min(1, settings.FUZZY_MAX_DISTANCIA)
+    return settings.FUZZY_MAX_DISTANCIA
+
+
+def distancia(buscada, palabra, k, prefijo=False):
+    """
+    Distancia de edición acotada (inserción, borrado, sustitución y
+    transposición de letras vecinas): devuelve la distancia o k + 1 si la
+    supera. Con prefijo=True mide contra el prefijo de `palabra` más parecido.
+    """
+    if not prefijo and abs(len(buscada) - len(palabra)) > k:
+        return k + 1
+    previa, fila = None, list(range(len(palabra) + 1))
+    for i, a in enumerate(buscada, 1):
+        actual = [i] + [0] * len(palabra)
+        for j, b in enumerate(palabra, 1):
+            costo = min(fila[j] + 1, actual[j - 1] + 1, fila[j - 1] + (a != b))
+            if previa is not None and j > 1 and a == palabra[j - 2] and buscada[i - 2] == b:
+                costo = min(costo, previa[j - 2] + 1)
+            actual[j] = costo
+        if min(actual) > k:
+            return k + 1
+        previa, fila = fila, actual
+    resultado = min(fila) if prefijo else fila[-1]
+    return resultado if resultado <= k else k + 1
+
+
+def _difusa(palabra):
+    """Sólo las palabras sin dígitos admiten errores; claves y medidas van exactas o por prefijo."""
+    return palabra.isalpha()
+
+
+class IndiceDifuso:
+    """Índice de trigramas sobre las palabras de uno o más campos de texto."""
+
+    def __init__(self, collection, campos):
+        self.collection = collection
+        self.campos = tuple(campos)
+        self._lock = threading.RLock()
+        self._version = None
+        self._sincronizado_en = None
+        self._docs = {}      # id -> (palabras, largo del texto)
+        self._postings = {}  # palabra -> {ids}
+        self._gramas = {}    # trigrama -> {palabras}
+        self._vocabulario = []
+
+    # --- mantenimiento ---------------------------------------------------
+
+    def _texto(self, doc):
+        return " ".join(str(doc.get(c) or "") for c in self.campos)
+
+    def _agregar(self, doc_id, doc):
+        texto = self._texto(doc)
+        palabras = tuple(dict.fromkeys(normalizar(texto)))
+        self._docs[doc_id] = (palabras, len(texto))
+        for palabra in palabras:
+            ids = self._postings.get(palabra)
+            if ids is None:
+                ids = self._postings[palabra] = set()
+                if _difusa(palabra):
+                    for grama in _trigramas(palabra):
+                        self._gramas.setdefault(grama, set()).add(palabra)
+                if self._vocabulario is not None:
+                    self._vocabulario.insert(bisect_left(self._vocabulario, palabra), palabra)
+            ids.add(doc_id)
+
+    def _quitar(self, doc_id):
+        palabras, _ = self._docs.pop(doc_id, ((), 0))
+        for palabra in palabras:
+            ids = self._postings[palabra]
+            ids.discard(doc_id)
+            if not ids:
+                del self._postings[palabra]
+                if _difusa(palabra):
+                    for grama in _trigramas(palabra):
+                        self._gramas[grama].discard(palabra)
+                del self._vocabulario[bisect_left(self._vocabulario, palabra)]
+
+    def reconstruir(self):
+        """Lee sólo los campos indexados de toda la colección y arma el índice."""
+        with self._lock:
+            version = get_version(self.collection.name)
+            inicio = datetime.utcnow()
+            self._docs, self._postings, self._gramas = {}, {}, {}
+            self._vocabulario = None   # se ordena una sola vez al final
+            proyeccion = {c: 1 for c in self.campos}
+            for doc in self.collection.find({}, proyeccion, batch_size=5000):
+                self._agregar(str(doc["_id"]), doc)
+            self._vocabulario = sorted(self._postings)
+            self._version = version
+            self._sincronizado_en = inicio
+
+    def _sincronizar(self):
+        version = get_version(self.collection.name)
+        if self._version == version:
+            return
+        if self._version is None:
+            self.reconstruir()
+            return
+        # Cambios de existencia, reservas, etc. también suben la versión: sólo
+        # se releen los documentos tocados desde la última sincronización
+        inicio = datetime.utcnow()
+        proyeccion = {c: 1 for c in self.campos}
+        for doc in self.collection.find({"updated_at": {"$gt": self._sincronizado_en - MARGEN_SINCRONIZACION}}, proyeccion):
+            doc_id = str(doc["_id"])
+            self._quitar(doc_id)
+            self._agregar(doc_id, doc)
+        if self.collection.estimated_document_count() != len(self._docs):
+            self.reconstruir()
+            return
+        self._version = version
+        self._sincronizado_en = inicio
+
+    def upsert(self, doc_id, doc, version=None):
+        """
+        Aplica al índice un documento creado o modificado. `version` es la que
+        devolvió data_version.bump() tras la escritura: si el índice estaba al
+        día justo antes, queda al día sin reconstruirse.
+        """
+        with self._lock:
+            if self._version is None:
+                return
+            doc_id = str(doc_id)
+            if doc_id in self._docs and not any(c in doc for c in self.campos):
+                # La escritura no tocó los campos indexados
+                self._seguir_version(version)
+                return
+            if not all(c in doc for c in self.campos):
+                # Actualización parcial: los campos indexados vigentes se leen de la base
+                doc = self.collection.find_one({"_id": como_id(doc_id)}, {c: 1 for c in self.campos}) or {}
+            self._quitar(doc_id)
+            self._agregar(doc_id, doc)
+            self._seguir_version(version)
+
+    def eliminar(self, doc_id, version=None):
+        with self._lock:
+            if self._version is None:
+                return
+            self._quitar(str(doc_id))
+            self._seguir_version(version)
+
+    def sin_cambios(self, version):
+        """Para escrituras que no tocan los campos indexados (p. ej. ediciones masivas de existencia)."""
+        with self._lock:
+            self._seguir_version(version)
+
+    def _seguir_version(self, version):
+        if version is not None and self._version == version - 1:
+            self._version = version
+
+    # --- búsqueda --------------------------------------------------------
+
+    def _coincidencias(self, buscada, prefijo):
+        """{palabra del vocabulario: peso} para una palabra buscada."""
+        pesos = {}
+        if buscada in self._postings:
+            pesos[buscada] = 1.0
+        if prefijo:
+            inicio = bisect_left(self._vocabulario, buscada)
+            for palabra in self._vocabulario[inicio:inicio + MAX_EXPANSION_PREFIJO]:
+                if not palabra.startswith(buscada):
+                    break
+                pesos.setdefault(palabra, 0.9)
+
+        if not _difusa(buscada):
+            return pesos
+        k = _tolerancia(buscada)
+        if k == 0:
+            return pesos
+        # En palabras cortas puede haber menos de 4k+1 trigramas: se usan todos
+        gramas = sorted(_trigramas(buscada, prefijo), key=lambda g: len(self._gramas.get(g, ())))
+
+        candidatas = set()
+        for grama in gramas[:4 * k + 1]:
+            candidatas |= self._gramas.get(grama, set())
+        for palabra in candidatas:
+            if palabra in pesos:
+                continue
+            d = distancia(buscada, palabra, k, prefijo)
+            if d <= k:
+                peso = 1 - d / (len(buscada) + 1)
+                pesos[palabra] = peso * (0.85 if prefijo else 0.95)
+        return pesos
+
+    def _candidatos(self, texto):
+        """
+        (palabras buscadas, pesos por palabra, ids que cumplen todas). Cada
+        palabra buscada debe aparecer en el documento (exacta, como prefijo si
+        es la última, o con errores acotados); las palabras sin ninguna
+        coincidencia en el vocabulario no filtran, sólo bajan el puntaje.
+        Llamar con el candado tomado.
+        """
+        buscadas = list(dict.fromkeys(normalizar(texto)))
+        if not buscadas:
+            return buscadas, [], set()
+        # La última palabra puede estar a medio escribir, salvo que ya haya un espacio
+        abierta = not str(texto).endswith((" ", "\t"))
+
+        self._sincronizar()
+        pesos = [
+            self._coincidencias(b, prefijo=abierta and i == len(buscadas) - 1)
+            for i, b in enumerate(buscadas)
+        ]
+        conjuntos = []
+        for coincidencias in pesos:
+            if coincidencias:
+                ids = set()
+                for palabra in coincidencias:
+                    ids |= self._postings[palabra]
+                conjuntos.append(ids)
+        if not conjuntos:
+            return buscadas, pesos, set()
+        return buscadas, pesos, set.intersection(*sorted(conjuntos, key=len))
+
+    def coincidentes(self, texto):
+        """Todos los ids que coinciden con el texto, sin tope ni orden (p. ej. para contarlos)."""
+        with self._lock:
+            return self._candidatos(texto)[2]
+
+    def buscar(self, texto, limit=None):
+        """[(id, puntaje)] de los `limit` mejores, ordenados de mejor a peor."""
+        limit = limit or settings.FUZZY_MAX_RESULTADOS
+        with self._lock:
+            buscadas, pesos, candidatos = self._candidatos(texto)
+            if not candidatos:
+                return []
+
+            if len(candidatos) > MAX_CANDIDATOS_PUNTAJE:
+                # Con todas las palabras exactas el puntaje es el máximo posible:
+                # si alcanzan para la página, sólo falta desempatar por largo
+                exactos = [self._postings.get(b, set()) for b in buscadas]
+                exactos = set.intersection(*sorted(exactos, key=len))
+                if len(exactos) >= limit:
+                    mejores = heapq.nsmallest(limit, exactos, key=lambda d: self._docs[d][1])
+                    return [(doc_id, 1.0) for doc_id in mejores]
+
+            def puntaje(doc_id):
+                palabras, largo = self._docs[doc_id]
+                total = sum(max((p.get(w, 0.0) for w in palabras), default=0.0) for p in pesos)
+                return total / len(pesos), -largo
+
+            mejores = heapq.nlargest(limit, candidatos, key=puntaje)
+            return [(doc_id, round(puntaje(doc_id)[0], 3)) for doc_id in mejores]
+
+    def __len__(self):
+        return len(self._docs)
+
+
+def como_id(doc_id):
+    """Los ids del índice son texto; para consultar se regresan a ObjectId."""
+    return ObjectId(doc_id) if ObjectId.is_valid(doc_id) else doc_id
+
+
+def get_indice(collection, campos):
+    """Índice compartido por todas las sesiones para esa colección y campos."""
+    clave = (collection.full_name, tuple(campos))
+    with _indices_lock:
+        indice = _indices.get(clave)
+        if indice is None:
+            indice = _indices[clave] = IndiceDifuso(collection, campos)
+        return indice
+
+
+if __name__ == "__main__":
+    # Índice de 1 000 000 de materiales sintéticos en memoria (sin MongoDB)
+    import random
+    import statistics
+    import time
+
+    class _ColeccionFalsa:
+        name = full_name = "bench_difuso"
+
+        def __init__(self, docs):
+            self.docs = docs
+
+        def find(self, *args, **kwargs):
+            return iter(self.docs)
+
+    N = 1_000_000
+    random.seed(7)
+    genericos = ["AEROSOL", "BATERIA", "FILTRO", "LLANTA", "BALATA", "ACEITE", "FOCO", "MANGUERA",
+                 "AMORTIGUADOR", "BUJIA", "EMPAQUE", "TORNILLO", "RETEN", "BANDA", "CLUTCH"]
+    colores = ["ROJO", "NEGRO", "BLANCO", "AZUL", "GRIS", "VERDE", "AMARILLO", "PLATA"]
+    marcas = [f"MARCA{i}" for i in range(300)]
+    docs = [
+        {
+            "_id": f"{i:024x}",
+            "clave_material": f"TV{i:07d}",
+            "descripcion": f"{random.choice(genericos)} {random.choice(colores)} "
+                           f"{random.choice(marcas)} {random.randint(1, 999)}ML",
+        }
+        for i in range(N)
+    ]
+    indice = IndiceDifuso(_ColeccionFalsa(docs), ["clave_material", "descripcion"])
+
+    inicio = time.perf_counter()
+    indice.reconstruir()
+    print(f"{N:,} materiales · {len(indice._vocabulario):,} palabras · "
+          f"armado en {time.perf_counter() - inicio:.1f} s")
+
+    consultas = ["aerosl rojo", "amortiguadr negr marca12", "tv00012", "bateria azl 250ml",
+                 "manguera verde marca299 ", "bujia", "flitro gris marca7"]
+    for consulta in consultas:
+        tiempos = []
+        for _ in range(5):
+            inicio = time.perf_counter()
+            resultados = indice.buscar(consulta, limit=20)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        primero = indice._docs[resultados[0][0]][0] if resultados else ()
+        print(f"  {consulta!r:30} {statistics.median(tiempos):8.1f} ms · "
+              f"{len(resultados):3} resultados · mejor: {' '.join(primero)}")
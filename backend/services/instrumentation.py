@@ -0,0 +1,281 @@
+# backend/services/instrumentation.py
+#
+# Instrumentación ligera de controladores y comandos de MongoDB. Cada rerun
+# de Streamlit se abre con medir_rerun(pagina); las llamadas hechas desde ese
+# hilo se atribuyen a la página del menú de main.py que las provocó.
+#
+# Los controladores se envuelven en su módulo (instrumentar_controladores), así
+# que debe llamarse antes de que la GUI haga `from ... import funcion`.
+
+import hashlib
+import importlib
+import inspect
+import json
+import pkgutil
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from functools import wraps
+import bson
+from bson import json_util
+from pymongo import monitoring
+from config import settings
+
+SIN_PAGINA = "(sin página)"
+
+_contexto = threading.local()
+_lock = threading.Lock()
+_metricas = {}    # (pagina, tipo, nombre) -> acumulados
+_reruns = deque(maxlen=settings.PERF_MAX_RERUNS)
+_al_cerrar = []   # funciones(rerun) que analizan cada rerun al terminar
+
+# Campos de un comando que cambian en cada envío y no forman parte de la consulta
+_CAMPOS_DE_SESION = {
+    "lsid", "$clusterTime", "$db", "txnNumber", "autocommit", "startTransaction",
+    "$readPreference", "readConcern", "writeConcern",
+}
+
+
+def _rerun_actual():
+    return getattr(_contexto, "rerun", None)
+
+
+def pagina_actual():
+    rerun = _rerun_actual()
+    return rerun["pagina"] if rerun else SIN_PAGINA
+
+
+def _registrar(tipo, nombre, segundos, documentos=0, bytes_=0, error=False, consulta=None):
+    clave = (pagina_actual(), tipo, nombre)
+    with _lock:
+        m = _metricas.get(clave)
+        if m is None:
+            m = _metricas[clave] = {
+                "llamadas": 0, "segundos": 0.0, "max_segundos": 0.0,
+                "documentos": 0, "bytes": 0, "errores": 0,
+            }
+        m["llamadas"] += 1
+        m["segundos"] += segundos
+        m["max_segundos"] = max(m["max_segundos"], segundos)
+        m["documentos"] += documentos
+        m["bytes"] += bytes_
+        m["errores"] += int(error)
+
+    rerun = _rerun_actual()
+    if rerun is not None:
+        llamada = {
+            "tipo": tipo, "nombre": nombre, "ms": segundos * 1000,
+            "documentos": documentos, "bytes": bytes_, "error": error,
+        }
+        if consulta is not None:
+            llamada["firma"] = consulta["firma"]
+            rerun["consultas"].setdefault(consulta["firma"], consulta)
+        rerun["llamadas"].append(llamada)
+
+
+def registrar_al_cerrar(fn):
+    """Registra fn(rerun) para ejecutarse al terminar cada rerun medido."""
+    if fn not in _al_cerrar:
+        _al_cerrar.append(fn)
+
+
+@contextmanager
+def medir_rerun(pagina):
+    """Abre el registro de un rerun y lo guarda al terminar (también si se interrumpe)."""
+    rerun = {"pagina": pagina, "inicio": time.time(), "llamadas": [], "consultas": {}}
+    anterior = _rerun_actual()
+    _contexto.rerun = rerun
+    inicio = time.perf_counter()
+    try:
+        yield rerun
+    finally:
+        rerun["ms"] = (time.perf_counter() - inicio) * 1000
+        _contexto.rerun = anterior
+        for fn in _al_cerrar:
+            try:
+                fn(rerun)
+            except Exception:
+                # El análisis nunca debe tumbar la página
+                pass
+        # Los comandos completos sólo hacen falta para el análisis
+        rerun.pop("consultas", None)
+        with _lock:
+            _reruns.append(rerun)
+
+
+# ── Controladores ──────────────────────────────────────────────────────────
+
+def instrumentar(fn, nombre):
+    """Envuelve fn para medir su latencia; idempotente."""
+    if getattr(fn, "__instrumentado__", False):
+        return fn
+
+    @wraps(fn)
+    def envoltura(*args, **kwargs):
+        inicio = time.perf_counter()
+        error = False
+        try:
+            resultado = fn(*args, **kwargs)
+        except Exception:
+            error = True
+            raise
+        finally:
+            # Documentos y bytes los registra el monitor de comandos; aquí sólo la latencia
+            _registrar("controlador", nombre, time.perf_counter() - inicio, error=error)
+        return resultado
+
+    envoltura.__instrumentado__ = True
+    return envoltura
+
+
+def instrumentar_modulo(modulo):
+    """Reemplaza las funciones públicas definidas en el módulo por su versión medida."""
+    for nombre, fn in inspect.getmembers(modulo, inspect.isfunction):
+        if nombre.startswith("_") or fn.__module__ != modulo.__name__:
+            continue
+        setattr(modulo, nombre, instrumentar(fn, f"{modulo.__name__.rsplit('.', 1)[-1]}.{nombre}"))
+
+
+def instrumentar_controladores(paquete="backend.controllers"):
+    """Instrumenta todos los módulos de backend/controllers que se puedan importar."""
+    ruta = importlib.import_module(paquete).__path__
+    instrumentados = []
+    for info in pkgutil.iter_modules(ruta):
+        try:
+            modulo = importlib.import_module(f"{paquete}.{info.name}")
+        except ImportError:
+            # Módulos heredados con dependencias que ya no existen
+            continue
+        instrumentar_modulo(modulo)
+        instrumentados.append(info.name)
+    return instrumentados
+
+
+# ── MongoDB ────────────────────────────────────────────────────────────────
+
+def _documentos(reply):
+    cursor = reply.get("cursor")
+    if cursor:
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+    return int(reply.get("n", 0))
+
+
+class MonitorComandos(monitoring.CommandListener):
+    """
+    Mide cada comando enviado a MongoDB. pymongo notifica desde el hilo que
+    ejecuta el comando, así que la página se toma del contexto del rerun.
+    """
+
+    def __init__(self):
+        # Un comando cuya conexión se cae no llega a succeeded/failed: el
+        # registro se acota a PERF_MAX_EN_CURSO y descarta los más antiguos
+        self._en_curso = OrderedDict()
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        coleccion = event.command.get(event.command_name)
+        nombre = f"{event.command_name} {coleccion}" if isinstance(coleccion, str) else event.command_name
+        consulta = None
+        if _rerun_actual() is not None and event.command_name != "getMore":
+            # Sólo dentro de un rerun: la firma permite detectar consultas repetidas
+            comando = {k: v for k, v in event.command.items() if k not in _CAMPOS_DE_SESION}
+            consulta = {
+                "firma": hashlib.sha1(json_util.dumps(comando, sort_keys=True).encode()).hexdigest()[:16],
+                "comando": comando,
+                "base": event.database_name,
+                "nombre": nombre,
+            }
+        with self._lock:
+            self._en_curso[(event.request_id, event.connection_id)] = (nombre, consulta)
+            while len(self._en_curso) > settings.PERF_MAX_EN_CURSO:
+                self._en_curso.popitem(last=False)
+
+    def _terminar(self, event):
+        with self._lock:
+            return self._en_curso.pop((event.request_id, event.connection_id), (event.command_name, None))
+
+    def succeeded(self, event):
+        nombre, consulta = self._terminar(event)
+        reply = event.reply or {}
+        bytes_ = len(bson.encode(reply)) if settings.PERF_MEDIR_BYTES and "cursor" in reply else 0
+        _registrar("mongo", nombre, event.duration_micros / 1e6, _documentos(reply), bytes_, consulta=consulta)
+
+    def failed(self, event):
+        nombre, consulta = self._terminar(event)
+        _registrar("mongo", nombre, event.duration_micros / 1e6, error=True, consulta=consulta)
+
+
+monitor = MonitorComandos()
+
+
+# ── Consulta y exportación ────────────────────────────────────────────────
+
+def get_metricas():
+    """Acumulados por (página, tipo, nombre) como lista de filas."""
+    with _lock:
+        return [
+            {"pagina": p, "tipo": t, "nombre": n, **m,
+             "ms_promedio": m["segundos"] * 1000 / m["llamadas"]}
+            for (p, t, n), m in _metricas.items()
+        ]
+
+
+def get_reruns():
+    """Resumen de los últimos reruns, del más reciente al más antiguo."""
+    with _lock:
+        reruns = list(_reruns)
+    resumen = []
+    for r in reversed(reruns):
+        mongo = [c for c in r["llamadas"] if c["tipo"] == "mongo"]
+        resumen.append({
+            "pagina": r["pagina"],
+            "inicio": r["inicio"],
+            "ms": r["ms"],
+            "controladores": sum(1 for c in r["llamadas"] if c["tipo"] == "controlador"),
+            "consultas": len(mongo),
+            "ms_mongo": sum(c["ms"] for c in mongo),
+            "documentos": sum(c["documentos"] for c in mongo),
+            "bytes": sum(c["bytes"] for c in mongo),
+        })
+    return resumen
+
+
+def reiniciar():
+    with _lock:
+        _metricas.clear()
+        _reruns.clear()
+
+
+def _etiqueta(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def exportar_prometheus():
+    """Métricas acumuladas en formato de texto de Prometheus."""
+    series = [
+        ("llamadas", "calls_total", "Llamadas registradas"),
+        ("segundos", "seconds_total", "Tiempo acumulado en segundos"),
+        ("documentos", "documents_total", "Documentos devueltos por MongoDB"),
+        ("bytes", "bytes_total", "Bytes de respuesta decodificados"),
+        ("errores", "errors_total", "Llamadas que terminaron en error"),
+    ]
+    filas = get_metricas()
+    lineas = []
+    for campo, sufijo, ayuda in series:
+        metrica = f"fonttrack_{sufijo}"
+        lineas.append(f"# HELP {metrica} {ayuda}")
+        lineas.append(f"# TYPE {metrica} counter")
+        for f in filas:
+            etiquetas = (
+                f'pagina="{_etiqueta(f["pagina"])}",tipo="{f["tipo"]}",nombre="{_etiqueta(f["nombre"])}"'
+            )
+            lineas.append(f"{metrica}{{{etiquetas}}} {f[campo]}")
+    return "\n".join(lineas) + "\n"
+
+
+def exportar_json():
+    """Métricas acumuladas y últimos reruns (con el detalle de cada llamada)."""
+    with _lock:
+        reruns = list(_reruns)
+    return json.dumps({"metricas": get_metricas(), "reruns": reruns}, ensure_ascii=False, indent=2)
@@ -0,0 +1,178 @@
+# backend/services/inventario_service.py
+#
+# Contadores de inventario por lugar, guardados en el propio documento:
+#
+#   lugar.inventario = {materiales, existencia, valor, stock_bajo}
+#
+# Cada escritura de un material aplica con $inc la diferencia entre su aporte
+# antes y después del cambio, así las tarjetas de lugares no recorren
+# `materiales`. Las ediciones masivas recalculan sólo los lugares tocados y
+# la reconciliación (ejecutar cada noche) recalcula todo en una agregación y
+# reporta la deriva:
+#     python -m backend.services.inventario_service [--solo-reportar]
+
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+from backend.services.db_connection import get_collection
+from config.env import COLLECTION_LUGARES, COLLECTION_MATERIALES, COLLECTION_PROCESOS
+from config import settings
+
+lugares = get_collection(COLLECTION_LUGARES)
+materiales = get_collection(COLLECTION_MATERIALES)
+procesos = get_collection(COLLECTION_PROCESOS)
+
+PROCESO_ID = "inventario_lugares"
+CONTADORES = ("materiales", "existencia", "valor", "stock_bajo")
+# Campos del material que afectan los contadores
+CAMPOS_MATERIAL = {"lugar_id": 1, "existencia": 1, "costo_promedio": 1}
+
+
+def _lugar_oid(lugar_id):
+    """lugar_id puede estar guardado como ObjectId o como texto."""
+    if isinstance(lugar_id, ObjectId):
+        return lugar_id
+    return ObjectId(lugar_id) if lugar_id and ObjectId.is_valid(lugar_id) else None
+
+
+def aporte(material):
+    """Lo que un material suma a los contadores de su lugar."""
+    existencia = material.get("existencia") or 0
+    return {
+        "materiales": 1,
+        "existencia": existencia,
+        "valor": existencia * (material.get("costo_promedio") or 0),
+        # Bajo o agotado, el mismo corte que las tarjetas de materiales
+        "stock_bajo": int(existencia <= settings.STOCK_BAJO_UMBRAL),
+    }
+
+
+def aplicar_cambio(antes=None, despues=None, session=None):
+    """
+    Ajusta con $inc los contadores de los lugares de `antes` y `despues`
+    (documentos del material; None al crear o eliminar). Si el material
+    cambió de lugar, uno resta y el otro suma.
+    """
+    aplicar_cambios([(antes, despues)], session=session)
+
+
+def aplicar_cambios(pares, session=None):
+    """Como aplicar_cambio para muchos pares (antes, despues), en un solo bulk_write."""
+    deltas = {}
+    documentos = ((doc, signo) for antes, despues in pares for doc, signo in ((antes, -1), (despues, 1)))
+    for doc, signo in documentos:
+        if not doc:
+            continue
+        lugar = _lugar_oid(doc.get("lugar_id"))
+        if lugar is None:
+            continue
+        delta = deltas.setdefault(lugar, dict.fromkeys(CONTADORES, 0))
+        for campo, valor in aporte(doc).items():
+            delta[campo] += signo * valor
+
+    operaciones = [
+        UpdateOne({"_id": lugar}, {"$inc": {f"inventario.{c}": v for c, v in delta.items() if v}})
+        for lugar, delta in deltas.items() if any(delta.values())
+    ]
+    if operaciones:
+        lugares.bulk_write(operaciones, ordered=False, session=session)
+
+
+def _pipeline(lugar_ids=None):
+    pipeline = []
+    if lugar_ids is not None:
+        valores = [v for l in lugar_ids for v in (l, str(l))]
+        pipeline.append({"$match": {"lugar_id": {"$in": valores}}})
+    existencia = {"$ifNull": ["$existencia", 0]}
+    pipeline.append({"$group": {
+        "_id": {"$toString": "$lugar_id"},
+        "materiales": {"$sum": 1},
+        "existencia": {"$sum": existencia},
+        "valor": {"$sum": {"$multiply": [existencia, {"$ifNull": ["$costo_promedio", 0]}]}},
+        "stock_bajo": {"$sum": {"$cond": [{"$lte": [existencia, settings.STOCK_BAJO_UMBRAL]}, 1, 0]}},
+    }})
+    return pipeline
+
+
+def _calcular(lugar_ids=None):
+    """{ObjectId del lugar: contadores} calculados desde `materiales`."""
+    reales = {}
+    for fila in materiales.aggregate(_pipeline(lugar_ids)):
+        lugar = _lugar_oid(fila.pop("_id"))
+        if lugar is not None:
+            reales[lugar] = fila
+    return reales
+
+
+def lugares_de(filtro):
+    """Lugares de los materiales que cumplen el filtro (antes de una edición masiva)."""
+    return {l for l in map(_lugar_oid, materiales.distinct("lugar_id", filtro)) if l is not None}
+
+
+def recalcular_lugares(lugar_ids):
+    """Recalcula desde cero los contadores de los lugares indicados."""
+    lugar_ids = {l for l in map(_lugar_oid, lugar_ids) if l is not None}
+    if not lugar_ids:
+        return
+    reales = _calcular(lugar_ids)
+    vacio = dict.fromkeys(CONTADORES, 0)
+    lugares.bulk_write([
+        UpdateOne({"_id": lugar}, {"$set": {"inventario": reales.get(lugar, vacio)}})
+        for lugar in lugar_ids
+    ], ordered=False)
+
+
+def reconciliar(corregir=True):
+    """
+    Recalcula los contadores de todos los lugares en una sola agregación y los
+    compara con los guardados. Devuelve la lista de diferencias
+    [{"lugar_id", "nombre", "campo", "guardado", "real"}]; con corregir=True
+    además reescribe los contadores de los lugares con deriva.
+    """
+    inicio = datetime.utcnow()
+    reales = _calcular()
+    vacio = dict.fromkeys(CONTADORES, 0)
+
+    deriva, correcciones = [], []
+    for lugar in lugares.find({}, {"nombre": 1, "inventario": 1}):
+        guardado = lugar.get("inventario") or {}
+        real = reales.get(lugar["_id"], vacio)
+        diferencias = [
+            {
+                "lugar_id": str(lugar["_id"]),
+                "nombre": lugar.get("nombre"),
+                "campo": campo,
+                "guardado": guardado.get(campo),
+                "real": real[campo],
+            }
+            for campo in CONTADORES
+            # El valor es flotante: la suma incremental puede diferir en centavos
+            if guardado.get(campo) is None or abs(guardado[campo] - real[campo]) > 0.01
+        ]
+        if diferencias:
+            deriva.extend(diferencias)
+            correcciones.append(UpdateOne({"_id": lugar["_id"]}, {"$set": {"inventario": real}}))
+
+    if corregir and correcciones:
+        lugares.bulk_write(correcciones, ordered=False)
+
+    procesos.update_one({"_id": PROCESO_ID}, {"$set": {
+        "ultima_ejecucion": inicio,
+        "lugares_con_deriva": len(correcciones),
+        "deriva": deriva[:200],
+        "corregido": corregir,
+    }}, upsert=True)
+    return deriva
+
+
+def get_ultima_reconciliacion():
+    return procesos.find_one({"_id": PROCESO_ID}) or {}
+
+
+if __name__ == "__main__":
+    import sys
+    deriva = reconciliar(corregir="--solo-reportar" not in sys.argv)
+    lugares_con_deriva = len({d["lugar_id"] for d in deriva})
+    print(f"✅ Contadores revisados: {lugares_con_deriva} lugares con deriva")
+    for d in deriva[:50]:
+        print(f"  {d['nombre'] or d['lugar_id']}: {d['campo']} guardado={d['guardado']} real={d['real']}")
@@ -0,0 +1,113 @@
+# backend/services/job_executor.py
+
+import hashlib
+import multiprocessing
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor, CancelledError
+from backend.utils.cache import TTLCache
+from config import settings
+
+# Estados que devuelve poll()
+PENDIENTE, LISTO, ERROR, CANCELADO = "pendiente", "listo", "error", "cancelado"
+
+_lock = threading.Lock()
+_executor = None
+_jobs = {}            # job_id -> Future en curso
+_suscriptores = {}    # job_id -> sesiones que esperan el resultado
+_resultados = TTLCache(maxsize=settings.ANALYTICS_RESULT_CACHE, ttl=settings.ANALYTICS_RESULT_TTL)
+# Errores recientes: todas las sesiones que esperaban el trabajo reciben ERROR
+# y no lo reenvían en seguida; después de ANALYTICS_ERROR_TTL se puede reintentar
+_errores = TTLCache(maxsize=settings.ANALYTICS_RESULT_CACHE, ttl=settings.ANALYTICS_ERROR_TTL)
+
+
+class ColaLlenaError(RuntimeError):
+    """Se alcanzó el máximo de trabajos pendientes."""
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # spawn: el proceso de Streamlit tiene hilos y conexiones que no deben heredarse con fork
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.ANALYTICS_MAX_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+def job_id(fn, *args, **kwargs):
+    """Identificador estable de un trabajo: función + hash de sus parámetros."""
+    firma = pickle.dumps((fn.__module__, fn.__qualname__, args, sorted(kwargs.items())))
+    return hashlib.sha256(firma).hexdigest()[:20]
+
+
+def submit(fn, *args, suscriptor=None, **kwargs):
+    """
+    Encola fn(*args, **kwargs) en el pool de procesos y devuelve su job_id.
+    Si ya hay un trabajo idéntico en curso o su resultado (o error reciente)
+    está en caché, no se vuelve a ejecutar; varias sesiones pueden esperar el
+    mismo trabajo.
+    """
+    jid = job_id(fn, *args, **kwargs)
+    with _lock:
+        if _resultados.get(jid) is not None or _errores.get(jid) is not None:
+            # Ya terminó: poll() lo lee de la caché, no hay espera que registrar
+            return jid
+        if jid in _jobs:
+            _suscriptores.setdefault(jid, set()).add(suscriptor)
+            return jid
+        pendientes = sum(1 for f in _jobs.values() if not f.done())
+        if pendientes >= settings.ANALYTICS_MAX_PENDING:
+            raise ColaLlenaError("Hay demasiados análisis en curso, intenta de nuevo en unos segundos.")
+        _jobs[jid] = _get_executor().submit(fn, *args, **kwargs)
+        _suscriptores[jid] = {suscriptor}
+    return jid
+
+
+def poll(jid):
+    """Devuelve (estado, valor) sin bloquear; valor es el resultado o la excepción."""
+    resultado = _resultados.get(jid)
+    if resultado is not None:
+        return LISTO, resultado
+    error = _errores.get(jid)
+    if error is not None:
+        return ERROR, error
+
+    with _lock:
+        future = _jobs.get(jid)
+        if future is None:
+            return CANCELADO, None
+        if not future.done():
+            return PENDIENTE, None
+        _jobs.pop(jid)
+        _suscriptores.pop(jid, None)
+
+    try:
+        resultado = future.result()
+    except CancelledError:
+        return CANCELADO, None
+    except Exception as e:
+        _errores.set(jid, e)
+        return ERROR, e
+    _resultados.set(jid, resultado)
+    return LISTO, resultado
+
+
+def cancel(jid, suscriptor=None):
+    """
+    Retira a la sesión de la espera del trabajo; si nadie más lo espera y aún
+    no empezó, se cancela. Un trabajo que ya corre termina y su resultado queda en caché.
+    """
+    with _lock:
+        esperando = _suscriptores.get(jid)
+        if esperando is not None:
+            esperando.discard(suscriptor)
+            if esperando:
+                return False
+        future = _jobs.get(jid)
+        if future is not None and future.cancel():
+            _jobs.pop(jid)
+            _suscriptores.pop(jid, None)
+            return True
+    return False
@@ -0,0 +1,92 @@
+# backend/services/prefix_search.py
+#
+# Búsqueda por prefijo para los selectores de la GUI. En lugar de un $regex
+# con opción "i" (que recorre todo el índice) se usa un rango
+# [prefijo, prefijo + U+FFFF) con una colación de fuerza 1: ignora mayúsculas
+# y acentos y el servidor lo resuelve como un rango del índice con la misma
+# colación. En la colación raíz de ICU, U+FFFF tiene el peso primario más alto,
+# justamente para este tipo de rangos.
+
+from pymongo.collation import Collation
+
+COLACION = Collation(locale="es", strength=1)
+LIMITE = 20
+
+_indices_listos = set()
+
+
+def ensure_prefix_indexes(collection, campos):
+    """Crea (una vez por proceso) los índices con colación de los campos buscables."""
+    for campo in campos:
+        clave = (collection.full_name, campo)
+        if clave in _indices_listos:
+            continue
+        collection.create_index([(campo, 1)], collation=COLACION, name=f"{campo}_prefijo")
+        _indices_listos.add(clave)
+
+
+def filtro_prefijo(campos, prefijo):
+    rango = {"$gte": prefijo, "$lt": prefijo + "\uffff"}
+    if len(campos) == 1:
+        return {campos[0]: rango}
+    return {"$or": [{campo: rango} for campo in campos]}
+
+
+def buscar_por_prefijo(collection, campos, prefijo, proyeccion, limit=LIMITE):
+    """Hasta `limit` documentos (sólo la proyección) cuyo campo empieza con el prefijo."""
+    prefijo = (prefijo or "").strip()
+    if not prefijo:
+        return []
+    ensure_prefix_indexes(collection, campos)
+    cursor = collection.find(filtro_prefijo(campos, prefijo), proyeccion, collation=COLACION)
+    return list(cursor.limit(limit))
+
+
+if __name__ == "__main__":
+    # Comparativa con 100 000 materiales en una colección temporal:
+    #   antes  -> leer toda la colección para llenar un selectbox
+    #   ahora  -> prefijo (≤20 opciones) + lectura del elegido por _id
+    import statistics
+    import time
+    import bson
+    from backend.services.db_connection import get_collection
+
+    N = 100_000
+    bench = get_collection("bench_selectores")
+    bench.drop()
+    genericos = ["AEROSOL", "BATERIA", "FILTRO", "LLANTA", "BALATA", "ACEITE", "FOCO", "MANGUERA"]
+    bench.insert_many([
+        {
+            "clave_material": f"TV{i:06d}",
+            "descripcion": f"{genericos[i % len(genericos)]} {i:06d}",
+            "generico": genericos[i % len(genericos)],
+            "clasificacion": "CARROCERIA Y PINTURA",
+            "existencia": i % 50,
+            "costo_promedio": 10.0 + i % 500,
+        }
+        for i in range(N)
+    ], ordered=False)
+    campos = ["clave_material", "descripcion"]
+    ensure_prefix_indexes(bench, campos)
+
+    inicio = time.perf_counter()
+    todos = list(bench.find())
+    opciones = [m["descripcion"] for m in todos]
+    ms_todo = (time.perf_counter() - inicio) * 1000
+    kb_todo = sum(len(bson.encode(m)) for m in todos) / 1024
+    kb_opciones = sum(len(o) for o in opciones) / 1024
+
+    prefijos = ["aero", "TV0123", "filtro 00", "bal", "llanta 09", "TV09999"]
+    tiempos, kb_prefijo = [], []
+    for prefijo in prefijos * 5:
+        inicio = time.perf_counter()
+        resultados = buscar_por_prefijo(bench, campos, prefijo, {"clave_material": 1, "descripcion": 1})
+        elegido = bench.find_one({"_id": resultados[0]["_id"]}) if resultados else None
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        kb_prefijo.append((sum(len(bson.encode(r)) for r in resultados) + len(bson.encode(elegido or {}))) / 1024)
+
+    print(f"{N:,} materiales")
+    print(f"  colección completa : {ms_todo:8.1f} ms · {kb_todo:8.1f} KB leídos · {kb_opciones:7.1f} KB de opciones")
+    print(f"  prefijo + _id      : {statistics.median(tiempos):8.2f} ms (mediana) · "
+          f"{statistics.mean(kb_prefijo):8.2f} KB leídos")
+    bench.drop()
@@ -0,0 +1,159 @@
+# backend/services/profiler.py
+#
+# Perfilado opcional de una página completa. Con modo=None no hace nada, así
+# que puede quedarse permanentemente alrededor del render en main.py.
+#
+#   cprofile  -> cProfile determinista; se descarga como .prof (snakeviz, gprof2dot)
+#   muestreo  -> hilo que toma la pila del hilo de la página cada
+#                PROFILE_SAMPLE_INTERVAL segundos; se descarga en formato
+#                "collapsed stacks" (flamegraph.pl, speedscope)
+
+import cProfile
+import marshal
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from config import settings
+
+MODOS = ("cprofile", "muestreo")
+
+# Funciones que interesan en los resúmenes: render de la GUI y controladores
+_PREFIJOS_PROPIOS = ("frontend.gui.", "backend.controllers.", "backend.services.")
+
+_lock = threading.Lock()
+_perfiles = deque(maxlen=settings.PROFILE_MAX_RESULTS)
+
+
+def _nombre_modulo(ruta):
+    """frontend/gui/analytics_view.py -> frontend.gui.analytics_view"""
+    ruta = ruta.replace("\\", "/")
+    for prefijo in _PREFIJOS_PROPIOS:
+        carpeta = prefijo.rstrip(".").replace(".", "/")
+        i = ruta.find(carpeta + "/")
+        if i >= 0:
+            return ruta[i:].rsplit(".py", 1)[0].replace("/", ".")
+    return None
+
+
+class MuestreadorPila:
+    """Perfilador por muestreo del hilo que lo crea; el costo no depende del número de llamadas."""
+
+    def __init__(self, intervalo=None):
+        self.intervalo = intervalo or settings.PROFILE_SAMPLE_INTERVAL
+        self.pilas = Counter()
+        self.muestras = 0
+        self._objetivo = threading.get_ident()
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+
+    def _pila(self, frame):
+        marcos = []
+        while frame is not None:
+            codigo = frame.f_code
+            modulo = frame.f_globals.get("__name__", "?")
+            marcos.append(f"{modulo}:{codigo.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(marcos))
+
+    def _muestrear(self):
+        while not self._detener.wait(self.intervalo):
+            frame = sys._current_frames().get(self._objetivo)
+            if frame is not None:
+                self.pilas[self._pila(frame)] += 1
+                self.muestras += 1
+
+    def start(self):
+        self._hilo.start()
+
+    def stop(self):
+        self._detener.set()
+        self._hilo.join()
+
+    def collapsed(self):
+        return "\n".join(f"{pila} {n}" for pila, n in self.pilas.most_common()) + "\n"
+
+    def tiempos_por_funcion(self):
+        """Tiempo inclusivo estimado (ms) de las funciones propias presentes en las muestras."""
+        conteo = Counter()
+        for pila, n in self.pilas.items():
+            # Cada función cuenta una vez por muestra aunque sea recursiva
+            for marco in set(pila.split(";")):
+                if marco.startswith(_PREFIJOS_PROPIOS):
+                    conteo[marco] += n
+        return [
+            {"funcion": funcion, "ms": n * self.intervalo * 1000, "muestras": n}
+            for funcion, n in conteo.most_common()
+        ]
+
+
+def _tiempos_cprofile(perfil):
+    """Tiempo acumulado (ms) y llamadas de las funciones propias según cProfile."""
+    filas = []
+    for (ruta, _, nombre), (_, llamadas, propio, acumulado, _) in pstats.Stats(perfil).stats.items():
+        modulo = _nombre_modulo(ruta)
+        if modulo is None:
+            continue
+        filas.append({
+            "funcion": f"{modulo}:{nombre}",
+            "ms": acumulado * 1000,
+            "ms_propio": propio * 1000,
+            "llamadas": llamadas,
+        })
+    return sorted(filas, key=lambda f: f["ms"], reverse=True)
+
+
+@contextmanager
+def perfilar(pagina, modo=None, rerun=None, usuario=None):
+    """
+    Ejecuta el bloque bajo el perfilador indicado y guarda el resultado.
+    rerun es el registro de instrumentation.medir_rerun, para adjuntar las
+    llamadas a controladores medidas en el mismo render.
+    """
+    if modo not in MODOS:
+        yield None
+        return
+
+    resultado = {"pagina": pagina, "modo": modo, "usuario": usuario, "inicio": time.time()}
+    perfil = muestreador = None
+    if modo == "cprofile":
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError:
+            # Desde Python 3.12 sólo puede haber un cProfile activo por proceso
+            perfil = None
+            resultado["modo"] = modo = "muestreo"
+    if modo == "muestreo":
+        muestreador = MuestreadorPila()
+        muestreador.start()
+
+    inicio = time.perf_counter()
+    try:
+        yield resultado
+    finally:
+        resultado["ms"] = (time.perf_counter() - inicio) * 1000
+        if perfil is not None:
+            perfil.disable()
+            resultado["funciones"] = _tiempos_cprofile(perfil)
+            perfil.create_stats()
+            resultado["descarga"] = marshal.dumps(perfil.stats)
+        else:
+            muestreador.stop()
+            resultado["funciones"] = muestreador.tiempos_por_funcion()
+            resultado["descarga"] = muestreador.collapsed().encode("utf-8")
+        if rerun is not None:
+            resultado["controladores"] = [
+                {"nombre": c["nombre"], "ms": c["ms"]}
+                for c in rerun["llamadas"] if c["tipo"] == "controlador"
+            ]
+        with _lock:
+            _perfiles.append(resultado)
+
+
+def get_perfiles():
+    """Perfiles guardados, del más reciente al más antiguo."""
+    with _lock:
+        return list(reversed(_perfiles))
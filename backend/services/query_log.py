@@ -0,0 +1,169 @@
+# backend/services/query_log.py
+#
+# Registro de consultas problemáticas por rerun: consultas idénticas repetidas
+# dentro del mismo rerun (patrón N+1), consultas sobre el umbral de latencia y
+# planes COLLSCAN detectados con `explain` sobre una muestra. Se escribe una
+# línea JSON por hallazgo en un log rotativo (settings.QUERY_LOG_PATH).
+#
+# Se activa desde main.py con activar_registro_consultas(); depende de la
+# instrumentación de backend/services/instrumentation.py.
+
+import json
+import logging
+import os
+import random
+import threading
+from collections import Counter
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from bson import json_util
+from backend.services.db_connection import get_client
+from backend.services.instrumentation import registrar_al_cerrar
+from backend.utils.cache import TTLCache
+from config import settings
+
+# Comandos de lectura a los que se les puede pedir el plan
+COMANDOS_EXPLICABLES = {"find", "aggregate", "count", "distinct"}
+# Cargas de escritura (insert, update, findAndModify): llevan documentos
+# completos de usuarios y materiales, así que sólo se registra su forma
+CAMPOS_CARGA = ("documents", "updates", "update")
+
+logger = logging.getLogger("fonttrack.consultas")
+# Plan ya revisado por firma, para no repetir explain de la misma consulta
+_planes = TTLCache(maxsize=512, ttl=3600)
+
+
+def _configurar_logger():
+    if logger.handlers:
+        return
+    carpeta = os.path.dirname(settings.QUERY_LOG_PATH)
+    if carpeta:
+        os.makedirs(carpeta, exist_ok=True)
+    handler = RotatingFileHandler(
+        settings.QUERY_LOG_PATH,
+        maxBytes=settings.QUERY_LOG_MAX_BYTES,
+        backupCount=settings.QUERY_LOG_BACKUPS,
+        encoding="utf-8"
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def _forma(valor):
+    """Sólo llaves y tipos: {"correo": "str", "items": [{"cantidad": "int"}]}."""
+    if isinstance(valor, dict):
+        return {k: _forma(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_forma(valor[0])] if valor else []
+    return type(valor).__name__
+
+
+def _redactar(comando):
+    """
+    Copia del comando con las cargas de escritura reducidas a su forma. En
+    el comando update, "update" es el nombre de la colección y se conserva.
+    """
+    if not any(campo in comando for campo in CAMPOS_CARGA):
+        return comando
+    return {
+        k: (_forma(v) if k in CAMPOS_CARGA and not isinstance(v, str) else v)
+        for k, v in comando.items()
+    }
+
+
+def _escribir(tipo, pagina, consulta, **datos):
+    registro = {
+        "ts": datetime.now().isoformat(timespec="seconds"),
+        "tipo": tipo,
+        "pagina": pagina,
+        "consulta": consulta["nombre"],
+        "firma": consulta["firma"],
+        "comando": json_util.dumps(_redactar(consulta["comando"]))[:500],
+        **datos,
+    }
+    logger.info(json.dumps(registro, ensure_ascii=False))
+
+
+def _tiene_collscan(plan):
+    """Busca una etapa COLLSCAN en cualquier nivel del plan devuelto por explain."""
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(_tiene_collscan(v) for v in plan.values())
+    if isinstance(plan, list):
+        return any(_tiene_collscan(v) for v in plan)
+    return False
+
+
+def _revisar_plan(pagina, consulta):
+    plan = get_client()[consulta["base"]].command(
+        {"explain": consulta["comando"], "verbosity": "queryPlanner"}
+    )
+    collscan = _tiene_collscan(plan)
+    _planes.set(consulta["firma"], collscan)
+    if collscan:
+        _escribir("collscan", pagina, consulta)
+
+
+def _revisar_planes(pagina, consultas):
+    for consulta in consultas:
+        try:
+            _revisar_plan(pagina, consulta)
+        except Exception:
+            # p. ej. comandos que el servidor no sabe explicar; se marcan como revisados
+            _planes.set(consulta["firma"], False)
+
+
+def analizar_rerun(rerun):
+    """Busca duplicados, consultas lentas y candidatas a explain en un rerun terminado."""
+    pagina = rerun["pagina"]
+    consultas = rerun.get("consultas") or {}
+    llamadas = [c for c in rerun["llamadas"] if c.get("firma")]
+
+    repeticiones = Counter(c["firma"] for c in llamadas)
+    for firma, veces in repeticiones.items():
+        if veces > 1:
+            _escribir("duplicada", pagina, consultas[firma], repeticiones=veces)
+
+    for llamada in llamadas:
+        if llamada["ms"] >= settings.SLOW_QUERY_MS:
+            _escribir("lenta", pagina, consultas[llamada["firma"]], ms=round(llamada["ms"], 1),
+                      documentos=llamada["documentos"])
+
+    por_explicar = [
+        c for firma, c in consultas.items()
+        if c["nombre"].split(" ", 1)[0] in COMANDOS_EXPLICABLES
+        and _planes.get(firma) is None
+        and random.random() < settings.EXPLAIN_SAMPLE_RATE
+    ]
+    if por_explicar:
+        # explain es otra ida a MongoDB: se hace fuera del hilo de la página
+        threading.Thread(target=_revisar_planes, args=(pagina, por_explicar), daemon=True).start()
+
+
+def activar_registro_consultas():
+    _configurar_logger()
+    registrar_al_cerrar(analizar_rerun)
+
+
+def leer_registro(limite=2000):
+    """Últimos hallazgos del log, incluidos los archivos rotados, del más reciente al más antiguo."""
+    rutas = [settings.QUERY_LOG_PATH] + [
+        f"{settings.QUERY_LOG_PATH}.{i}" for i in range(1, settings.QUERY_LOG_BACKUPS + 1)
+    ]
+    registros = []
+    for ruta in rutas:
+        if not os.path.exists(ruta):
+            continue
+        with open(ruta, encoding="utf-8") as f:
+            lineas = f.readlines()
+        for linea in reversed(lineas):
+            try:
+                registros.append(json.loads(linea))
+            except ValueError:
+                continue
+            if len(registros) >= limite:
+                return registros
+    return registros
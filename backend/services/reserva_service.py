@@ -0,0 +1,244 @@
+# backend/services/reserva_service.py
+#
+# Apartado de existencia para el carrito. Agregar un material pasa unidades
+# de `existencia` a `reservado` con un $inc condicionado (existencia >=
+# cantidad), así dos sesiones nunca apartan la misma última unidad y los
+# consumos por fallas ya no las ven disponibles.
+#
+# Cada apartado es un documento de `reservas` con expira_en. MongoDB no puede
+# devolver unidades por sí mismo, así que un hilo barrendero libera los
+# vencidos (devuelve la cantidad y marca liberada_en); el índice TTL sobre
+# liberada_en borra después los documentos ya cerrados.
+
+import threading
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ReturnDocument
+from backend.services.db_connection import get_collection
+from backend.services.data_version import bump
+from backend.services.inventario_service import aplicar_cambio, CAMPOS_MATERIAL
+from backend.services.stock_service import StockInsuficienteError
+from backend.services.transaction_service import run_in_transaction
+from config.env import COLLECTION_MATERIALES, COLLECTION_RESERVAS
+from config import settings
+
+materiales = get_collection(COLLECTION_MATERIALES)
+reservas = get_collection(COLLECTION_RESERVAS)
+
+ACTIVA, LIBERADA, CONVERTIDA = "activa", "liberada", "convertida"
+
+_indexes_ready = False
+_barrendero = None
+_barrendero_lock = threading.Lock()
+
+
+def ensure_reserva_indexes():
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    # Los apartados cerrados (liberados o convertidos en pedido) se borran solos
+    reservas.create_index([("liberada_en", 1)], expireAfterSeconds=settings.RESERVA_RETENCION)
+    reservas.create_index([("estado", 1), ("expira_en", 1)])
+    # Un solo apartado activo por carrito y material: agregar otra vez suma al mismo
+    reservas.create_index(
+        [("carrito_id", 1), ("material_id", 1)],
+        unique=True,
+        partialFilterExpression={"estado": ACTIVA},
+        name="carrito_material_activa"
+    )
+    _indexes_ready = True
+
+
+def _mover(material_id, cantidad, session=None, guarda=True):
+    """
+    Pasa `cantidad` de existencia a reservado (negativa para devolverla).
+    Devuelve el material previo, o None si la guarda de existencia no se cumplió.
+    """
+    filtro = {"_id": material_id}
+    if guarda and cantidad > 0:
+        filtro["existencia"] = {"$gte": cantidad}
+    antes = materiales.find_one_and_update(
+        filtro,
+        {
+            "$inc": {"existencia": -cantidad, "reservado": cantidad, "version": 1},
+            "$set": {"updated_at": datetime.utcnow()},
+        },
+        projection=CAMPOS_MATERIAL,
+        return_document=ReturnDocument.BEFORE,
+        session=session
+    )
+    if antes is not None:
+        despues = {**antes, "existencia": (antes.get("existencia") or 0) - cantidad}
+        aplicar_cambio(antes, despues, session=session)
+    return antes
+
+
+def reservar(carrito_id, material_id, cantidad=1):
+    """
+    Aparta `cantidad` unidades para el carrito (suma a su apartado activo si
+    ya existe) y renueva el vencimiento de todo el carrito. Lanza
+    StockInsuficienteError si no hay existencia disponible.
+    """
+    cantidad = int(cantidad)
+    if cantidad <= 0:
+        raise ValueError("La cantidad a apartar debe ser mayor que cero.")
+    ensure_reserva_indexes()
+    material_id = ObjectId(material_id)
+
+    def _reservar(session):
+        antes = _mover(material_id, cantidad, session)
+        if antes is None:
+            actual = materiales.find_one({"_id": material_id}, {"existencia": 1}, session=session)
+            if actual is None:
+                raise ValueError("El material ya no existe.")
+            existencia = actual.get("existencia") or 0
+            raise StockInsuficienteError([{
+                "id_material": material_id, "cantidad": cantidad,
+                "existencia": existencia, "faltante": cantidad - max(existencia, 0),
+            }])
+        try:
+            ahora = datetime.utcnow()
+            reservas.update_one(
+                {"carrito_id": carrito_id, "material_id": material_id, "estado": ACTIVA},
+                {
+                    "$inc": {"cantidad": cantidad},
+                    "$set": {"precio": antes.get("costo_promedio") or 0, "actualizada_en": ahora},
+                    "$setOnInsert": {"creada_en": ahora},
+                },
+                upsert=True, session=session
+            )
+            _renovar(carrito_id, ahora, session)
+        except Exception:
+            if session is None:
+                _mover(material_id, -cantidad, guarda=False)
+            raise
+
+    run_in_transaction(_reservar)
+    bump(COLLECTION_MATERIALES)
+
+
+def _renovar(carrito_id, ahora, session=None):
+    reservas.update_many(
+        {"carrito_id": carrito_id, "estado": ACTIVA},
+        {"$set": {"expira_en": ahora + timedelta(seconds=settings.RESERVA_TTL)}},
+        session=session
+    )
+
+
+def _cerrar(filtro, estado, session=None, extra=None):
+    """
+    Marca como cerrado un apartado activo y devuelve el documento previo, o
+    None si otro proceso ya lo cerró. Reclamarlo primero garantiza que las
+    unidades se devuelvan o se conviertan una sola vez.
+    """
+    return reservas.find_one_and_update(
+        {**filtro, "estado": ACTIVA},
+        {"$set": {"estado": estado, "liberada_en": datetime.utcnow(), **(extra or {})}},
+        session=session
+    )
+
+
+def liberar(carrito_id, material_id=None):
+    """Devuelve al inventario los apartados activos del carrito (o sólo de un material)."""
+    ensure_reserva_indexes()
+    filtro = {"carrito_id": carrito_id}
+    if material_id is not None:
+        filtro["material_id"] = ObjectId(material_id)
+    liberadas = 0
+    for reserva in list(reservas.find({**filtro, "estado": ACTIVA}, {"_id": 1})):
+        liberadas += _liberar_una(reserva["_id"])
+    if liberadas:
+        bump(COLLECTION_MATERIALES)
+    return liberadas
+
+
+def _liberar_una(reserva_id):
+    def _liberar(session):
+        reserva = _cerrar({"_id": reserva_id}, LIBERADA, session)
+        if reserva is None:
+            return 0
+        try:
+            _mover(reserva["material_id"], -reserva["cantidad"], session, guarda=False)
+        except Exception:
+            if session is None:
+                # Sin transacción: reabrir el apartado para que el barrido lo reintente
+                reservas.update_one(
+                    {"_id": reserva_id, "estado": LIBERADA},
+                    {"$set": {"estado": ACTIVA}, "$unset": {"liberada_en": ""}}
+                )
+            raise
+        return 1
+    return run_in_transaction(_liberar)
+
+
+def liberar_vencidas(limite=500):
+    """Libera los apartados cuyo vencimiento ya pasó. Devuelve cuántos liberó."""
+    ensure_reserva_indexes()
+    vencidas = reservas.find(
+        {"estado": ACTIVA, "expira_en": {"$lt": datetime.utcnow()}}, {"_id": 1}
+    ).limit(limite)
+    liberadas = sum(_liberar_una(r["_id"]) for r in list(vencidas))
+    if liberadas:
+        bump(COLLECTION_MATERIALES)
+    return liberadas
+
+
+def get_reservas(carrito_id):
+    """Apartados activos y vigentes del carrito."""
+    ensure_reserva_indexes()
+    return list(reservas.find({
+        "carrito_id": carrito_id, "estado": ACTIVA, "expira_en": {"$gt": datetime.utcnow()}
+    }).sort("creada_en", 1))
+
+
+def convertir(carrito_id, session):
+    """
+    Dentro de la transacción del pedido: cierra los apartados vigentes del
+    carrito y los devuelve (vacío si todos vencieron). Lo reservado lo
+    descuenta después checkout_service con campo="reservado".
+    """
+    ahora = datetime.utcnow()
+    convertidas = []
+    vigentes = reservas.find(
+        {"carrito_id": carrito_id, "estado": ACTIVA, "expira_en": {"$gt": ahora}},
+        session=session
+    )
+    for reserva in list(vigentes):
+        cerrada = _cerrar({"_id": reserva["_id"]}, CONVERTIDA, session)
+        if cerrada is not None:
+            convertidas.append(cerrada)
+    return convertidas
+
+
+def devolver(convertidas):
+    """Compensación sin transacción: el pedido no se registró, sus apartados vuelven al inventario."""
+    for reserva in convertidas:
+        reservas.update_one(
+            {"_id": reserva["_id"]}, {"$set": {"estado": LIBERADA, "liberada_en": datetime.utcnow()}}
+        )
+        _mover(reserva["material_id"], -reserva["cantidad"], guarda=False)
+
+
+def marcar_pedido(reserva_ids, pedido_id, session=None):
+    reservas.update_many({"_id": {"$in": reserva_ids}}, {"$set": {"pedido_id": pedido_id}}, session=session)
+
+
+def _barrer(detener):
+    while not detener.wait(settings.RESERVA_BARRIDO_INTERVAL):
+        try:
+            liberar_vencidas()
+        except Exception as e:
+            # Un fallo pasajero de la base no debe matar el hilo
+            print(f"⚠️ Barrido de reservas fallido: {e}")
+
+
+def iniciar_barrendero():
+    """Arranca (una vez por proceso) el hilo que libera los apartados vencidos."""
+    global _barrendero
+    with _barrendero_lock:
+        if _barrendero is None:
+            detener = threading.Event()
+            hilo = threading.Thread(target=_barrer, args=(detener,), daemon=True, name="barrendero-reservas")
+            hilo.start()
+            _barrendero = (hilo, detener)
+    return _barrendero[0]
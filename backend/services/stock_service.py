@@ -0,0 +1,99 @@
+# backend/services/stock_service.py
+
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ReturnDocument
+from backend.services.db_connection import get_collection
+from backend.services.inventario_service import aplicar_cambio, CAMPOS_MATERIAL
+from config.env import COLLECTION_MATERIALES
+
+materiales = get_collection(COLLECTION_MATERIALES)
+
+
+class StockInsuficienteError(ValueError):
+    """No hay existencia suficiente para una o más líneas."""
+
+    def __init__(self, faltantes):
+        self.faltantes = faltantes
+        detalle = ", ".join(f"{f['id_material']} (faltan {f['faltante']})" for f in faltantes)
+        super().__init__(f"Existencia insuficiente: {detalle}")
+
+
+def agrupar_lineas(lineas):
+    """Suma cantidades por material: {ObjectId: cantidad}, ordenado por ID."""
+    cantidades = {}
+    for linea in lineas:
+        cantidad = int(linea.get("cantidad", 0))
+        if cantidad <= 0:
+            continue
+        material_id = ObjectId(linea["id_material"])
+        cantidades[material_id] = cantidades.get(material_id, 0) + cantidad
+    # Orden estable para que escrituras concurrentes toquen los documentos en el mismo orden
+    return dict(sorted(cantidades.items()))
+
+
+def _faltante(material_id, cantidad, session=None):
+    actual = materiales.find_one({"_id": material_id}, {"existencia": 1}, session=session)
+    existencia = actual.get("existencia", 0) if actual else 0
+    return {
+        "id_material": material_id,
+        "cantidad": cantidad,
+        "existencia": existencia,
+        "faltante": cantidad - max(existencia, 0),
+    }
+
+
+def _mover_existencia(filtro, cantidad, ahora, session=None):
+    """
+    Suma `cantidad` (negativa para descontar) a la existencia del material que
+    cumpla el filtro y ajusta los contadores de su lugar. Devuelve el
+    documento previo o None si el filtro no coincidió.
+    """
+    antes = materiales.find_one_and_update(
+        filtro,
+        {"$inc": {"existencia": cantidad, "version": 1}, "$set": {"updated_at": ahora}},
+        projection=CAMPOS_MATERIAL,
+        return_document=ReturnDocument.BEFORE,
+        session=session
+    )
+    if antes is not None:
+        despues = {**antes, "existencia": (antes.get("existencia") or 0) + cantidad}
+        aplicar_cambio(antes, despues, session=session)
+    return antes
+
+
+def reponer_existencias(cantidades, session=None):
+    """Devuelve al inventario las cantidades indicadas ({ObjectId: cantidad})."""
+    ahora = datetime.utcnow()
+    for material_id, cantidad in cantidades.items():
+        _mover_existencia({"_id": material_id}, cantidad, ahora, session)
+
+
+def descontar_existencias(cantidades, session=None, parcial=False):
+    """
+    Descuenta existencias con una guarda `existencia >= cantidad` por material,
+    de modo que dos escrituras concurrentes nunca dejen stock negativo.
+
+    Con parcial=False, si alguna línea no alcanza se revierte lo aplicado (o se
+    aborta la transacción) y se lanza StockInsuficienteError. Con parcial=True
+    las líneas sin stock se omiten y se devuelven como faltantes.
+    Devuelve (aplicadas, faltantes).
+    """
+    ahora = datetime.utcnow()
+    aplicadas, faltantes = {}, []
+    for material_id, cantidad in cantidades.items():
+        antes = _mover_existencia(
+            {"_id": material_id, "existencia": {"$gte": cantidad}}, -cantidad, ahora, session
+        )
+        if antes is not None:
+            aplicadas[material_id] = cantidad
+            continue
+
+        faltantes.append(_faltante(material_id, cantidad, session))
+        if not parcial:
+            # Dentro de una transacción el abort deshace todo; sin ella, compensamos
+            if session is None:
+                reponer_existencias(aplicadas)
+            raise StockInsuficienteError(faltantes)
+
+    return aplicadas, faltantes
@@ -0,0 +1,42 @@
+# backend/services/transaction_service.py
+
+from pymongo.errors import OperationFailure
+from backend.services.db_connection import get_client
+
+# Código de MongoDB cuando el servidor no admite transacciones (standalone)
+_ILLEGAL_OPERATION = 20
+_transactions_supported = None
+
+
+def _supports_transactions(client):
+    """Detecta una sola vez si el despliegue es réplica o mongos."""
+    global _transactions_supported
+    if _transactions_supported is None:
+        hello = client.admin.command("hello")
+        _transactions_supported = bool(hello.get("setName") or hello.get("msg") == "isdbgrid")
+    return _transactions_supported
+
+
+def _disable_transactions():
+    global _transactions_supported
+    _transactions_supported = False
+
+
+def run_in_transaction(callback):
+    """
+    Ejecuta callback(session) dentro de una transacción multi-documento.
+    En servidores standalone se ejecuta con session=None; el callback debe
+    entonces compensar sus propias escrituras si falla a mitad de camino.
+    """
+    client = get_client()
+    if not _supports_transactions(client):
+        return callback(None)
+
+    with client.start_session() as session:
+        try:
+            return session.with_transaction(callback)
+        except OperationFailure as e:
+            if e.code != _ILLEGAL_OPERATION:
+                raise
+    _disable_transactions()
+    return callback(None)
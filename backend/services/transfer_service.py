@@ -0,0 +1,325 @@
+# backend/services/transfer_service.py
+#
+# Transferencias de existencia entre lugares. Cada material vive en un solo
+# lugar, así que mover stock es: descontar del documento (clave, origen),
+# sumar al documento (clave, destino) —creándolo con los datos del origen si
+# no existe— y registrar el movimiento. Un lote completo de transferencias va
+# en una sola transacción; en servidores standalone se compensa lo aplicado.
+
+import uuid
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ReturnDocument
+from backend.services.db_connection import get_collection
+from backend.services.inventario_service import aplicar_cambio
+from backend.services.stock_service import StockInsuficienteError
+from backend.services.transaction_service import run_in_transaction
+from config.env import COLLECTION_LUGARES, COLLECTION_MATERIALES, COLLECTION_MOVIMIENTOS
+
+lugares = get_collection(COLLECTION_LUGARES)
+materiales = get_collection(COLLECTION_MATERIALES)
+movimientos = get_collection(COLLECTION_MOVIMIENTOS)
+
+# Campos que se copian del material de origen al crear el del destino
+# (costo_promedio se calcula aparte como promedio ponderado)
+CAMPOS_COPIADOS = ("descripcion", "generico", "clasificacion")
+
+MOVIMIENTO_INDEXES = [
+    [("clave_material", 1), ("fecha", -1)],
+    [("lugar_origen", 1), ("fecha", -1)],
+    [("lugar_destino", 1), ("fecha", -1)],
+    [("lote", 1)],
+]
+_indexes_ready = False
+
+
+def ensure_movimiento_indexes():
+    global _indexes_ready
+    if not _indexes_ready:
+        for keys in MOVIMIENTO_INDEXES:
+            movimientos.create_index(keys)
+        _indexes_ready = True
+
+
+def _formas(lugar_id):
+    """lugar_id puede estar guardado como ObjectId o como texto."""
+    if ObjectId.is_valid(lugar_id):
+        return [ObjectId(lugar_id), str(lugar_id)]
+    return [lugar_id]
+
+
+def normalizar_transferencias(transferencias):
+    """Valida y ordena el lote; el orden fijo evita que dos lotes se bloqueen entre sí."""
+    normalizadas = []
+    for t in transferencias:
+        clave = str(t.get("clave_material") or "").strip()
+        origen, destino = str(t.get("origen") or ""), str(t.get("destino") or "")
+        cantidad = int(t.get("cantidad") or 0)
+        if not clave or not origen or not destino:
+            raise ValueError("Cada transferencia requiere clave_material, origen y destino.")
+        if origen == destino:
+            raise ValueError(f"{clave}: el origen y el destino son el mismo lugar.")
+        if cantidad <= 0:
+            raise ValueError(f"{clave}: la cantidad a transferir debe ser mayor que cero.")
+        normalizadas.append({**t, "clave_material": clave, "origen": origen, "destino": destino, "cantidad": cantidad})
+    if not normalizadas:
+        raise ValueError("El lote de transferencias está vacío.")
+    return sorted(normalizadas, key=lambda t: (t["clave_material"], t["origen"], t["destino"]))
+
+
+def _validar_destinos(lote):
+    """Un destino inexistente crearía un material huérfano: se rechaza antes de mover nada."""
+    destinos = {t["destino"] for t in lote}
+    invalidos = {d for d in destinos if not ObjectId.is_valid(d)}
+    validos = [ObjectId(d) for d in destinos - invalidos]
+    existentes = {str(l) for l in lugares.distinct("_id", {"_id": {"$in": validos}})}
+    faltantes = sorted(destinos - existentes)
+    if faltantes:
+        raise ValueError(f"Lugares de destino inexistentes: {', '.join(faltantes)}")
+
+
+def _descontar_origen(t, ahora, session):
+    antes = materiales.find_one_and_update(
+        {
+            "clave_material": t["clave_material"],
+            "lugar_id": {"$in": _formas(t["origen"])},
+            "existencia": {"$gte": t["cantidad"]},
+        },
+        {"$inc": {"existencia": -t["cantidad"], "version": 1}, "$set": {"updated_at": ahora}},
+        return_document=ReturnDocument.BEFORE,
+        session=session
+    )
+    if antes is None:
+        actual = materiales.find_one(
+            {"clave_material": t["clave_material"], "lugar_id": {"$in": _formas(t["origen"])}},
+            {"existencia": 1}, session=session
+        )
+        if actual is None:
+            raise ValueError(f"No existe el material {t['clave_material']} en el lugar de origen.")
+        existencia = actual.get("existencia") or 0
+        raise StockInsuficienteError([{
+            "id_material": actual["_id"],
+            "cantidad": t["cantidad"],
+            "existencia": existencia,
+            "faltante": t["cantidad"] - max(existencia, 0),
+        }])
+    aplicar_cambio(antes, {**antes, "existencia": antes["existencia"] - t["cantidad"]}, session=session)
+    return antes
+
+
+def _sumar_destino(t, origen, ahora, session):
+    """Suma al material del destino (o lo crea) y promedia su costo con el del origen."""
+    existente = materiales.find_one(
+        {"clave_material": t["clave_material"], "lugar_id": {"$in": _formas(t["destino"])}},
+        {"_id": 1}, session=session
+    )
+    if existente:
+        filtro = {"_id": existente["_id"]}
+    else:
+        # Mismo tipo de referencia que usa el material de origen
+        destino = ObjectId(t["destino"]) if isinstance(origen.get("lugar_id"), ObjectId) else t["destino"]
+        filtro = {"clave_material": t["clave_material"], "lugar_id": destino}
+
+    cantidad = t["cantidad"]
+    costo = origen.get("costo_promedio") or 0
+    existencia = {"$max": [{"$ifNull": ["$existencia", 0]}, 0]}
+    actualizacion = [{"$set": {
+        **{c: {"$ifNull": [f"${c}", origen.get(c)]} for c in CAMPOS_COPIADOS},
+        "costo_promedio": {"$divide": [
+            {"$add": [{"$multiply": [existencia, {"$ifNull": ["$costo_promedio", costo]}]}, cantidad * costo]},
+            {"$add": [existencia, cantidad]},
+        ]},
+        "existencia": {"$add": [{"$ifNull": ["$existencia", 0]}, cantidad]},
+        "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]},
+        "created_at": {"$ifNull": ["$created_at", ahora]},
+        "updated_at": ahora,
+    }}]
+    if not existente:
+        despues = materiales.find_one_and_update(
+            filtro, actualizacion, upsert=True, return_document=ReturnDocument.AFTER, session=session
+        )
+        aplicar_cambio(None, despues, session=session)
+        return despues, True
+
+    antes = materiales.find_one_and_update(
+        filtro, actualizacion, return_document=ReturnDocument.BEFORE, session=session
+    )
+    # Mismo cálculo que la actualización, para los contadores y el movimiento
+    previa = max(antes.get("existencia") or 0, 0)
+    costo_previo = antes.get("costo_promedio")
+    costo_previo = costo if costo_previo is None else costo_previo
+    despues = {
+        **antes,
+        "existencia": (antes.get("existencia") or 0) + cantidad,
+        "costo_promedio": (previa * costo_previo + cantidad * costo) / (previa + cantidad),
+    }
+    aplicar_cambio(antes, despues, session=session)
+    return despues, False
+
+
+def _revertir(aplicadas, ahora):
+    """
+    Compensación sin transacción: devuelve cada cantidad a su origen. Una
+    línea sin destino falló después de descontar el origen; un destino creado
+    por la línea se borra.
+    """
+    for t, origen, destino, creado in reversed(aplicadas):
+        if destino is not None:
+            if creado:
+                materiales.delete_one({"_id": destino["_id"]})
+                aplicar_cambio(destino, None)
+            else:
+                materiales.update_one(
+                    {"_id": destino["_id"]},
+                    {"$inc": {"existencia": -t["cantidad"], "version": 1}, "$set": {"updated_at": ahora}}
+                )
+                aplicar_cambio({**destino}, {**destino, "existencia": destino["existencia"] - t["cantidad"]})
+        materiales.update_one(
+            {"_id": origen["_id"]},
+            {"$inc": {"existencia": t["cantidad"], "version": 1}, "$set": {"updated_at": ahora}}
+        )
+        aplicar_cambio({**origen, "existencia": origen["existencia"] - t["cantidad"]}, origen)
+
+
+def transferir_lote(transferencias, usuario=None):
+    """
+    Aplica un lote de transferencias [{clave_material, origen, destino,
+    cantidad, nota?}] todo o nada. Devuelve {"lote", "movimientos", "creados"}
+    donde creados son los _id de materiales nuevos en algún destino. Lanza
+    StockInsuficienteError o ValueError sin aplicar nada si alguna línea falla
+    o algún destino no es un lugar existente.
+    """
+    lote = normalizar_transferencias(transferencias)
+    _validar_destinos(lote)
+    ensure_movimiento_indexes()
+    lote_id = uuid.uuid4().hex
+
+    def _aplicar(session):
+        ahora = datetime.utcnow()
+        aplicadas, registros, creados = [], [], []
+        try:
+            for t in lote:
+                origen = _descontar_origen(t, ahora, session)
+                # Se registra antes de sumar al destino: si eso falla, el origen igual se devuelve
+                aplicadas.append((t, origen, None, False))
+                destino, creado = _sumar_destino(t, origen, ahora, session)
+                aplicadas[-1] = (t, origen, destino, creado)
+                if creado:
+                    creados.append(destino["_id"])
+                registros.append({
+                    "lote": lote_id,
+                    "clave_material": t["clave_material"],
+                    "material_origen": origen["_id"],
+                    "material_destino": destino["_id"],
+                    "lugar_origen": origen.get("lugar_id"),
+                    "lugar_destino": destino.get("lugar_id"),
+                    "cantidad": t["cantidad"],
+                    "costo_unitario": origen.get("costo_promedio"),
+                    "usuario": usuario,
+                    "nota": t.get("nota"),
+                    "fecha": ahora,
+                })
+            movimientos.insert_many(registros, session=session)
+        except Exception:
+            if session is None:
+                _revertir(aplicadas, ahora)
+            raise
+        return registros, creados
+
+    registros, creados = run_in_transaction(_aplicar)
+    return {"lote": lote_id, "movimientos": registros, "creados": creados}
+
+
+def get_movimientos(clave_material=None, lugar_id=None, limit=100):
+    """Movimientos más recientes, opcionalmente de una clave o de un lugar (como origen o destino)."""
+    ensure_movimiento_indexes()
+    filtro = {}
+    if clave_material:
+        filtro["clave_material"] = clave_material
+    if lugar_id:
+        formas = {"$in": _formas(lugar_id)}
+        filtro["$or"] = [{"lugar_origen": formas}, {"lugar_destino": formas}]
+    docs = movimientos.find(filtro).sort("fecha", -1).limit(limit)
+    resultado = []
+    for doc in docs:
+        for campo in ("_id", "material_origen", "material_destino", "lugar_origen", "lugar_destino"):
+            if isinstance(doc.get(campo), ObjectId):
+                doc[campo] = str(doc[campo])
+        resultado.append(doc)
+    return resultado
+
+
+if __name__ == "__main__":
+    # Prueba de conservación: varios hilos transfieren al azar la misma clave
+    # entre cuatro lugares; el total de existencia no debe cambiar y ningún
+    # lugar debe quedar negativo.
+    import random
+    import threading
+    import time
+
+    from pymongo.errors import DuplicateKeyError
+
+    lugares = get_collection("bench_lugares")
+    materiales = get_collection("bench_transferencias")
+    movimientos = get_collection("bench_movimientos")
+    for bench in (lugares, materiales, movimientos):
+        bench.drop()
+    materiales.create_index([("clave_material", 1), ("lugar_id", 1)], unique=True)
+
+    ids_lugares = lugares.insert_many([{"nombre": f"LUGAR {i}"} for i in range(4)]).inserted_ids
+    claves = [f"TV{i:03d}" for i in range(5)]
+    materiales.insert_many([
+        {"clave_material": c, "descripcion": f"MATERIAL {c}", "lugar_id": ids_lugares[0],
+         "existencia": 1000, "costo_promedio": 10.0 + i, "version": 1}
+        for i, c in enumerate(claves)
+    ])
+    total_inicial = sum(m["existencia"] for m in materiales.find())
+
+    HILOS, TRANSFERENCIAS = 8, 200
+    errores = {"stock": 0, "otros": []}
+
+    def trabajador(semilla):
+        azar = random.Random(semilla)
+        for _ in range(TRANSFERENCIAS):
+            origen, destino = azar.sample(ids_lugares, 2)
+            lote = [{
+                "clave_material": azar.choice(claves),
+                "origen": str(origen), "destino": str(destino),
+                "cantidad": azar.randint(1, 60),
+            } for _ in range(azar.randint(1, 3))]
+            try:
+                transferir_lote(lote, usuario=f"hilo{semilla}")
+            except StockInsuficienteError:
+                errores["stock"] += 1
+            except (ValueError, DuplicateKeyError):
+                # Clave aún no creada en ese origen, o dos hilos creándola a la vez en el destino
+                errores["stock"] += 1
+            except Exception as e:
+                errores["otros"].append(repr(e))
+
+    inicio = time.perf_counter()
+    hilos = [threading.Thread(target=trabajador, args=(i,)) for i in range(HILOS)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    segundos = time.perf_counter() - inicio
+
+    docs = list(materiales.find())
+    total_final = sum(m["existencia"] for m in docs)
+    negativos = [m for m in docs if m["existencia"] < 0]
+    lotes = HILOS * TRANSFERENCIAS
+    print(f"{lotes} lotes en {segundos:.1f} s ({lotes / segundos:.0f} lotes/s) · "
+          f"{errores['stock']} rechazados por stock · {movimientos.count_documents({})} movimientos")
+    print(f"  total inicial {total_inicial} · total final {total_final} · negativos {len(negativos)}")
+    assert total_final == total_inicial, "la existencia total cambió"
+    assert not negativos, "hay existencias negativas"
+    assert not errores["otros"], errores["otros"][:5]
+    try:
+        transferir_lote([{"clave_material": claves[0], "origen": str(ids_lugares[0]),
+                          "destino": str(ObjectId()), "cantidad": 1}])
+        raise AssertionError("se aceptó un destino inexistente")
+    except ValueError:
+        pass
+    for bench in (lugares, materiales, movimientos):
+        bench.drop()
@@ -0,0 +1,52 @@
+# backend/services/versioning.py
+
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+
+def version_filter(doc_id, expected_version):
+    """Filtro por _id que además exige la versión leída por el cliente."""
+    filtro = {"_id": ObjectId(doc_id)}
+    if expected_version is None:
+        return filtro
+    if not expected_version:
+        # Documentos anteriores al versionado no tienen el campo
+        filtro["version"] = {"$in": [0, None]}
+    else:
+        filtro["version"] = expected_version
+    return filtro
+
+
+def versioned_update(collection, doc_id, data, expected_version=None, formatter=None, con_anterior=False):
+    """
+    Compare-and-set: aplica $set sólo si la versión no cambió desde la lectura
+    e incrementa `version`. Devuelve {"ok", "conflicto", "documento"}, donde
+    documento es la versión nueva si ok o la versión vigente si hay conflicto.
+    Con con_anterior=True, si ok también incluye "anterior": el documento tal
+    como estaba justo antes de esta escritura (leído en la misma operación).
+    """
+    formatter = formatter or (lambda d: d)
+    cambios = {k: v for k, v in data.items() if k not in ("_id", "version")}
+    cambios["updated_at"] = datetime.utcnow()
+
+    doc = collection.find_one_and_update(
+        version_filter(doc_id, expected_version),
+        {"$set": cambios, "$inc": {"version": 1}},
+        return_document=ReturnDocument.BEFORE if con_anterior else ReturnDocument.AFTER
+    )
+    if doc and con_anterior:
+        # El $set y el $inc son conocidos: el documento nuevo se arma sin releerlo
+        nuevo = {**doc, **cambios, "version": (doc.get("version") or 0) + 1}
+        return {"ok": True, "conflicto": False, "documento": formatter(nuevo), "anterior": doc}
+    if doc:
+        return {"ok": True, "conflicto": False, "documento": formatter(doc)}
+
+    actual = collection.find_one({"_id": ObjectId(doc_id)})
+    return {"ok": False, "conflicto": actual is not None, "documento": formatter(actual)}
+
+
+def stamp_new(data):
+    """Marca un documento nuevo con versión inicial y fechas de auditoría."""
+    ahora = datetime.utcnow()
+    return {**data, "version": 1, "created_at": data.get("created_at", ahora), "updated_at": ahora}
@@ -7,3 +7,9 @@ COLLECTION_LUGARES = "lugares"
 COLLECTION_MATERIALES = "materiales"
 COLLECTION_FALLAS = "fallas"
 COLLECTION_USERS = "usuarios" 
+COLLECTION_PRONOSTICOS = "pronosticos"
+COLLECTION_PROCESOS = "procesos"
+COLLECTION_FALLAS_DETALLE = "fallas_detalle"
+COLLECTION_MOVIMIENTOS = "movimientos"
+COLLECTION_RESERVAS = "reservas"
+COLLECTION_PEDIDOS = "pedidos"
@@ -4,3 +4,68 @@ WINDOW_WIDTH = 1024
 WINDOW_HEIGHT = 768
 APP_TITLE = "Tienda Python"
 BOOTSTRAP_THEME = "flatly"  # Puedes cambiar a darkly, journal, etc.
+
+# Pronóstico de reorden (ver backend/services/forecast_service.py)
+FORECAST_HISTORY_WEEKS = 52     # Semanas de historial de consumo
+FORECAST_LEAD_TIME_WEEKS = 2    # Tiempo de reabastecimiento del proveedor
+FORECAST_REVIEW_WEEKS = 4       # Cobertura que debe cubrir cada pedido
+FORECAST_SERVICE_Z = 1.65       # Nivel de servicio ~95%
+
+# Ejecución de analytics en procesos (ver backend/services/job_executor.py)
+ANALYTICS_MAX_WORKERS = 2       # Procesos de cálculo compartidos por todas las sesiones
+ANALYTICS_MAX_PENDING = 8       # Trabajos en cola antes de rechazar nuevos
+ANALYTICS_RESULT_CACHE = 32     # Resultados guardados
+ANALYTICS_RESULT_TTL = 900      # Segundos que se conserva cada resultado
+ANALYTICS_ERROR_TTL = 30        # Segundos que se conserva un error antes de permitir reintentar
+ANALYTICS_POLL_INTERVAL = 1     # Segundos entre revisiones del aviso "Calculando..."
+
+# Reducción de datos en gráficas (ver frontend/gui/chart_reduction.py)
+CHART_MAX_LINE_POINTS = 500         # Puntos máximos por serie de línea
+CHART_SCATTERGL_THRESHOLD = 2000    # A partir de aquí los scatters usan WebGL
+
+# Caché de figuras del dashboard (ver frontend/gui/figure_cache.py)
+FIGURE_CACHE_SIZE = 64          # Figuras serializadas compartidas entre sesiones
+FIGURE_CACHE_TTL = 300          # Red de seguridad ante escrituras hechas fuera de esta app
+
+# Actualización automática de analytics (ver backend/services/data_version.py)
+AUTO_REFRESH_INTERVAL = 30      # Segundos entre sondeos de cada dashboard abierto
+AUTO_REFRESH_MIN_INTERVAL = 10  # Mínimo entre consultas reales a MongoDB por colección
+
+# Instrumentación (ver backend/services/instrumentation.py)
+PERF_MAX_RERUNS = 200           # Reruns recientes que se conservan con su detalle
+PERF_MEDIR_BYTES = False        # Re-codifica las respuestas con cursor para medir su tamaño (duplica la serialización)
+PERF_MAX_EN_CURSO = 1000        # Comandos sin respuesta que se recuerdan (las conexiones caídas no avisan)
+
+# Registro de consultas problemáticas (ver backend/services/query_log.py)
+SLOW_QUERY_MS = 100                 # Latencia a partir de la cual una consulta se registra
+EXPLAIN_SAMPLE_RATE = 0.1           # Fracción de consultas nuevas a las que se pide explain
+QUERY_LOG_PATH = "logs/consultas.log"
+QUERY_LOG_MAX_BYTES = 5 * 1024 * 1024
+QUERY_LOG_BACKUPS = 3
+
+# Perfilado de páginas (ver backend/services/profiler.py)
+PROFILE_SAMPLE_INTERVAL = 0.005     # Segundos entre muestras del perfilador por muestreo
+PROFILE_MAX_RESULTS = 20            # Perfiles que se conservan para descargar
+
+# Búsqueda tolerante a errores (ver backend/services/fuzzy_search.py)
+FUZZY_MAX_DISTANCIA = 2             # Ediciones permitidas por palabra (las cortas admiten menos)
+FUZZY_MAX_RESULTADOS = 500          # Candidatos que la búsqueda entrega a la consulta por _id
+
+# Búsqueda por clave del escáner (ver backend/controllers/material_controller.py)
+CLAVE_CACHE_SIZE = 5000             # Claves recientes (encontradas o no) en memoria
+CLAVE_CACHE_TTL = 60                # Red de seguridad ante escrituras hechas fuera de esta app
+
+# Contadores de inventario por lugar (ver backend/services/inventario_service.py)
+STOCK_BAJO_UMBRAL = 10              # Existencia a partir de la cual un material cuenta como bajo
+
+# Apartados del carrito (ver backend/services/reserva_service.py)
+RESERVA_TTL = 15 * 60               # Segundos que dura un apartado sin actividad en el carrito
+RESERVA_BARRIDO_INTERVAL = 30       # Segundos entre barridos de apartados vencidos
+RESERVA_RETENCION = 24 * 60 * 60    # Segundos que se conservan los apartados cerrados antes del TTL
+
+# Checkout (ver backend/services/checkout_service.py)
+CHECKOUT_TOLERANCIA_PRECIO = 0.01   # Diferencia máxima entre el precio del carrito y el costo_promedio vigente
+
+# Cliente de escritorio (ver frontend/gui/async_loader.py)
+DESKTOP_LOADER_HILOS = 2            # Hilos que atienden las consultas del cliente Tk
+DESKTOP_LOADER_INTERVALO = 30       # Milisegundos entre revisiones de resultados desde el hilo de Tk
@@ -192,4 +192,9 @@ if __name__ == "__main__":
     usuarios = seed_usuarios()
     fallas = seed_fallas(lugares[0], usuarios, materiales)
 
+    # Los inserts directos no pasan por los controladores: se calculan los contadores de lugares
+    from backend.services.inventario_service import reconciliar
+    reconciliar()
+    print("📦 Contadores de inventario por lugar calculados")
+
     print(f"\n✅ Base cargada correctamente en {round(time.time() - start, 2)}s")
@@ -0,0 +1,100 @@
+# data/stress_fallas.py
+#
+# Prueba de concurrencia de create_falla: muchos hilos registran fallas a la
+# vez sobre los mismos pocos materiales, la mitad con permitir_pendientes.
+# Ninguna existencia debe quedar negativa y lo descontado debe coincidir con
+# lo que dicen las fallas guardadas (sin actualizaciones perdidas).
+#
+# Corre en una base aparte (<DB_NAME>_stress) que se borra al terminar; nunca
+# toca las colecciones de la aplicación.
+#     python data/stress_fallas.py
+
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import env
+from backend.services.db_connection import get_client
+from backend.services import inventario_service, stock_service
+from backend.services.stock_service import StockInsuficienteError
+from backend.controllers import falla_controller
+
+HILOS, FALLAS, MATERIALES, EXISTENCIA = 16, 40, 8, 150
+
+
+def main():
+    base = f"{env.DB_NAME}_stress"
+    db = get_client()[base]
+    # create_falla y stock_service escriben en estas colecciones durante la prueba
+    fallas = falla_controller.collection = db["fallas"]
+    materiales = stock_service.materiales = db["materiales"]
+    inventario_service.lugares = db["lugares"]
+    fallas.drop()
+    materiales.drop()
+    ids = materiales.insert_many([
+        {"descripcion": f"MATERIAL {i}", "existencia": EXISTENCIA, "version": 1} for i in range(MATERIALES)
+    ]).inserted_ids
+    inicial = {m["_id"]: m["existencia"] for m in materiales.find()}
+
+    resultados = {"registradas": 0, "rechazadas": 0, "otros": []}
+    candado = threading.Lock()
+
+    def trabajador(semilla):
+        azar = random.Random(semilla)
+        for _ in range(FALLAS):
+            lineas = [{"id_material": str(azar.choice(ids)), "cantidad": azar.randint(1, 6)}
+                      for _ in range(azar.randint(1, 3))]
+            try:
+                falla_controller.create_falla(
+                    {"descripcion": f"hilo{semilla}", "fecha": datetime.utcnow(), "materiales_usados": lineas},
+                    permitir_pendientes=semilla % 2 == 0
+                )
+                resultado = "registradas"
+            except StockInsuficienteError:
+                resultado = "rechazadas"
+            except Exception as e:
+                with candado:
+                    resultados["otros"].append(repr(e))
+                continue
+            with candado:
+                resultados[resultado] += 1
+
+    try:
+        inicio = time.perf_counter()
+        hilos = [threading.Thread(target=trabajador, args=(i,)) for i in range(HILOS)]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        segundos = time.perf_counter() - inicio
+
+        descontado = Counter()
+        for falla in fallas.find():
+            for linea in falla["materiales_usados"]:
+                descontado[linea["id_material"]] += linea["cantidad"]
+            for pendiente in falla.get("materiales_pendientes", []):
+                descontado[pendiente["id_material"]] -= pendiente["cantidad"]
+        final = {m["_id"]: m["existencia"] for m in materiales.find()}
+
+        total = HILOS * FALLAS
+        print(f"{total} fallas en {segundos:.1f} s ({total / segundos:.0f}/s) · "
+              f"{resultados['registradas']} registradas · {resultados['rechazadas']} rechazadas por stock · "
+              f"{fallas.count_documents({'materiales_pendientes': {'$exists': True}})} con pendientes")
+        assert not resultados["otros"], resultados["otros"][:5]
+        assert fallas.count_documents({}) == resultados["registradas"], "fallas perdidas o duplicadas"
+        assert all(e >= 0 for e in final.values()), "hay existencias negativas"
+        for material_id, existencia in inicial.items():
+            assert existencia - final[material_id] == descontado[material_id], f"{material_id}: no cuadra"
+        print("✅ Sin fallas perdidas, sin existencias negativas y el inventario cuadra")
+    finally:
+        get_client().drop_database(base)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,11 +6,14 @@ from datetime import datetime
 
 # CONTROLADORES
 from backend.controllers.user_controller import (
-    get_all_users, create_user, update_user, delete_user
+    get_all_users, create_user, update_user, delete_user,
+    buscar_usuarios, get_user_by_id
 )
+from frontend.gui.selectors import selector_remoto, olvidar_seleccion
 
 # Vista del perfil de usuario
 from frontend.gui.user_view import build_user_frame
+from frontend.gui.performance_view import mostrar_rendimiento, mostrar_consultas_problematicas
 
 # CONFIGURACIÓN DE ESTILOS MODERNOS
 def apply_admin_styles():
@@ -235,6 +238,9 @@ def create_management_menu(options, key="menu"):
         key=key
     )
 
+def _etiqueta_usuario(user):
+    return f"{user.get('correo', '')} · {user.get('nombre', '')} ({user.get('role', user.get('rol', ''))})"
+
 def display_user_card(user):
     role = user.get('role', 'user')
     status_class = "admin" if role == "admin" else "user"
@@ -421,147 +427,147 @@ def administrar_usuarios():
     # EDITAR
     elif "Editar" in menu:
         try:
-            users = get_all_users() or []
+            st.markdown("""
+                <div class="admin-card fade-in">
+                    <h3 style="color: var(--admin-primary); margin-bottom: 1rem;">✏️ Editar Usuario Existente</h3>
+                    <p style="color: #6B7280;">Selecciona un usuario y actualiza su información.</p>
+                </div>
+            """, unsafe_allow_html=True)
             
-            if not users:
-                st.warning("⚠️ No hay usuarios disponibles para editar.")
-            else:
-                st.markdown("""
-                    <div class="admin-card fade-in">
-                        <h3 style="color: var(--admin-primary); margin-bottom: 1rem;">✏️ Editar Usuario Existente</h3>
-                        <p style="color: #6B7280;">Selecciona un usuario y actualiza su información.</p>
-                    </div>
-                """, unsafe_allow_html=True)
+            user = selector_remoto(
+                "👤 Busca el usuario a editar (correo)",
+                "admin_edit_user",
+                buscar_usuarios,
+                get_user_by_id,
+                _etiqueta_usuario
+            )
+
+            if user:
+                # Mostrar información actual
+                st.markdown("### 📋 Información Actual")
+                display_user_card(user)
                 
-                user_options = ["-- Selecciona un usuario --"] + [u["correo"] for u in users]
-                selected = st.selectbox("👤 Selecciona usuario a editar", user_options)
+                st.markdown("---")
+                st.markdown("### ✨ Editar Información")
                 
-                if selected != "-- Selecciona un usuario --":
-                    user = next(u for u in users if u["correo"] == selected)
+                with st.form("edit_user_form"):
+                    col1, col2 = st.columns(2)
                     
-                    # Mostrar información actual
-                    st.markdown("### 📋 Información Actual")
-                    display_user_card(user)
+                    with col1:
+                        nuevo_correo = st.text_input(
+                            "📧 Nuevo correo electrónico",
+                            value=user["correo"],
+                            placeholder="nuevo@correo.com"
+                        )
                     
-                    st.markdown("---")
-                    st.markdown("### ✨ Editar Información")
+                    with col2:
+                        nuevo_role = st.selectbox(
+                            "🎭 Nuevo rol",
+                            ["user", "admin"],
+                            index=0 if user["role"] == "user" else 1,
+                            format_func=lambda x: "👤 Usuario" if x == "user" else "👑 Administrador"
+                        )
                     
-                    with st.form("edit_user_form"):
-                        col1, col2 = st.columns(2)
-                        
-                        with col1:
-                            nuevo_correo = st.text_input(
-                                "📧 Nuevo correo electrónico",
-                                value=user["correo"],
-                                placeholder="nuevo@correo.com"
-                            )
-                        
-                        with col2:
-                            nuevo_role = st.selectbox(
-                                "🎭 Nuevo rol",
-                                ["user", "admin"],
-                                index=0 if user["role"] == "user" else 1,
-                                format_func=lambda x: "👤 Usuario" if x == "user" else "👑 Administrador"
-                            )
-                        
-                        submitted = st.form_submit_button("🔄 Actualizar Usuario", use_container_width=True)
-                        
-                        if submitted:
-                            if not nuevo_correo or "@" not in nuevo_correo:
-                                st.error("❌ Debe proporcionar un correo electrónico válido")
-                            else:
-                                try:
-                                    with st.spinner("🔄 Actualizando usuario..."):
-                                        update_user(user["correo"], {
-                                            "correo": nuevo_correo.strip(),
-                                            "role": nuevo_role,
-                                            "fecha_actualizacion": datetime.now().isoformat()
-                                        })
-                                    
-                                    st.success(f"✅ Usuario '{nuevo_correo}' actualizado exitosamente!")
-                                    time.sleep(2)
-                                    st.rerun()
-                                    
-                                except Exception as e:
-                                    st.error(f"❌ Error al actualizar usuario: {str(e)}")
-                                    
+                    submitted = st.form_submit_button("🔄 Actualizar Usuario", use_container_width=True)
+                    
+                    if submitted:
+                        if not nuevo_correo or "@" not in nuevo_correo:
+                            st.error("❌ Debe proporcionar un correo electrónico válido")
+                        else:
+                            try:
+                                with st.spinner("🔄 Actualizando usuario..."):
+                                    update_user(user["correo"], {
+                                        "correo": nuevo_correo.strip(),
+                                        "role": nuevo_role,
+                                        "fecha_actualizacion": datetime.now().isoformat()
+                                    })
+                                
+                                olvidar_seleccion("admin_edit_user")
+                                st.success(f"✅ Usuario '{nuevo_correo}' actualizado exitosamente!")
+                                time.sleep(2)
+                                st.rerun()
+                                
+                            except Exception as e:
+                                st.error(f"❌ Error al actualizar usuario: {str(e)}")
+                                
         except Exception as e:
             st.error(f"❌ Error al editar usuario: {str(e)}")
 
     # ELIMINAR
     elif "Eliminar" in menu:
         try:
-            users = get_all_users() or []
+            st.markdown("""
+                <div class="admin-card fade-in" style="border-left-color: var(--admin-error);">
+                    <h3 style="color: var(--admin-error); margin-bottom: 1rem;">🗑️ Eliminar Usuario</h3>
+                    <p style="color: #6B7280;">Selecciona un usuario para eliminar permanentemente.</p>
+                </div>
+            """, unsafe_allow_html=True)
             
-            if not users:
-                st.warning("⚠️ No hay usuarios disponibles para eliminar.")
-            else:
-                st.markdown("""
-                    <div class="admin-card fade-in" style="border-left-color: var(--admin-error);">
-                        <h3 style="color: var(--admin-error); margin-bottom: 1rem;">🗑️ Eliminar Usuario</h3>
-                        <p style="color: #6B7280;">Selecciona un usuario para eliminar permanentemente.</p>
+            user = selector_remoto(
+                "👤 Busca el usuario a eliminar (correo)",
+                "admin_delete_user",
+                buscar_usuarios,
+                get_user_by_id,
+                _etiqueta_usuario
+            )
+
+            if user:
+                selected = user["correo"]
+                
+                st.error("🚨 **ACCIÓN IRREVERSIBLE**")
+                st.markdown(f"""
+                    <div class="admin-card" style="background: #FEF2F2; border-left-color: var(--admin-error);">
+                        <h4 style="color: var(--admin-error);">Estás a punto de eliminar al usuario:</h4>
+                        <h3 style="color: var(--admin-dark); text-align: center;">{selected}</h3>
+                        <p style="color: #6B7280; text-align: center;">
+                            Esta acción no se puede deshacer y todos los datos asociados se perderán permanentemente.
+                        </p>
                     </div>
                 """, unsafe_allow_html=True)
                 
-                user_options = ["-- Selecciona un usuario --"] + [u["correo"] for u in users]
-                selected = st.selectbox("👤 Selecciona usuario a eliminar", user_options)
+                st.warning("**Paso 1:** Confirma que entiendes las consecuencias")
+                confirm_understanding = st.checkbox("✅ Comprendo que esta acción es permanente e irreversible")
                 
-                if selected != "-- Selecciona un usuario --":
-                    user = next(u for u in users if u["correo"] == selected)
-                    
-                    st.error("🚨 **ACCIÓN IRREVERSIBLE**")
-                    st.markdown(f"""
-                        <div class="admin-card" style="background: #FEF2F2; border-left-color: var(--admin-error);">
-                            <h4 style="color: var(--admin-error);">Estás a punto de eliminar al usuario:</h4>
-                            <h3 style="color: var(--admin-dark); text-align: center;">{selected}</h3>
-                            <p style="color: #6B7280; text-align: center;">
-                                Esta acción no se puede deshacer y todos los datos asociados se perderán permanentemente.
-                            </p>
-                        </div>
-                    """, unsafe_allow_html=True)
-                    
-                    st.warning("**Paso 1:** Confirma que entiendes las consecuencias")
-                    confirm_understanding = st.checkbox("✅ Comprendo que esta acción es permanente e irreversible")
-                    
-                    if confirm_understanding:
-                        st.error("**Paso 2:** Verificación final")
-                        st.write(f"Escribe el correo del usuario para confirmar: **{selected}**")
-                        confirm_email = st.text_input("Escribe el correo exacto:")
-                        
-                        final_confirmation = confirm_email.strip() == selected
-                    else:
-                        final_confirmation = False
+                if confirm_understanding:
+                    st.error("**Paso 2:** Verificación final")
+                    st.write(f"Escribe el correo del usuario para confirmar: **{selected}**")
+                    confirm_email = st.text_input("Escribe el correo exacto:")
                     
-                    col_delete, col_cancel = st.columns(2)
-                    
-                    with col_delete:
-                        delete_disabled = not final_confirmation
-                        delete_clicked = st.button(
-                            "🗑️ ELIMINAR DEFINITIVAMENTE",
-                            disabled=delete_disabled,
-                            use_container_width=True,
-                            type="primary"
-                        )
-                    
-                    with col_cancel:
-                        if st.button("❌ Cancelar Eliminación", use_container_width=True):
-                            st.success("✅ Eliminación cancelada")
+                    final_confirmation = confirm_email.strip() == selected
+                else:
+                    final_confirmation = False
+                
+                col_delete, col_cancel = st.columns(2)
+                
+                with col_delete:
+                    delete_disabled = not final_confirmation
+                    delete_clicked = st.button(
+                        "🗑️ ELIMINAR DEFINITIVAMENTE",
+                        disabled=delete_disabled,
+                        use_container_width=True,
+                        type="primary"
+                    )
+                
+                with col_cancel:
+                    if st.button("❌ Cancelar Eliminación", use_container_width=True):
+                        st.success("✅ Eliminación cancelada")
+                        time.sleep(1)
+                        st.rerun()
+                
+                if delete_clicked and final_confirmation:
+                    try:
+                        with st.spinner("🔄 Eliminando usuario..."):
                             time.sleep(1)
-                            st.rerun()
-                    
-                    if delete_clicked and final_confirmation:
-                        try:
-                            with st.spinner("🔄 Eliminando usuario..."):
-                                time.sleep(1)
-                                delete_user(selected)
-                            
-                            st.success(f"✅ Usuario '{selected}' eliminado exitosamente!")
-                            time.sleep(2)
-                            st.rerun()
-                            
-                        except Exception as e:
-                            st.error(f"❌ Error al eliminar usuario: {str(e)}")
-                            
+                            delete_user(selected)
+                        olvidar_seleccion("admin_delete_user")
+                        
+                        st.success(f"✅ Usuario '{selected}' eliminado exitosamente!")
+                        time.sleep(2)
+                        st.rerun()
+                        
+                    except Exception as e:
+                        st.error(f"❌ Error al eliminar usuario: {str(e)}")
+                        
         except Exception as e:
             st.error(f"❌ Error al procesar eliminación: {str(e)}")
 
@@ -597,7 +603,7 @@ def build_admin_frame():
     
     seccion = st.radio(
         "¿Qué deseas administrar?",
-        ["👤 Usuarios", "📊 Analytics"],
+        ["👤 Usuarios", "📊 Analytics", "⚡ Rendimiento", "🐢 Consultas"],
         horizontal=True,
         label_visibility="collapsed"
     )
@@ -608,6 +614,10 @@ def build_admin_frame():
         administrar_usuarios()
     elif seccion == "📊 Graficos":
         mostrar_analytics()
+    elif seccion == "⚡ Rendimiento":
+        mostrar_rendimiento()
+    elif seccion == "🐢 Consultas":
+        mostrar_consultas_problematicas()
 
 if __name__ == "__main__":
     build_admin_frame()
\ No newline at end of file
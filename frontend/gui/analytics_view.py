@@ -6,17 +6,33 @@ from datetime import datetime, timedelta
 import random
 import numpy as np
 from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import PolynomialFeatures
 from sklearn.metrics import mean_squared_error, r2_score
 import os
 import re
 import json
+import uuid
+from backend.services.analytics_jobs import ajustar_polinomio, calcular_tendencia
+from frontend.gui.chart_reduction import scatter_adaptativo, linea_reducida, caption_payload
+from frontend.gui.figure_cache import figura_cacheada, datos_cacheados, TEMAS
+from backend.services.data_version import sondear
+from config.env import (
+    COLLECTION_USERS, COLLECTION_MATERIALES, COLLECTION_LUGARES,
+    COLLECTION_FALLAS, COLLECTION_PRONOSTICOS
+)
+from config import settings
+from backend.services.job_executor import (
+    submit as submit_job, poll as poll_job, cancel as cancel_job,
+    ColaLlenaError, LISTO, ERROR, PENDIENTE
+)
 
 # CONTROLADORES 
 try:
     from backend.controllers.user_controller import get_all_users
     from backend.controllers.material_controller import get_all_material
     from backend.controllers.lugar_controller import get_all_lugares
+    from backend.services.consumo_service import top_consumo, consumo_mensual
+    from backend.services.forecast_service import get_pronosticos, get_ultima_ejecucion
+    from backend.services.regression_service import ajustar_por_grupo
 except ImportError:
     # Datos de ejemplo para desarrollo
     def get_all_users():
@@ -43,6 +59,18 @@ except ImportError:
             {"nombre": "Taller Mecánico", "tipo": "Taller", "ubicacion": "Edificio B"},
         ]
 
+    def top_consumo(n=10, dias=90):
+        return []
+
+    def consumo_mensual(dimension="lugar", dias=365):
+        return []
+
+    def get_pronosticos(solo_pedidos=False, limit=100):
+        return []
+
+    def get_ultima_ejecucion():
+        return None
+
 # CONFIGURACIÓN INICIAL MEJORADA
 
 def setup_page_config():
@@ -207,6 +235,92 @@ def create_welcome_header():
         </div>
     """, unsafe_allow_html=True)
 
+# EJECUCIÓN EN SEGUNDO PLANO
+
+def _id_sesion():
+    if "analytics_sesion" not in st.session_state:
+        st.session_state.analytics_sesion = uuid.uuid4().hex
+    return st.session_state.analytics_sesion
+
+def _esperar_trabajo(jid):
+    """
+    Aviso de cálculo en curso como fragmento: sólo este bloque se vuelve a
+    ejecutar cada ANALYTICS_POLL_INTERVAL segundos, y la página completa se
+    relanza una sola vez, cuando el trabajo termina.
+    """
+    @st.fragment(run_every=settings.ANALYTICS_POLL_INTERVAL)
+    def _pendiente():
+        estado, _ = poll_job(jid)
+        if estado != PENDIENTE:
+            st.rerun(scope="app")
+        st.info("⏳ Calculando en segundo plano...")
+
+    _pendiente()
+
+def ejecutar_en_segundo_plano(modulo, fn, *args):
+    """
+    Envía el cálculo al pool de procesos y devuelve su resultado cuando esté
+    listo. Mientras tanto muestra un aviso que se revisa solo (ver
+    _esperar_trabajo), así la sesión sigue respondiendo y puede navegar a otro módulo.
+    """
+    activos = st.session_state.setdefault("analytics_jobs", {})
+    try:
+        jid = submit_job(fn, *args, suscriptor=_id_sesion())
+    except ColaLlenaError as e:
+        st.warning(f"⏳ {e}")
+        st.stop()
+
+    # Si cambiaron los parámetros, el trabajo anterior de este módulo ya no interesa
+    anterior = activos.get(modulo)
+    if anterior and anterior != jid:
+        cancel_job(anterior, _id_sesion())
+    activos[modulo] = jid
+
+    estado, valor = poll_job(jid)
+    if estado == LISTO:
+        activos.pop(modulo, None)
+        return valor
+    if estado == ERROR:
+        activos.pop(modulo, None)
+        st.error(f"❌ Error en el cálculo: {valor}")
+        st.stop()
+
+    _esperar_trabajo(jid)
+    st.stop()
+
+def cancelar_jobs_de_otros_modulos(modulo_activo):
+    """Cancela los cálculos de los módulos que el usuario dejó de ver."""
+    activos = st.session_state.get("analytics_jobs", {})
+    for modulo in [m for m in activos if m != modulo_activo]:
+        cancel_job(activos.pop(modulo), _id_sesion())
+
+# ACTUALIZACIÓN AUTOMÁTICA
+
+# Colecciones de las que depende cada módulo; los módulos con datos sintéticos no se sondean
+COLECCIONES_POR_MODULO = {
+    "🏠 Dashboard Principal": (COLLECTION_USERS, COLLECTION_MATERIALES, COLLECTION_LUGARES, COLLECTION_PRONOSTICOS),
+    "📦 Consumo de Materiales": (COLLECTION_FALLAS, COLLECTION_MATERIALES),
+}
+
+def vigilar_cambios(colecciones):
+    """
+    Fragmento que se ejecuta cada AUTO_REFRESH_INTERVAL segundos: sondea las
+    versiones de las colecciones y sólo si alguna cambió relanza la página.
+    En ese rerun los widgets de colecciones sin cambios salen de caché.
+    """
+    intervalo = max(settings.AUTO_REFRESH_INTERVAL, settings.AUTO_REFRESH_MIN_INTERVAL)
+
+    @st.fragment(run_every=intervalo)
+    def _sondeo():
+        versiones = sondear(colecciones)
+        vistas = st.session_state.get("versiones_vistas")
+        st.session_state.versiones_vistas = versiones
+        if vistas is not None and vistas != versiones:
+            st.rerun(scope="app")
+        st.caption(f"🔄 Revisado a las {datetime.now().strftime('%H:%M:%S')} · cada {intervalo}s")
+
+    _sondeo()
+
 # MÓDULOS DE REGRESIÓN MEJORADOS
 
 def mostrar_regresion_polinomica_interactiva():
@@ -239,42 +353,23 @@ def mostrar_regresion_polinomica_interactiva():
             mostrar_residuales = st.checkbox("Mostrar residuales", True)
             mostrar_intervalos = st.checkbox("Intervalos confianza", False)
     
-    # Barra de progreso para simulación
-    with st.spinner('🔄 Generando modelo predictivo...'):
-        progress_bar = st.progress(0)
-        
-        # Generar datos sintéticos
-        materiales = get_all_material()
-        if materiales:
-            progress_bar.progress(30)
-            
-            # Usar estadísticas reales para generar datos más realistas
-            costos = [m['costo_promedio'] for m in materiales]
-            existencias = [m['existencia'] for m in materiales]
-            
-            # Crear relación no lineal basada en datos reales
-            X_base = np.linspace(min(existencias), max(existencias), n_puntos)
-            y_base = np.polyval([-0.01, 0.5, 5], X_base)
-            y = y_base + np.random.normal(0, ruido, n_puntos)
-            X = X_base.reshape(-1, 1)
-            
-            progress_bar.progress(60)
-            
-            # Entrenar modelo polinómico
-            poly = PolynomialFeatures(degree=grado)
-            X_poly = poly.fit_transform(X)
-            
-            modelo = LinearRegression()
-            modelo.fit(X_poly, y)
-            y_pred = modelo.predict(X_poly)
-            
-            progress_bar.progress(90)
-            
-            # Métricas
-            r2 = r2_score(y, y_pred)
-            rmse = np.sqrt(mean_squared_error(y, y_pred))
-            
-            progress_bar.progress(100)
+    # Usar estadísticas reales para generar datos más realistas
+    materiales = get_all_material()
+    if not materiales:
+        st.info("💡 No hay materiales registrados para generar el modelo")
+        return
+    existencias = [m['existencia'] for m in materiales]
+
+    # El ajuste corre en el pool de procesos; esta sesión sólo consulta el resultado
+    resultado = ejecutar_en_segundo_plano(
+        "polinomica", ajustar_polinomio,
+        float(min(existencias)), float(max(existencias)), n_puntos, grado, ruido
+    )
+    X = resultado["x"].reshape(-1, 1)
+    y = resultado["y"]
+    y_pred = resultado["y_pred"]
+    r2 = resultado["r2"]
+    rmse = resultado["rmse"]
     
     # Visualización mejorada
     col_viz1, col_viz2 = st.columns([2, 1])
@@ -283,16 +378,16 @@ def mostrar_regresion_polinomica_interactiva():
         fig = go.Figure()
         
         # Datos reales
-        fig.add_trace(go.Scatter(
-            x=X.flatten(), y=y, mode='markers', 
+        fig.add_trace(scatter_adaptativo(
+            X.flatten(), y, mode='markers', 
             name='📊 Datos Reales', 
             marker=dict(color='#6366F1', size=8, opacity=0.7),
             hovertemplate='<b>X</b>: %{x:.2f}<br><b>Y</b>: %{y:.2f}<extra></extra>'
         ))
         
         # Línea de predicción
-        fig.add_trace(go.Scatter(
-            x=X.flatten(), y=y_pred, mode='lines',
+        fig.add_trace(linea_reducida(
+            X.flatten(), y_pred,
             name=f'🎯 Modelo (grado {grado})', 
             line=dict(color='#FF6B6B', width=4),
             hovertemplate='<b>Predicción</b>: %{y:.2f}<extra></extra>'
@@ -307,6 +402,7 @@ def mostrar_regresion_polinomica_interactiva():
             hovermode='closest'
         )
         st.plotly_chart(fig, use_container_width=True)
+        caption_payload(fig)
     
     with col_viz2:
         # Panel de métricas interactivo
@@ -337,8 +433,8 @@ def mostrar_regresion_polinomica_interactiva():
         
         residuales = y - y_pred
         fig_res = go.Figure()
-        fig_res.add_trace(go.Scatter(
-            x=y_pred, y=residuales, mode='markers',
+        fig_res.add_trace(scatter_adaptativo(
+            y_pred, residuales, mode='markers',
             marker=dict(color='#FFA726', size=6, opacity=0.6),
             name='Residuales'
         ))
@@ -351,6 +447,7 @@ def mostrar_regresion_polinomica_interactiva():
             template="plotly_white"
         )
         st.plotly_chart(fig_res, use_container_width=True)
+        caption_payload(fig_res)
 
 def mostrar_regresion_multiple_interactiva():
     """Módulo de Regresión Lineal Múltiple """
@@ -404,7 +501,7 @@ def mostrar_regresion_multiple_interactiva():
         rmse = np.sqrt(mean_squared_error(y, y_pred))
     
     # Resultados en pestañas
-    tab1, tab2, tab3 = st.tabs(["📊 Resultados", "🎯 Predicción", "📈 Visualización"])
+    tab1, tab2, tab3, tab4 = st.tabs(["📊 Resultados", "🎯 Predicción", "📈 Visualización", "🧮 Por Grupo"])
     
     with tab1:
         col_res1, col_res2 = st.columns(2)
@@ -482,6 +579,31 @@ def mostrar_regresion_multiple_interactiva():
         else:
             st.info("Selecciona al menos 2 variables predictoras para ver la matriz de dispersión")
 
+    with tab4:
+        st.markdown("#### 🧮 Modelos por Grupo")
+        claves_grupo = [c for c in ["clasificacion", "lugar_id", "generico"] if c in materiales_df.columns]
+        if not claves_grupo:
+            st.info("Los materiales no tienen columnas para agrupar")
+            return
+
+        clave = st.selectbox("Agrupar por", claves_grupo)
+        # Todos los grupos se resuelven en una sola llamada vectorizada
+        por_grupo = ajustar_por_grupo(materiales_df, clave, variables_predictoras, variable_objetivo)
+        if por_grupo.empty:
+            st.info("No hay datos suficientes para ajustar modelos por grupo")
+            return
+
+        st.dataframe(por_grupo.round(3), use_container_width=True, hide_index=True)
+        fig_grupos = px.bar(
+            por_grupo.sort_values("r2", ascending=False),
+            x=clave,
+            y="r2",
+            hover_data=["n", "rmse"],
+            title=f"R² por {clave}"
+        )
+        fig_grupos.update_layout(xaxis_tickangle=-45, template="plotly_white")
+        st.plotly_chart(fig_grupos, use_container_width=True)
+
 def mostrar_analisis_tendencias_avanzado():
     """Módulo de Análisis de Tendencias Temporales """
     st.markdown("### 📊 Análisis de Tendencias Temporales Avanzado")
@@ -508,55 +630,41 @@ def mostrar_analisis_tendencias_avanzado():
     
     # Generar datos temporales sintéticos mejorados
     if periodo == "Últimos 6 meses":
-        fechas = pd.date_range(start='2024-01-01', end='2024-06-30', freq='D')
+        inicio, fin = '2024-01-01', '2024-06-30'
     elif periodo == "Último año":
-        fechas = pd.date_range(start='2024-01-01', end='2024-12-31', freq='D')
+        inicio, fin = '2024-01-01', '2024-12-31'
     else:
-        fechas = pd.date_range(start='2023-01-01', end='2024-12-31', freq='D')
-    
-    # Simular datos más realistas
-    tendencia_base = np.linspace(100, 200, len(fechas))
-    estacionalidad = 25 * np.sin(2 * np.pi * np.arange(len(fechas)) / 30)
-    ruido = np.random.normal(0, 8, len(fechas))
-    valores = tendencia_base + estacionalidad + ruido
-    
-    datos_temporales = pd.DataFrame({
-        'fecha': fechas,
-        'valor': valores,
-        'media_movil_7': pd.Series(valores).rolling(window=7).mean(),
-        'media_movil_30': pd.Series(valores).rolling(window=30).mean()
-    })
+        inicio, fin = '2023-01-01', '2024-12-31'
     
-    # Análisis de tendencia
-    X_temp = np.arange(len(datos_temporales)).reshape(-1, 1)
-    y_temp = datos_temporales['valor'].values
-    
-    modelo_tendencia = LinearRegression()
-    modelo_tendencia.fit(X_temp, y_temp)
-    tendencia_lineal = modelo_tendencia.predict(X_temp)
+    # Serie y tendencia se calculan en el pool de procesos
+    resultado = ejecutar_en_segundo_plano("tendencias", calcular_tendencia, inicio, fin)
+    datos_temporales = resultado["datos"]
+    tendencia_lineal = resultado["tendencia_lineal"]
+    valores = datos_temporales['valor'].values
     
     # Visualización avanzada
     fig = go.Figure()
     
-    # Datos originales
-    fig.add_trace(go.Scatter(
-        x=datos_temporales['fecha'], y=datos_temporales['valor'],
-        mode='lines', name='📈 Valores Diarios', 
+    # Series reducidas antes de construir la figura: la diaria conserva picos
+    # (min-max) y las suavizadas usan LTTB; la tendencia es recta y basta con sus extremos
+    fig.add_trace(linea_reducida(
+        datos_temporales['fecha'], datos_temporales['valor'], metodo="minmax",
+        name='📈 Valores Diarios', 
         line=dict(color='lightblue', width=1),
         opacity=0.6
     ))
     
     # Media móvil
-    fig.add_trace(go.Scatter(
-        x=datos_temporales['fecha'], y=datos_temporales['media_movil_7'],
-        mode='lines', name='📊 Media Móvil (7 días)', 
+    fig.add_trace(linea_reducida(
+        datos_temporales['fecha'], datos_temporales['media_movil_7'],
+        name='📊 Media Móvil (7 días)', 
         line=dict(color='blue', width=3)
     ))
     
     # Tendencia
-    fig.add_trace(go.Scatter(
-        x=datos_temporales['fecha'], y=tendencia_lineal,
-        mode='lines', name='🎯 Tendencia Lineal', 
+    fig.add_trace(linea_reducida(
+        datos_temporales['fecha'], tendencia_lineal, max_puntos=2,
+        name='🎯 Tendencia Lineal', 
         line=dict(color='red', width=4, dash='dash')
     ))
     
@@ -570,12 +678,13 @@ def mostrar_analisis_tendencias_avanzado():
     )
     
     st.plotly_chart(fig, use_container_width=True)
+    caption_payload(fig)
     
     # Métricas y insights
     st.markdown("### 📈 Insights de Tendencia")
     
-    pendiente = modelo_tendencia.coef_[0] * 30  # Pendiente mensual
-    r2_tendencia = r2_score(y_temp, tendencia_lineal)
+    pendiente = resultado["pendiente_diaria"] * 30  # Pendiente mensual
+    r2_tendencia = resultado["r2"]
     
     col1, col2, col3, col4 = st.columns(4)
     
@@ -620,24 +729,111 @@ def mostrar_analisis_tendencias_avanzado():
         - Considera ajustes operativos
         """)
 
+def mostrar_consumo_materiales():
+    """Módulo de Consumo de Materiales a partir de fallas.materiales_usados"""
+    st.markdown("### 📦 Consumo de Materiales")
+
+    with st.expander("⚙️ CONFIGURACIÓN DEL ANÁLISIS DE CONSUMO", expanded=True):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            dias = st.selectbox("Ventana de análisis (días)", [30, 90, 180, 365], index=1)
+        with col2:
+            dimension = st.selectbox(
+                "Desglosar por",
+                ["lugar", "vehiculo"],
+                format_func=lambda d: "📍 Lugar" if d == "lugar" else "🚚 Vehículo"
+            )
+        with col3:
+            top_n = st.slider("Top materiales", 5, 30, 10)
+
+    with st.spinner("🔄 Agregando consumo..."):
+        top = top_consumo(n=top_n, dias=dias)
+        mensual = consumo_mensual(dimension=dimension, dias=dias)
+
+    if not top:
+        st.info("💡 No hay consumo de materiales registrado en la ventana seleccionada")
+        return
+
+    top_df = pd.DataFrame(top)
+    col_viz, col_tabla = st.columns([3, 2])
+
+    with col_viz:
+        fig_top = px.bar(
+            top_df,
+            x="descripcion",
+            y="cantidad",
+            title=f"🔥 Top {top_n} materiales más consumidos ({dias} días)",
+            color="dias_restantes",
+            color_continuous_scale="RdYlGn"
+        )
+        fig_top.update_layout(xaxis_tickangle=-45, height=450, template="plotly_white")
+        st.plotly_chart(fig_top, use_container_width=True)
+
+    with col_tabla:
+        st.markdown("#### ⏳ Días de stock restantes")
+        tabla = top_df[["clave_material", "descripcion", "existencia", "consumo_diario", "dias_restantes"]].copy()
+        tabla["consumo_diario"] = tabla["consumo_diario"].round(2)
+        tabla["dias_restantes"] = tabla["dias_restantes"].round(1)
+        st.dataframe(tabla, use_container_width=True, hide_index=True, height=420)
+
+    criticos = top_df[top_df["dias_restantes"].fillna(float("inf")) < 15]
+    if not criticos.empty:
+        st.warning(f"⚠️ {len(criticos)} materiales se agotarán en menos de 15 días al ritmo actual")
+
+    if mensual:
+        st.markdown("---")
+        mensual_df = pd.DataFrame(mensual)
+        por_dimension = mensual_df.groupby(["mes", "dimension"], as_index=False)["cantidad"].sum()
+        fig_mes = px.line(
+            por_dimension,
+            x="mes",
+            y="cantidad",
+            color="dimension",
+            markers=True,
+            title="📅 Consumo mensual por " + ("lugar" if dimension == "lugar" else "vehículo")
+        )
+        fig_mes.update_layout(height=400, template="plotly_white")
+        st.plotly_chart(fig_mes, use_container_width=True)
+
 # DASHBOARD PRINCIPAL
 
-def mostrar_dashboard_principal_interactivo():
+def _fig_clasificacion(clasif_data, tema):
+    return px.pie(
+        values=list(clasif_data.values()),
+        names=list(clasif_data.keys()),
+        title="📑 Distribución por Clasificación",
+        template=tema
+    )
+
+
+def _fig_valor(materials, tema):
+    materiales_df = pd.DataFrame(materials)
+    materiales_df['valor_total'] = materiales_df['existencia'] * materiales_df['costo_promedio']
+    top_materiales = materiales_df.nlargest(10, 'valor_total')
+
+    fig_valor = px.bar(
+        data_frame=top_materiales,
+        x='descripcion',
+        y='valor_total',
+        title="Valor total por descripción",
+        template=tema
+    )
+    fig_valor.update_layout(xaxis_tickangle=-45)
+    return fig_valor
+
+
+def mostrar_dashboard_principal_interactivo(tema_oscuro=False):
     """Dashboard principal completamente mejorado"""
-    import pandas as pd
-    import numpy as np
-    import streamlit as st
-    import plotly.express as px
-    from sklearn.linear_model import LinearRegression
+    tema = TEMAS[tema_oscuro]
 
-    # Obtener datos
-    users = get_all_users() or []
-    materials = get_all_material() or []
-    places = get_all_lugares() or []
+    # Obtener datos (cada bloque se recalcula sólo si cambió su colección)
+    users = datos_cacheados("usuarios", lambda: get_all_users() or [], COLLECTION_USERS)
+    materials = datos_cacheados("materiales", lambda: get_all_material() or [])
+    places = datos_cacheados("lugares", lambda: get_all_lugares() or [], COLLECTION_LUGARES)
 
     # Calcular métricas
-    user_metrics = calculate_user_metrics(users)
-    material_metrics = calculate_material_metrics(materials)
+    user_metrics = datos_cacheados("metricas_usuarios", lambda: calculate_user_metrics(users), COLLECTION_USERS)
+    material_metrics = datos_cacheados("metricas_materiales", lambda: calculate_material_metrics(materials))
 
     st.markdown("### 🎯 PANEL DE CONTROL PRINCIPAL")
 
@@ -733,23 +929,24 @@ def mostrar_dashboard_principal_interactivo():
 
     with col_ins1:
         with st.container():
-            st.markdown("#### 📊 Tendencia de Valor")
+            st.markdown("#### 📊 Puntos de Reorden")
             st.markdown("""
             <div style='background: #f0f9ff; padding: 1.5rem; border-radius: 10px; border-left: 4px solid #0ea5e9;'>
-            <h4 style='margin: 0; color: #0369a1;'>📈 Proyección de Valor</h4>
+            <h4 style='margin: 0; color: #0369a1;'>📈 Pronóstico de Demanda</h4>
             """, unsafe_allow_html=True)
 
-            materiales_df = pd.DataFrame(materials)
-            if len(materiales_df) > 1 and 'costo_promedio' in materiales_df.columns and 'existencia' in materiales_df.columns:
-                X = np.arange(len(materiales_df)).reshape(-1, 1)
-                y = materiales_df['costo_promedio'] * materiales_df['existencia']
-                modelo = LinearRegression()
-                modelo.fit(X, y)
-                proximo_valor = modelo.predict([[len(materiales_df)]])[0]
-
-                st.metric("Próximo valor esperado", f"${proximo_valor:,.2f}")
-                crecimiento_valor = ((proximo_valor - y.mean()) / y.mean()) * 100
-                st.metric("Crecimiento proyectado", f"{crecimiento_valor:+.1f}%")
+            # Pronósticos precalculados por el proceso nocturno (forecast_service)
+            pedidos, ultima = datos_cacheados(
+                "pedidos",
+                lambda: (get_pronosticos(solo_pedidos=True, limit=50), get_ultima_ejecucion()),
+                COLLECTION_PRONOSTICOS
+            )
+            if ultima is None:
+                st.info("Aún no se han calculado pronósticos")
+            else:
+                st.metric("Materiales bajo punto de reorden", len(pedidos))
+                st.metric("Unidades sugeridas a pedir", f"{sum(p['cantidad_sugerida'] for p in pedidos):,}")
+                st.caption(f"Actualizado: {ultima.strftime('%d/%m/%Y %H:%M')}")
 
             st.markdown("</div>", unsafe_allow_html=True)
 
@@ -806,29 +1003,15 @@ def mostrar_dashboard_principal_interactivo():
         # Distribución de materiales por clasificación
         if material_metrics.get('classifications'):
             clasif_data = material_metrics['classifications']
-            fig_clasif = px.pie(
-                values=list(clasif_data.values()),
-                names=list(clasif_data.keys()),
-                title="📑 Distribución por Clasificación"
+            fig_clasif = figura_cacheada(
+                "clasificacion", tema, lambda t: _fig_clasificacion(clasif_data, t)
             )
             st.plotly_chart(fig_clasif, use_container_width=True)
 
     with col_viz2:
         # Valor por material (top 10)
         if materials:
-            materiales_df = pd.DataFrame(materials)
-            materiales_df['valor_total'] = materiales_df['existencia'] * materiales_df['costo_promedio']
-            top_materiales = materiales_df.nlargest(10, 'valor_total')
-
-            # ✅ CORRECCIÓN: usar la variable correcta (materiales_df)
-            fig_valor = px.bar(
-                data_frame=top_materiales,
-                x='descripcion',
-                y='valor_total',
-                title="Valor total por descripción"
-            )
-            st.plotly_chart(fig_valor, use_container_width=True)
-            fig_valor.update_layout(xaxis_tickangle=-45)
+            fig_valor = figura_cacheada("valor_top10", tema, lambda t: _fig_valor(materials, t))
             st.plotly_chart(fig_valor, use_container_width=True)
 
 
@@ -915,7 +1098,8 @@ def mostrar_analytics():
                 "🏠 Dashboard Principal", 
                 "🎯 Regresión Polinómica", 
                 "🔮 Regresión Múltiple", 
-                "📊 Análisis Temporal"
+                "📊 Análisis Temporal",
+                "📦 Consumo de Materiales"
             ],
             label_visibility="collapsed"
         )
@@ -924,8 +1108,8 @@ def mostrar_analytics():
         
         # Información del sistema
         st.markdown("### 📊 Estado del Sistema")
-        users = get_all_users()
-        materials = get_all_material()
+        users = datos_cacheados("usuarios", lambda: get_all_users() or [], COLLECTION_USERS)
+        materials = datos_cacheados("materiales", lambda: get_all_material() or [])
         
         st.metric("Usuarios activos", len(users))
         st.metric("Materiales registrados", len(materials))
@@ -937,19 +1121,32 @@ def mostrar_analytics():
         st.markdown("### ⚙️ Configuración")
         tema_oscuro = st.toggle("Modo oscuro", False)
         actualizar_auto = st.toggle("Actualización automática", True)
-        
+        colecciones = COLECCIONES_POR_MODULO.get(modulo_activo, ())
+
+        if actualizar_auto and colecciones:
+            vigilar_cambios(colecciones)
+
         if st.button("🔄 Actualizar Datos", use_container_width=True):
+            # Fuerza el sondeo: sólo se vuelve a consultar lo que cambió en MongoDB
+            sondear(colecciones, forzar=True)
             st.rerun()
     
+    cancelar_jobs_de_otros_modulos({
+        "🎯 Regresión Polinómica": "polinomica",
+        "📊 Análisis Temporal": "tendencias",
+    }.get(modulo_activo))
+
     # Navegación entre módulos
     if modulo_activo == "🏠 Dashboard Principal":
-        mostrar_dashboard_principal_interactivo()
+        mostrar_dashboard_principal_interactivo(tema_oscuro)
     elif modulo_activo == "🎯 Regresión Polinómica":
         mostrar_regresion_polinomica_interactiva()
     elif modulo_activo == "🔮 Regresión Múltiple":
         mostrar_regresion_multiple_interactiva()
     elif modulo_activo == "📊 Análisis Temporal":
         mostrar_analisis_tendencias_avanzado()
+    elif modulo_activo == "📦 Consumo de Materiales":
+        mostrar_consumo_materiales()
 
 
 # EJECUCIÓN PRINCIPAL
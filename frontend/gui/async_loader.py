@@ -0,0 +1,97 @@
+# frontend/gui/async_loader.py
+#
+# Capa de datos del cliente de escritorio. Tk no es seguro entre hilos y
+# cualquier consulta a MongoDB en el hilo principal congela la ventana, así
+# que las llamadas a controladores se encolan para unos hilos de trabajo y sus
+# resultados vuelven por otra cola que el hilo de Tk revisa con root.after.
+# Los callbacks siempre se ejecutan en el hilo de Tk y pueden tocar widgets.
+
+import queue
+import threading
+from config import settings
+
+
+class AsyncLoader:
+    """Ejecuta funciones en hilos de trabajo y entrega el resultado en el hilo de Tk."""
+
+    def __init__(self, root, hilos=settings.DESKTOP_LOADER_HILOS,
+                 intervalo=settings.DESKTOP_LOADER_INTERVALO):
+        self.root = root
+        self.intervalo = intervalo
+        self._tareas = queue.Queue()
+        self._resultados = queue.Queue()
+        self._pendientes = 0
+        self._revisando = False
+        # Última generación pedida por clave: los resultados viejos se descartan
+        self._generaciones = {}
+        self._detenido = False
+        self._hilos = [
+            threading.Thread(target=self._trabajar, daemon=True, name=f"loader-{i}")
+            for i in range(hilos)
+        ]
+        for hilo in self._hilos:
+            hilo.start()
+
+    def cargar(self, funcion, *args, al_terminar=None, al_fallar=None, clave=None, **kwargs):
+        """
+        Encola funcion(*args, **kwargs). al_terminar(resultado) o al_fallar(error)
+        se llaman en el hilo de Tk. Con `clave`, sólo se entrega el resultado de
+        la petición más reciente con esa clave (p. ej. al teclear una búsqueda).
+        """
+        if self._detenido:
+            return
+        generacion = None
+        if clave is not None:
+            generacion = self._generaciones[clave] = self._generaciones.get(clave, 0) + 1
+        self._pendientes += 1
+        self._tareas.put((funcion, args, kwargs, al_terminar, al_fallar, clave, generacion))
+        if not self._revisando:
+            self._revisando = True
+            self.root.after(self.intervalo, self._revisar)
+
+    def _trabajar(self):
+        while True:
+            tarea = self._tareas.get()
+            if tarea is None:
+                return
+            funcion, args, kwargs, al_terminar, al_fallar, clave, generacion = tarea
+            try:
+                resultado, error = funcion(*args, **kwargs), None
+            except Exception as e:
+                resultado, error = None, e
+            self._resultados.put((resultado, error, al_terminar, al_fallar, clave, generacion))
+
+    def _revisar(self):
+        """Hilo de Tk: entrega los resultados listos y se reprograma mientras haya pendientes."""
+        if self._detenido:
+            return
+        while True:
+            try:
+                resultado, error, al_terminar, al_fallar, clave, generacion = self._resultados.get_nowait()
+            except queue.Empty:
+                break
+            self._pendientes -= 1
+            if clave is not None and self._generaciones.get(clave) != generacion:
+                continue
+            if error is not None:
+                if al_fallar:
+                    al_fallar(error)
+                else:
+                    print(f"⚠️ Carga en segundo plano fallida: {error}")
+            elif al_terminar:
+                al_terminar(resultado)
+
+        if self._pendientes:
+            self.root.after(self.intervalo, self._revisar)
+        else:
+            self._revisando = False
+
+    @property
+    def ocupado(self):
+        return self._pendientes > 0
+
+    def detener(self):
+        """Para los hilos; llamar antes de destruir la ventana."""
+        self._detenido = True
+        for _ in self._hilos:
+            self._tareas.put(None)
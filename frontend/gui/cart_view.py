@@ -1,15 +1,27 @@
 # frontend/gui/cart_view.py
 
 import ttkbootstrap as ttk
-from backend.controllers.cart_controller import calculate_total
+from backend.controllers.cart_controller import calculate_total, checkout
+from frontend.gui.virtual_treeview import VirtualTreeview
 
-def build_cart_frame(root, cart_items):
+COLUMNAS = [("Material", 320), ("Cantidad", 90), ("Subtotal", 110)]
+
+
+def _valores(item):
+    return (item["name"], f"x{item['quantity']}", f"${item['price'] * item['quantity']:.2f}")
+
+
+def build_cart_frame(root, cart_items, loader=None, user_id=None):
+    """
+    Carrito del cliente de escritorio: una lista virtual (una fila de Treeview
+    por línea visible) y, si hay loader, el checkout en segundo plano.
+    """
     frame = ttk.Frame(root, padding=30)
     frame.pack(fill="both", expand=True)
 
     ttk.Label(
-        frame, 
-        text="🛒 Carrito de compras", 
+        frame,
+        text="🛒 Carrito de compras",
         font=("Segoe UI", 18, "bold"),
         anchor="center"
     ).pack(pady=(0, 20))
@@ -17,32 +29,49 @@ def build_cart_frame(root, cart_items):
     if not cart_items:
         ttk.Label(frame, text="El carrito está vacío.", font=("Segoe UI", 12, "italic")).pack(pady=10)
     else:
-        for item in cart_items:
-            item_frame = ttk.Frame(frame, padding=5, bootstyle="secondary")
-            item_frame.pack(fill="x", pady=4, padx=10)
-            ttk.Label(
-                item_frame, 
-                text=f"{item['name']}", 
-                font=("Segoe UI", 12, "bold"),
-                anchor="w"
-            ).pack(side="left", padx=(0, 10))
-            ttk.Label(
-                item_frame, 
-                text=f"x{item['quantity']}", 
-                font=("Segoe UI", 12),
-                anchor="w"
-            ).pack(side="left", padx=(0, 10))
-            ttk.Label(
-                item_frame, 
-                text=f"${item['price'] * item['quantity']:.2f}", 
-                font=("Segoe UI", 12),
-                anchor="w"
-            ).pack(side="right")
-
-    total = calculate_total(cart_items)
-    ttk.Label(
-        frame, 
-        text=f"Total: ${total:.2f}", 
+        lista = VirtualTreeview(frame, COLUMNAS, valores=_valores)
+        lista.pack(fill="both", expand=True, padx=10)
+        lista.set_datos(cart_items)
+
+    total = ttk.Label(
+        frame,
+        text=f"Total: ${calculate_total(cart_items):.2f}",
         font=("Segoe UI", 14, "bold"),
         anchor="center"
-    ).pack(pady=20)
+    )
+    total.pack(pady=20)
+
+    if cart_items and loader is not None:
+        estado = ttk.Label(frame, text="", font=("Segoe UI", 11), anchor="center")
+        boton = ttk.Button(frame, text="Confirmar pedido", bootstyle="success")
+
+        def al_terminar(resultado):
+            boton.configure(state="normal")
+            if resultado["pedido_id"]:
+                estado.configure(text=f"✅ Pedido {resultado['pedido_id']} registrado", bootstyle="success")
+                # El carrito ya se convirtió en pedido: vaciar la lista y el total
+                # y dejar el botón inactivo para no confirmarlo dos veces
+                cart_items.clear()
+                lista.set_datos(cart_items)
+                total.configure(text=f"Total: ${calculate_total(cart_items):.2f}")
+                boton.configure(state="disabled")
+                return
+            motivos = ", ".join(f"{f['material_id']} ({f['motivo']})" for f in resultado["fallas"][:5])
+            estado.configure(text=f"❌ {len(resultado['fallas'])} líneas con fallas: {motivos}", bootstyle="danger")
+
+        def al_fallar(error):
+            boton.configure(state="normal")
+            estado.configure(text=f"❌ {error}", bootstyle="danger")
+
+        def confirmar():
+            # La transacción corre en el hilo de trabajo; la ventana sigue respondiendo
+            boton.configure(state="disabled")
+            estado.configure(text="Registrando pedido…", bootstyle="secondary")
+            loader.cargar(checkout, list(cart_items), user_id,
+                          al_terminar=al_terminar, al_fallar=al_fallar, clave="checkout")
+
+        boton.configure(command=confirmar)
+        boton.pack()
+        estado.pack(pady=10)
+
+    return frame
@@ -0,0 +1,132 @@
+# frontend/gui/chart_reduction.py
+#
+# Reducción de datos antes de construir figuras de Plotly: cada punto enviado
+# al navegador viaja en el JSON de la figura, así que las series largas se
+# submuestrean conservando su forma y los scatters grandes pasan a WebGL.
+
+import time
+import numpy as np
+import plotly.graph_objects as go
+import streamlit as st
+from backend.services.profiler import MODOS
+from config import settings
+
+
+def _a_numerico(x):
+    """Convierte fechas a enteros para poder medir distancias en el eje X."""
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[ns]").astype(np.int64).astype(float)
+    return x.astype(float)
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: elige n_out índices que preservan la forma
+    visual de la serie (picos incluidos). Siempre conserva el primer y último punto.
+    """
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1])
+
+    x = _a_numerico(x)
+    y = np.asarray(y, dtype=float)
+    bordes = np.linspace(1, n - 1, n_out - 1).astype(int)
+    indices = np.empty(n_out, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+
+    anterior = 0
+    for i in range(n_out - 2):
+        inicio, fin = bordes[i], bordes[i + 1]
+        # Promedio del siguiente bucket como tercer vértice del triángulo
+        sig_inicio, sig_fin = fin, bordes[i + 2] if i + 2 < len(bordes) else n
+        x_prom = x[sig_inicio:sig_fin].mean()
+        y_prom = y[sig_inicio:sig_fin].mean()
+
+        areas = np.abs(
+            (x[anterior] - x_prom) * (y[inicio:fin] - y[anterior])
+            - (x[anterior] - x[inicio:fin]) * (y_prom - y[anterior])
+        )
+        anterior = inicio + int(np.argmax(areas))
+        indices[i + 1] = anterior
+    return indices
+
+
+def minmax_indices(y, n_buckets):
+    """Conserva el mínimo y el máximo de cada bucket (útil para series muy ruidosas)."""
+    n = len(y)
+    if 2 * n_buckets >= n:
+        return np.arange(n)
+    y = np.asarray(y, dtype=float)
+    bordes = np.linspace(0, n, n_buckets + 1).astype(int)
+    indices = []
+    for inicio, fin in zip(bordes[:-1], bordes[1:]):
+        tramo = y[inicio:fin]
+        indices.extend(sorted({inicio + int(np.argmin(tramo)), inicio + int(np.argmax(tramo))}))
+    return np.array(indices)
+
+
+def reducir_linea(x, y, max_puntos=None, metodo="lttb"):
+    """Devuelve (x, y) reducidos a lo sumo a max_puntos, con y en float32."""
+    max_puntos = max_puntos or settings.CHART_MAX_LINE_POINTS
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+
+    # Los NaN (p. ej. el arranque de una media móvil) no se dibujan: se descartan antes
+    validos = np.isfinite(y)
+    x, y = x[validos], y[validos]
+
+    if metodo == "minmax":
+        idx = minmax_indices(y, max_puntos // 2)
+    else:
+        idx = lttb_indices(x, y, max_puntos)
+    return x[idx], y[idx].astype(np.float32)
+
+
+def scatter_adaptativo(x, y, umbral=None, **kwargs):
+    """
+    Traza de dispersión que cambia a Scattergl (WebGL) cuando hay muchos puntos
+    y codifica los valores como float32 para reducir el payload.
+    """
+    umbral = umbral or settings.CHART_SCATTERGL_THRESHOLD
+    x = np.asarray(x)
+    if not np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype(np.float32)
+    y = np.asarray(y, dtype=np.float32)
+    traza = go.Scattergl if len(y) > umbral else go.Scatter
+    return traza(x=x, y=y, **kwargs)
+
+
+def linea_reducida(x, y, max_puntos=None, metodo="lttb", **kwargs):
+    """go.Scatter en modo línea con la serie ya reducida."""
+    x_red, y_red = reducir_linea(x, y, max_puntos, metodo)
+    kwargs.setdefault("mode", "lines")
+    return go.Scatter(x=x_red, y=y_red, **kwargs)
+
+
+def medir_figura(fig):
+    """Tamaño del JSON que se enviará al navegador y tiempo en serializarlo."""
+    inicio = time.perf_counter()
+    payload = fig.to_json()
+    return {
+        "bytes": len(payload.encode("utf-8")),
+        "puntos": sum(len(t.y) for t in fig.data if getattr(t, "y", None) is not None),
+        "ms": (time.perf_counter() - inicio) * 1000,
+    }
+
+
+def caption_payload(fig):
+    """
+    Muestra bajo la figura su peso y tiempo de serialización, sólo con el modo
+    de perfilado activo (el que main.py validó a partir de ?perfil=... o
+    ⚡ Rendimiento): medir vuelve a serializar la figura completa.
+    """
+    if st.session_state.get("modo_perfil") not in MODOS:
+        return
+    medida = medir_figura(fig)
+    st.caption(
+        f"📦 {medida['bytes'] / 1024:,.1f} KB · {medida['puntos']:,} puntos · "
+        f"⏱️ {medida['ms']:.1f} ms de serialización"
+    )
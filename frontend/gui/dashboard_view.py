@@ -1,10 +1,83 @@
 # frontend/gui/dashboard_view.py
 
-from frontend.gui.product_window import build_product_frame
+import ttkbootstrap as ttk
+from backend.controllers.cart_controller import add_to_cart
+from backend.controllers.material_controller import get_catalogo_filas
 from frontend.gui.admin_view import build_admin_frame
+from frontend.gui.async_loader import AsyncLoader
+from frontend.gui.cart_view import build_cart_frame
+from frontend.gui.virtual_treeview import VirtualTreeview
 
-def build_dashboard(root, user):
+COLUMNAS = [("Clave", 110), ("Descripción", 380), ("Existencia", 90), ("Costo", 90)]
+
+
+def _valores(fila):
+    _id, clave, descripcion, existencia, costo = fila
+    return (clave or "", descripcion or "", existencia, f"${costo:.2f}")
+
+
+def _filtrar(filas, texto):
+    texto = texto.strip().lower()
+    if not texto:
+        return filas
+    return [f for f in filas if texto in (f[2] or "").lower() or texto in (f[1] or "").lower()]
+
+
+def build_catalogo_frame(root, user, loader):
+    """Catálogo completo en una lista virtual; la carga y el filtrado van en segundo plano."""
+    frame = ttk.Frame(root, padding=20)
+    frame.pack(fill="both", expand=True)
+    carrito, catalogo = [], []
+
+    ttk.Label(frame, text="🧱 Catálogo de Materiales", font=("Segoe UI", 18, "bold")).pack(anchor="w")
+    barra = ttk.Frame(frame)
+    barra.pack(fill="x", pady=10)
+    busqueda = ttk.Entry(barra, width=40)
+    busqueda.pack(side="left")
+    estado = ttk.Label(barra, text="Cargando catálogo…", font=("Segoe UI", 11))
+    estado.pack(side="left", padx=10)
+
+    lista = VirtualTreeview(frame, COLUMNAS, valores=_valores)
+    lista.pack(fill="both", expand=True)
+
+    def mostrar(filas):
+        lista.set_datos(filas)
+        estado.configure(text=f"{len(filas):,} de {len(catalogo):,} materiales")
+
+    def al_cargar(filas):
+        catalogo[:] = filas
+        mostrar(filas)
+
+    def al_fallar(error):
+        estado.configure(text=f"❌ No se pudo cargar: {error}", bootstyle="danger")
+
+    def al_teclear(_evento=None):
+        # Sólo se muestra el filtrado del último texto tecleado
+        loader.cargar(_filtrar, catalogo, busqueda.get(), al_terminar=mostrar, clave="filtro")
+
+    def agregar():
+        fila = lista.fila_seleccionada()
+        if fila is None:
+            return
+        _id, clave, descripcion, existencia, costo = fila
+        add_to_cart(carrito, {"_id": _id, "name": descripcion or clave, "price": costo}, 1)
+        estado.configure(text=f"{descripcion or clave} agregado · {len(carrito)} líneas en el carrito")
+
+    def ver_carrito():
+        ventana = ttk.Toplevel(title="Carrito")
+        ventana.geometry("640x520")
+        build_cart_frame(ventana, carrito, loader=loader, user_id=user.get("correo"))
+
+    busqueda.bind("<KeyRelease>", al_teclear)
+    ttk.Button(barra, text="🛒 Ver carrito", command=ver_carrito).pack(side="right")
+    ttk.Button(barra, text="Agregar al carrito", bootstyle="success", command=agregar).pack(side="right", padx=5)
+
+    loader.cargar(get_catalogo_filas, al_terminar=al_cargar, al_fallar=al_fallar, clave="catalogo")
+    return frame
+
+
+def build_dashboard(root, user, loader=None):
     if user["role"] == "admin":
         build_admin_frame(root)
     else:
-        build_product_frame(root)
+        build_catalogo_frame(root, user, loader or AsyncLoader(root))
@@ -0,0 +1,115 @@
+import streamlit as st
+import pandas as pd
+from datetime import datetime, time as dt_time
+from backend.controllers.falla_controller import query_fallas_detalle
+from backend.controllers.lugar_controller import get_all_lugares
+from backend.services.falla_vista_service import get_ultimo_refresco
+
+
+PAGE_SIZES = [25, 50, 100]
+
+
+def _falla_row(falla):
+    """Aplana una falla (con sus referencias resueltas) para mostrarla en tabla."""
+    vehiculo = falla.get("vehiculo") or {}
+    reporta = falla.get("reporta") or falla.get("usuario_reporta") or {}
+    lugar = falla.get("lugar") or {}
+    fecha = falla.get("fecha")
+    return {
+        "Fecha": fecha.strftime("%d/%m/%Y") if isinstance(fecha, datetime) else fecha,
+        "Eco": vehiculo.get("eco", ""),
+        "Placas": vehiculo.get("placas", ""),
+        "Descripción": falla.get("descripcion", ""),
+        "Reporta": reporta.get("correo", ""),
+        "Lugar": lugar.get("nombre", falla.get("lugar_id", "")),
+        "Materiales": ", ".join(_linea_material(m) for m in falla.get("materiales_usados") or []),
+    }
+
+
+def _linea_material(linea):
+    material = linea.get("material") or {}
+    nombre = material.get("descripcion") or linea.get("nombre") or "Material eliminado"
+    existencia = f" · stock {material['existencia']}" if "existencia" in material else ""
+    return f"{nombre} ×{linea.get('cantidad', 0)}{existencia}"
+
+
+def _filtros_fallas():
+    """Controles de filtro; devuelve los argumentos para query_fallas_detalle."""
+    lugares = get_all_lugares() or []
+    opciones_lugar = {"Todos": None}
+    opciones_lugar.update({l.get("nombre", l["_id"]): l["_id"] for l in lugares})
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        lugar = st.selectbox("📍 Lugar", list(opciones_lugar.keys()))
+        correo = st.text_input("📧 Correo de quien reporta", placeholder="usuario@bonafont.com")
+    with col2:
+        eco = st.text_input("🚚 Número económico", placeholder="ECO123")
+        placas = st.text_input("🔖 Placas", placeholder="ABC123")
+    with col3:
+        rango = st.date_input("📅 Rango de fechas", value=())
+        page_size = st.selectbox("Filas por página", PAGE_SIZES, index=1)
+
+    desde = hasta = None
+    if len(rango) == 2:
+        desde = datetime.combine(rango[0], dt_time.min)
+        hasta = datetime.combine(rango[1], dt_time.max)
+
+    return {
+        "lugar_id": opciones_lugar[lugar],
+        "eco": eco.strip() or None,
+        "placas": placas.strip() or None,
+        "correo": correo.strip() or None,
+        "desde": desde,
+        "hasta": hasta,
+        "limit": page_size,
+    }
+
+
+def build_falla_frame():
+    st.title("🛠️ Reporte de Fallas")
+    st.caption("Consulta por lugar, vehículo, reportante y fechas; se carga una página a la vez.")
+
+    filtros = _filtros_fallas()
+    refresco = get_ultimo_refresco().get("ultima_ejecucion")
+    materializada = st.toggle(
+        "⚡ Leer de la vista materializada",
+        disabled=refresco is None,
+        help=(
+            f"Último refresco: {refresco:%d/%m/%Y %H:%M} UTC" if refresco
+            else "Aún no se ha generado: python -m backend.services.falla_vista_service"
+        )
+    )
+
+    # Pila de cursores de las páginas visitadas; se reinicia al cambiar filtros
+    firma = repr(sorted(filtros.items()))
+    if st.session_state.get("fallas_firma") != firma:
+        st.session_state.fallas_firma = firma
+        st.session_state.fallas_cursores = [None]
+
+    cursores = st.session_state.fallas_cursores
+    pagina = query_fallas_detalle(cursor=cursores[-1], materializada=materializada, **filtros)
+
+    if not pagina["items"]:
+        st.info("💡 No hay fallas que coincidan con los filtros")
+    else:
+        st.write(f"**Página {len(cursores)}** — {len(pagina['items'])} fallas")
+        st.dataframe(
+            pd.DataFrame([_falla_row(f) for f in pagina["items"]]),
+            use_container_width=True,
+            hide_index=True
+        )
+
+    col_prev, col_next, _ = st.columns([1, 1, 3])
+    with col_prev:
+        if st.button("⬅️ Anterior", disabled=len(cursores) == 1, use_container_width=True):
+            cursores.pop()
+            st.rerun()
+    with col_next:
+        if st.button("Siguiente ➡️", disabled=pagina["next_cursor"] is None, use_container_width=True):
+            cursores.append(pagina["next_cursor"])
+            st.rerun()
+
+
+if __name__ == "__main__":
+    build_falla_frame()
@@ -0,0 +1,49 @@
+# frontend/gui/figure_cache.py
+#
+# Caché de figuras y métricas del dashboard compartida entre sesiones. Las
+# figuras se guardan como JSON de Plotly bajo la llave
+# (colección, versión de datos, tipo de gráfica, tema); una escritura en la
+# colección sube su versión (ver backend/services/data_version.py) y las
+# entradas anteriores dejan de usarse.
+
+import plotly.io as pio
+from backend.utils.cache import TTLCache
+from backend.services.data_version import get_version
+from config.env import COLLECTION_MATERIALES
+from config import settings
+
+TEMAS = {False: "plotly_white", True: "plotly_dark"}
+
+_figuras = TTLCache(maxsize=settings.FIGURE_CACHE_SIZE, ttl=settings.FIGURE_CACHE_TTL)
+_datos = TTLCache(maxsize=settings.FIGURE_CACHE_SIZE, ttl=settings.FIGURE_CACHE_TTL)
+
+
+def _descartar_versiones_previas(cache, coleccion, version, nombre):
+    cache.invalidate(lambda k: k[0] == coleccion and k[2] == nombre and k[1] != version)
+
+
+def datos_cacheados(nombre, calcular, coleccion=COLLECTION_MATERIALES):
+    """Resultado de calcular() para la versión actual de la colección."""
+    version = get_version(coleccion)
+    clave = (coleccion, version, nombre)
+    valor = _datos.get(clave)
+    if valor is None:
+        valor = calcular()
+        _descartar_versiones_previas(_datos, coleccion, version, nombre)
+        _datos.set(clave, valor)
+    return valor
+
+
+def figura_cacheada(tipo, tema, construir, coleccion=COLLECTION_MATERIALES):
+    """
+    Devuelve la figura `tipo` con la plantilla `tema`. construir(tema) sólo se
+    llama si no hay una versión serializada para los datos vigentes.
+    """
+    version = get_version(coleccion)
+    clave = (coleccion, version, tipo, tema)
+    payload = _figuras.get(clave)
+    if payload is None:
+        payload = construir(tema).to_json()
+        _descartar_versiones_previas(_figuras, coleccion, version, tipo)
+        _figuras.set(clave, payload)
+    return pio.from_json(payload)
@@ -2,14 +2,24 @@ import streamlit as st
 import pandas as pd
 import time
 from datetime import datetime
+from frontend.gui.utils import merge_conflict_prompt
+from frontend.gui.selectors import selector_remoto, olvidar_seleccion
 from backend.controllers.lugar_controller import (
     get_all_lugares,
+    get_lugar_by_id,
+    buscar_lugares,
     create_lugar,
     update_lugar,
     delete_lugar
 )
 
 
+CAMPOS_LUGAR = {
+    "nombre": "Nombre",
+    "ubicacion": "Ubicación",
+    "tipo": "Tipo",
+    "descripcion": "Descripción",
+}
 
 def apply_modern_styles():
     st.markdown("""
@@ -214,7 +224,12 @@ def validate_lugar_data(nombre, ubicacion, tipo, descripcion):
     return errors
 
 # COMPONENTES ESPECÍFICOS DE LUGARES
+def _etiqueta_lugar(lugar):
+    return f"{lugar.get('nombre', 'Sin nombre')} · {lugar.get('tipo', '')} · {lugar.get('ubicacion', '')}"
+
 def display_lugar_card(lugar):
+    # Contadores mantenidos por backend/services/inventario_service.py
+    inventario = lugar.get('inventario') or {}
     with st.container():
         col1, col2 = st.columns([3, 1])
         
@@ -235,6 +250,12 @@ def display_lugar_card(lugar):
                             <p style="margin: 0.25rem 0; color: #6B7280;">
                                 📝 <strong>Descripción:</strong> {lugar.get('descripcion', 'Sin descripción')}
                             </p>
+                            <p style="margin: 0.25rem 0; color: #6B7280;">
+                                📦 <strong>Inventario:</strong> {inventario.get('materiales', 0)} materiales ·
+                                {inventario.get('existencia', 0):,} unidades ·
+                                ${inventario.get('valor', 0):,.2f} ·
+                                ⚠️ {inventario.get('stock_bajo', 0)} con stock bajo
+                            </p>
                         </div>
                     </div>
                 </div>
@@ -308,159 +329,185 @@ def create_lugar_form():
                     st.error(f"❌ Error al crear el lugar: {str(e)}")
 
 def edit_lugar_form():
-    lugares = get_all_lugares()
-    
-    if not lugares:
-        modern_card("No hay lugares disponibles para editar.", "Sin lugares", "😔")
-        return
-    
     st.subheader("✏️ Editar Lugar Existente")
     
-    # Selector moderno
-    lugar_options = ["-- Selecciona un lugar --"] + [l.get('nombre', 'Sin nombre') for l in lugares]
-    selected_nombre = st.selectbox(
-        "🔍 Selecciona el lugar a editar",
-        lugar_options,
-        key="edit_selector"
+    # Selector con búsqueda en el servidor
+    lugar = selector_remoto(
+        "🔍 Busca el lugar a editar",
+        "edit_selector",
+        buscar_lugares,
+        get_lugar_by_id,
+        _etiqueta_lugar
     )
     
-    if selected_nombre != "-- Selecciona un lugar --":
-        lugar = next((l for l in lugares if l.get('nombre') == selected_nombre), None)
-        
-        if lugar:
-            with st.form("edit_lugar_form"):
-                modern_card(f"Editando: **{lugar.get('nombre')}**", "Lugar seleccionado", "🎯")
-                
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    nuevo_nombre = st.text_input(
-                        "🏷️ Nuevo nombre *",
-                        value=lugar.get('nombre', ''),
-                        placeholder="Nombre del lugar"
-                    )
-                    
-                    nueva_ubicacion = st.text_input(
-                        "📍 Nueva ubicación *",
-                        value=lugar.get('ubicacion', ''),
-                        placeholder="Ubicación física"
-                    )
-                
-                with col2:
-                    nuevo_tipo = st.selectbox(
-                        "🏢 Tipo de lugar *",
-                        ["Almacén", "Oficina", "Tienda", "Taller", "Depósito", "Showroom", "Otro"],
-                        index=0 if lugar.get('tipo') == "Almacén" else 
-                              1 if lugar.get('tipo') == "Oficina" else
-                              2 if lugar.get('tipo') == "Tienda" else
-                              3 if lugar.get('tipo') == "Taller" else
-                              4 if lugar.get('tipo') == "Depósito" else
-                              5 if lugar.get('tipo') == "Showroom" else 6,
-                        help="Selecciona el tipo de lugar"
-                    )
-                    
-                    if nuevo_tipo == "Otro":
-                        nuevo_tipo = st.text_input("Especifica el tipo", value=lugar.get('tipo', ''))
-                
-                nueva_descripcion = st.text_area(
-                    "📝 Nueva descripción",
-                    value=lugar.get('descripcion', ''),
-                    max_chars=500,
-                    placeholder="Describe el lugar..."
+    if lugar:
+        # Versión leída al abrir la edición, para detectar escrituras concurrentes
+        versiones = st.session_state.setdefault("edit_lugar_versions", {})
+        versiones.setdefault(lugar["_id"], lugar.get("version", 0))
+
+        with st.form("edit_lugar_form"):
+            modern_card(f"Editando: **{lugar.get('nombre')}**", "Lugar seleccionado", "🎯")
+            
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                nuevo_nombre = st.text_input(
+                    "🏷️ Nuevo nombre *",
+                    value=lugar.get('nombre', ''),
+                    placeholder="Nombre del lugar"
                 )
                 
-                if nueva_descripcion:
-                    st.caption(f"📊 Caracteres: {len(nueva_descripcion)}/500")
+                nueva_ubicacion = st.text_input(
+                    "📍 Nueva ubicación *",
+                    value=lugar.get('ubicacion', ''),
+                    placeholder="Ubicación física"
+                )
+            
+            with col2:
+                nuevo_tipo = st.selectbox(
+                    "🏢 Tipo de lugar *",
+                    ["Almacén", "Oficina", "Tienda", "Taller", "Depósito", "Showroom", "Otro"],
+                    index=0 if lugar.get('tipo') == "Almacén" else 
+                          1 if lugar.get('tipo') == "Oficina" else
+                          2 if lugar.get('tipo') == "Tienda" else
+                          3 if lugar.get('tipo') == "Taller" else
+                          4 if lugar.get('tipo') == "Depósito" else
+                          5 if lugar.get('tipo') == "Showroom" else 6,
+                    help="Selecciona el tipo de lugar"
+                )
                 
-                submitted = modern_button("Actualizar Lugar", "edit_submit", "primary", "🔄")
+                if nuevo_tipo == "Otro":
+                    nuevo_tipo = st.text_input("Especifica el tipo", value=lugar.get('tipo', ''))
+            
+            nueva_descripcion = st.text_area(
+                "📝 Nueva descripción",
+                value=lugar.get('descripcion', ''),
+                max_chars=500,
+                placeholder="Describe el lugar..."
+            )
+            
+            if nueva_descripcion:
+                st.caption(f"📊 Caracteres: {len(nueva_descripcion)}/500")
+            
+            submitted = modern_button("Actualizar Lugar", "edit_submit", "primary", "🔄")
+            
+            if submitted:
+                errors = validate_lugar_data(nuevo_nombre, nueva_ubicacion, nuevo_tipo, nueva_descripcion)
                 
-                if submitted:
-                    errors = validate_lugar_data(nuevo_nombre, nueva_ubicacion, nuevo_tipo, nueva_descripcion)
-                    
-                    if errors:
-                        for error in errors:
-                            st.error(error)
-                    else:
-                        try:
-                            with st.spinner("🔄 Actualizando lugar..."):
-                                time.sleep(1)
-                                datos_actualizados = {
-                                    "nombre": nuevo_nombre.strip(),
-                                    "ubicacion": nueva_ubicacion.strip(),
-                                    "tipo": nuevo_tipo.strip(),
-                                    "descripcion": nueva_descripcion.strip(),
-                                    "fecha_actualizacion": datetime.now().isoformat()
-                                }
-                                update_lugar(lugar["_id"], datos_actualizados)
-                            
+                if errors:
+                    for error in errors:
+                        st.error(error)
+                else:
+                    try:
+                        with st.spinner("🔄 Actualizando lugar..."):
+                            time.sleep(1)
+                            datos_actualizados = {
+                                "nombre": nuevo_nombre.strip(),
+                                "ubicacion": nueva_ubicacion.strip(),
+                                "tipo": nuevo_tipo.strip(),
+                                "descripcion": nueva_descripcion.strip(),
+                                "fecha_actualizacion": datetime.now().isoformat()
+                            }
+                            resultado = update_lugar(
+                                lugar["_id"], datos_actualizados,
+                                expected_version=versiones[lugar["_id"]]
+                            )
+                        
+                        if resultado["conflicto"]:
+                            st.session_state.lugar_conflicto = {
+                                "_id": lugar["_id"],
+                                "mios": datos_actualizados,
+                                "actual": resultado["documento"],
+                            }
+                        elif resultado["ok"]:
+                            versiones.pop(lugar["_id"], None)
+                            olvidar_seleccion("edit_selector")
                             show_animated_message("¡Lugar actualizado exitosamente!", "success")
-                            
-                        except Exception as e:
-                            st.error(f"❌ Error al actualizar: {str(e)}")
+                        else:
+                            st.error("❌ El lugar ya no existe")
+                        
+                    except Exception as e:
+                        st.error(f"❌ Error al actualizar: {str(e)}")
+
+        conflicto = st.session_state.get("lugar_conflicto")
+        if conflicto and conflicto["_id"] == lugar["_id"]:
+            accion, fusion = merge_conflict_prompt(
+                "merge_lugar", conflicto["mios"], conflicto["actual"], CAMPOS_LUGAR
+            )
+            if accion == "guardar":
+                resultado = update_lugar(
+                    lugar["_id"], fusion,
+                    expected_version=conflicto["actual"].get("version", 0)
+                )
+                if resultado["conflicto"]:
+                    conflicto["actual"] = resultado["documento"]
+                    st.warning("⚠️ El lugar volvió a cambiar; revisa los valores de nuevo")
+                elif resultado["ok"]:
+                    st.session_state.pop("lugar_conflicto")
+                    versiones.pop(lugar["_id"], None)
+                    olvidar_seleccion("edit_selector")
+                    show_animated_message("¡Cambios fusionados y guardados!", "success")
+            elif accion == "descartar":
+                st.session_state.pop("lugar_conflicto")
+                versiones[lugar["_id"]] = conflicto["actual"].get("version", 0)
+                show_animated_message("Se conservó la versión actual del lugar", "info")
 
 def delete_lugar_section():
-    lugares = get_all_lugares()
-    
-    if not lugares:
-        modern_card("No hay lugares disponibles para eliminar.", "Sin lugares", "😔")
-        return
-    
     st.subheader("🗑️ Eliminar Lugar")
     
-    lugar_options = ["-- Selecciona un lugar --"] + [l.get('nombre', 'Sin nombre') for l in lugares]
-    selected_nombre = st.selectbox(
-        "🔍 Selecciona el lugar a eliminar",
-        lugar_options,
-        key="delete_selector"
+    lugar = selector_remoto(
+        "🔍 Busca el lugar a eliminar",
+        "delete_selector",
+        buscar_lugares,
+        get_lugar_by_id,
+        _etiqueta_lugar
     )
     
-    if selected_nombre != "-- Selecciona un lugar --":
-        lugar = next((l for l in lugares if l.get('nombre') == selected_nombre), None)
-        
-        if lugar:
-            st.markdown("""
-                <div class="modern-card" style="border-left-color: var(--error);">
-                    <div style="display: flex; align-items: center; margin-bottom: 1rem;">
-                        <span style="font-size: 2rem; margin-right: 1rem;">⚠️</span>
-                        <h3 style="margin: 0; color: var(--error);">¡Atención! Acción irreversible</h3>
-                    </div>
-                    <p style="margin-bottom: 1rem; color: var(--dark);">
-                        Estás a punto de eliminar permanentemente este lugar. Esta acción no se puede deshacer.
-                    </p>
+    if lugar:
+        st.markdown("""
+            <div class="modern-card" style="border-left-color: var(--error);">
+                <div style="display: flex; align-items: center; margin-bottom: 1rem;">
+                    <span style="font-size: 2rem; margin-right: 1rem;">⚠️</span>
+                    <h3 style="margin: 0; color: var(--error);">¡Atención! Acción irreversible</h3>
                 </div>
-            """, unsafe_allow_html=True)
-            
-            # Mostrar información del lugar a eliminar
-            modern_card(
-                f"""
-                **🏠 Nombre:** {lugar.get('nombre', 'N/A')}  
-                **📍 Ubicación:** {lugar.get('ubicacion', 'N/A')}  
-                **🏷️ Tipo:** {lugar.get('tipo', 'N/A')}  
-                **📝 Descripción:** {lugar.get('descripcion', 'N/A')}
-                """,
-                "Lugar a eliminar",
-                "💔"
-            )
-            
-            # Confirmación en dos pasos
-            col1, col2, col3 = st.columns([1, 1, 2])
-            
-            with col1:
-                confirm_delete = modern_button("✅ Sí, eliminar", "confirm_delete", "danger", "🗑️")
-            
-            with col2:
-                cancel_delete = modern_button("❌ Cancelar", "cancel_delete", "primary", "↩️")
-            
-            if confirm_delete:
-                try:
-                    with st.spinner("🔄 Eliminando lugar..."):
-                        time.sleep(1)
-                        delete_lugar(lugar["_id"])
-                    
-                    show_animated_message("Lugar eliminado exitosamente", "success")
-                    
-                except Exception as e:
-                    st.error(f"❌ Error al eliminar: {str(e)}")
+                <p style="margin-bottom: 1rem; color: var(--dark);">
+                    Estás a punto de eliminar permanentemente este lugar. Esta acción no se puede deshacer.
+                </p>
+            </div>
+        """, unsafe_allow_html=True)
+        
+        # Mostrar información del lugar a eliminar
+        modern_card(
+            f"""
+            **🏠 Nombre:** {lugar.get('nombre', 'N/A')}  
+            **📍 Ubicación:** {lugar.get('ubicacion', 'N/A')}  
+            **🏷️ Tipo:** {lugar.get('tipo', 'N/A')}  
+            **📝 Descripción:** {lugar.get('descripcion', 'N/A')}
+            """,
+            "Lugar a eliminar",
+            "💔"
+        )
+        
+        # Confirmación en dos pasos
+        col1, col2, col3 = st.columns([1, 1, 2])
+        
+        with col1:
+            confirm_delete = modern_button("✅ Sí, eliminar", "confirm_delete", "danger", "🗑️")
+        
+        with col2:
+            cancel_delete = modern_button("❌ Cancelar", "cancel_delete", "primary", "↩️")
+        
+        if confirm_delete:
+            try:
+                with st.spinner("🔄 Eliminando lugar..."):
+                    time.sleep(1)
+                    delete_lugar(lugar["_id"])
+                    olvidar_seleccion("delete_selector")
+                
+                show_animated_message("Lugar eliminado exitosamente", "success")
+                
+            except Exception as e:
+                st.error(f"❌ Error al eliminar: {str(e)}")
 
 # VISTA PRINCIPAL 
 def build_lugar_frame():
@@ -489,6 +536,13 @@ def build_lugar_frame():
     with col2:
         tipos = len(set(l.get('tipo', '') for l in lugares))
         st.metric("🏷️ Tipos Diferentes", tipos)
+
+    inventarios = [l.get('inventario') or {} for l in lugares]
+    with col3:
+        st.metric("📦 Materiales", f"{sum(i.get('materiales', 0) for i in inventarios):,}")
+
+    with col4:
+        st.metric("💰 Valor en Stock", f"${sum(i.get('valor', 0) for i in inventarios):,.2f}")
     
     # Navegación con pestañas
     st.markdown("<br>", unsafe_allow_html=True)
@@ -2,6 +2,7 @@ import tkinter as tk
 from frontend.gui.theme_config import apply_theme
 from frontend.gui.auth_view import build_auth_frame
 from frontend.gui.dashboard_view import build_dashboard
+from frontend.gui.async_loader import AsyncLoader
 
 class MainWindow:
     def __init__(self):
@@ -10,6 +11,9 @@ class MainWindow:
         self.root.title("🛍️ FontTrack Store")
         self.root.geometry("1024x768")
         self.root.configure(bg="#1e1e2f")  # Fondo oscuro estilo FontTrack
+        # Las consultas a MongoDB corren fuera del hilo de Tk
+        self.loader = AsyncLoader(self.root)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
 
         self.show_auth_view()
 
@@ -19,12 +23,16 @@ class MainWindow:
 
     def on_login_success(self, user):
         self.clear_window()
-        build_dashboard(self.root, user)
+        build_dashboard(self.root, user, self.loader)
 
     def clear_window(self):
         for widget in self.root.winfo_children():
             widget.destroy()
 
+    def close(self):
+        self.loader.detener()
+        self.root.destroy()
+
     def run(self):
         self.root.mainloop()
 
@@ -4,11 +4,24 @@ import streamlit as st
 import pandas as pd
 import time
 from datetime import datetime
+from frontend.gui.utils import merge_conflict_prompt
+from frontend.gui.selectors import selector_remoto, olvidar_seleccion
+from backend.controllers.lugar_controller import get_all_lugares
 from backend.controllers.material_controller import (
     get_all_material as get_all_materials,
+    buscar_materiales,
+    buscar_materiales_facetado,
+    get_material_by_id,
+    get_material_por_clave,
+    get_materiales_por_clave,
+    transferir_stock,
+    get_movimientos_material,
     create_material,
     update_material,
-    delete_material
+    delete_material,
+    bulk_update_materiales,
+    bulk_patch_materiales,
+    filtro_catalogo
 )
 
 # CONFIGURACIÓN DE ESTILOS MODERNOS CON TOOLTIPS
@@ -163,6 +176,16 @@ def apply_material_styles():
     """, unsafe_allow_html=True)
 
 # COMPONENTES DE AYUDA Y TOOLTIPS
+CAMPOS_MATERIAL = {
+    "clave_material": "Clave",
+    "descripcion": "Descripción",
+    "generico": "Genérico",
+    "clasificacion": "Clasificación",
+    "existencia": "Existencia",
+    "costo_promedio": "Costo promedio",
+    "lugar_id": "ID del lugar",
+}
+
 def help_icon(tooltip_text, tooltip_id):
     """Icono de ayuda con tooltip"""
     st.markdown(f"""
@@ -254,10 +277,62 @@ def validate_material_data(clave_material, descripcion, existencia, costo_promed
     return errors
 
 # SECCIONES PRINCIPALES MEJORADAS
+ORDENES_CATALOGO = {
+    "Relevancia": "relevancia",
+    "Existencia ↓": "existencia_desc",
+    "Existencia ↑": "existencia_asc",
+    "Valor ↓": "valor_desc",
+    "Valor ↑": "valor_asc",
+    "Nombre A-Z": "nombre",
+}
+BANDAS_CATALOGO = {"agotado": "🚨 Agotado", "bajo": "⚠️ Bajo", "normal": "✅ Normal"}
+POR_PAGINA_CATALOGO = 50
+
+
+def _selector_faceta(etiqueta, key, faceta, nombres=None, truncado=False):
+    """
+    Selectbox de una faceta con su conteo; conserva la selección aunque ya no
+    tenga resultados. Con truncado los conteos son mínimos y se marcan "N+".
+    """
+    mas = "+" if truncado else ""
+    conteos = {f["valor"]: f["cantidad"] for f in faceta}
+    actual = st.session_state.get(key)
+    opciones = [None] + list(conteos)
+    if actual is not None and actual not in conteos:
+        opciones.append(actual)
+    nombres = nombres or {}
+    return st.selectbox(
+        etiqueta,
+        opciones,
+        format_func=lambda v: "Todas" if v is None else f"{nombres.get(v, v)} ({conteos.get(v, 0)}{mas})",
+        key=key
+    )
+
+
 def show_material_list():
-    materials = get_all_materials()
-    
-    if not materials:
+    # Los filtros se leen del estado antes de dibujarlos: sus opciones salen de la misma consulta
+    estado = st.session_state
+    filtros = {
+        "texto": estado.get("catalogo_texto") or None,
+        "clasificacion": estado.get("catalogo_clasificacion"),
+        "generico": estado.get("catalogo_generico"),
+        "lugar_id": estado.get("catalogo_lugar"),
+        "banda": estado.get("catalogo_banda"),
+        "orden": ORDENES_CATALOGO[estado.get("catalogo_orden", "Relevancia")],
+    }
+    firma = repr(sorted(filtros.items()))
+    if estado.get("catalogo_firma") != firma:
+        estado.catalogo_firma = firma
+        estado.catalogo_pagina = 1
+    pagina = estado.get("catalogo_pagina", 1)
+
+    resultado = buscar_materiales_facetado(pagina=pagina, limit=POR_PAGINA_CATALOGO, **filtros)
+    facetas = resultado["facetas"]
+    truncado = resultado["truncado"]
+    mas = "+" if truncado else ""
+    sin_filtros = not any(v for k, v in filtros.items() if k != "orden")
+
+    if resultado["total"] == 0 and sin_filtros:
         st.markdown("""
             <div class="material-card material-fade-in">
                 <div style="text-align: center; padding: 2rem;">
@@ -268,65 +343,59 @@ def show_material_list():
         """, unsafe_allow_html=True)
         return
     
-    # Estadísticas rápidas
-    total_materials = len(materials)
-    total_value = sum(m.get('existencia', 0) * m.get('costo_promedio', 0) for m in materials)
-    low_stock = sum(1 for m in materials if m.get('existencia', 0) <= 10 and m.get('existencia', 0) > 0)
-    out_of_stock = sum(1 for m in materials if m.get('existencia', 0) == 0)
-    
+    # Estadísticas rápidas (sobre todo el resultado filtrado, no sólo la página)
+    bandas = {f["valor"]: f["cantidad"] for f in facetas["banda"]}
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("📦 Total Materiales", total_materials)
+        st.metric("📦 Total Materiales", f"{resultado['total']}{mas}")
     with col2:
-        st.metric("💰 Valor Total", f"${total_value:,.2f}")
+        st.metric("💰 Valor Total", f"${resultado['valor_total']:,.2f}")
     with col3:
-        st.metric("⚠️ Stock Bajo", low_stock)
+        st.metric("⚠️ Stock Bajo", f"{bandas.get('bajo', 0)}{mas}")
     with col4:
-        st.metric("🚨 Sin Stock", out_of_stock)
+        st.metric("🚨 Sin Stock", f"{bandas.get('agotado', 0)}{mas}")
     
     # Filtros y búsqueda
     st.markdown("---")
-    col_search, col_filter, col_sort = st.columns([2, 2, 1])
+    col_search, col_sort = st.columns([3, 1])
     
     with col_search:
-        search_term = st.text_input("🔍 Buscar materiales...", placeholder="Por descripción o clave")
-    
-    with col_filter:
-        clasificaciones = ["Todas"] + list(set(m.get('clasificacion', '') for m in materials if m.get('clasificacion')))
-        filter_class = st.selectbox("🏷️ Filtrar por clasificación", clasificaciones)
+        st.text_input("🔍 Buscar materiales...", placeholder="Por descripción o clave; tolera errores de escritura", key="catalogo_texto")
     
     with col_sort:
-        sort_option = st.selectbox("📊 Ordenar por", ["Existencia ↓", "Existencia ↑", "Valor ↓", "Valor ↑", "Nombre A-Z"])
-    
-    # Aplicar filtros
-    filtered_materials = materials
-    if search_term:
-        filtered_materials = [m for m in filtered_materials 
-                            if search_term.lower() in m.get('descripcion', '').lower() 
-                            or search_term.lower() in m.get('clave_material', '').lower()]
-    
-    if filter_class != "Todas":
-        filtered_materials = [m for m in filtered_materials if m.get('clasificacion') == filter_class]
-    
-    # Aplicar ordenamiento
-    if sort_option == "Existencia ↓":
-        filtered_materials.sort(key=lambda x: x.get('existencia', 0), reverse=True)
-    elif sort_option == "Existencia ↑":
-        filtered_materials.sort(key=lambda x: x.get('existencia', 0))
-    elif sort_option == "Valor ↓":
-        filtered_materials.sort(key=lambda x: x.get('existencia', 0) * x.get('costo_promedio', 0), reverse=True)
-    elif sort_option == "Valor ↑":
-        filtered_materials.sort(key=lambda x: x.get('existencia', 0) * x.get('costo_promedio', 0))
-    elif sort_option == "Nombre A-Z":
-        filtered_materials.sort(key=lambda x: x.get('descripcion', '').lower())
-    
-    st.write(f"**Mostrando {len(filtered_materials)} de {total_materials} materiales**")
+        st.selectbox("📊 Ordenar por", list(ORDENES_CATALOGO), key="catalogo_orden")
+
+    col_clasif, col_generico, col_lugar, col_banda = st.columns(4)
+    with col_clasif:
+        _selector_faceta("🏷️ Clasificación", "catalogo_clasificacion", facetas["clasificacion"], truncado=truncado)
+    with col_generico:
+        _selector_faceta("🧩 Genérico", "catalogo_generico", facetas["generico"], truncado=truncado)
+    with col_lugar:
+        nombres_lugar = {l["_id"]: l.get("nombre", l["_id"]) for l in get_all_lugares() or []}
+        _selector_faceta("📍 Lugar", "catalogo_lugar", facetas["lugar_id"], nombres_lugar, truncado)
+    with col_banda:
+        _selector_faceta("📦 Existencia", "catalogo_banda", facetas["banda"], BANDAS_CATALOGO, truncado)
+
+    total_paginas = max(1, -(-resultado["total"] // POR_PAGINA_CATALOGO))
+    inicio = (pagina - 1) * POR_PAGINA_CATALOGO
+    st.write(
+        f"**Mostrando {inicio + 1 if resultado['items'] else 0}–{inicio + len(resultado['items'])} "
+        f"de {resultado['total']}{mas} materiales** (página {pagina} de {total_paginas})"
+    )
     
     # Mostrar materiales
-    for material in filtered_materials:
+    for material in resultado["items"]:
         modern_material_card(material)
 
+    col_prev, _, col_next = st.columns([1, 3, 1])
+    if col_prev.button("⬅️ Anterior", disabled=pagina <= 1, use_container_width=True, key="catalogo_prev"):
+        estado.catalogo_pagina = pagina - 1
+        st.rerun()
+    if col_next.button("Siguiente ➡️", disabled=pagina >= total_paginas, use_container_width=True, key="catalogo_next"):
+        estado.catalogo_pagina = pagina + 1
+        st.rerun()
+
 def create_material_section():
     st.subheader("➕ Crear Nuevo Material")
     
@@ -467,297 +536,573 @@ def edit_material_section():
         st.session_state.refrescar_edicion = False
         st.stop()
 
-    materials = get_all_materials()
-
-    if not materials:
-        st.markdown("""
-            <div class="material-card material-fade-in">
-                <div style="text-align: center; padding: 2rem;">
-                    <h3 style="color: #6B7280;">📭 No hay materiales para editar</h3>
-                    <p>Primero crea algunos materiales en la pestaña "Crear Nuevo"</p>
+    modo = st.radio(
+        "Modo de edición",
+        ["Individual", "Masiva"],
+        horizontal=True,
+        key="edit_material_mode"
+    )
+    if modo == "Masiva":
+        materials = get_all_materials()
+        if not materials:
+            st.markdown("""
+                <div class="material-card material-fade-in">
+                    <div style="text-align: center; padding: 2rem;">
+                        <h3 style="color: #6B7280;">📭 No hay materiales para editar</h3>
+                        <p>Primero crea algunos materiales en la pestaña "Crear Nuevo"</p>
+                    </div>
                 </div>
-            </div>
-        """, unsafe_allow_html=True)
+            """, unsafe_allow_html=True)
+            return
+        bulk_edit_material_section(materials)
         return
 
     st.markdown("### 🔍 Seleccionar Material a Editar")
-    material_options = ["-- Selecciona un material --"] + [
-        m.get('descripcion', 'Sin descripción') for m in materials
-    ]
-
-    selected_desc = st.selectbox(
-        "Material a editar",
-        material_options,
-        key="edit_material_selector"
+    material = selector_remoto(
+        "Material a editar (clave o descripción)",
+        "edit_material_selector",
+        buscar_materiales,
+        get_material_by_id,
+        _etiqueta_material
     )
 
-    if selected_desc != "-- Selecciona un material --":
-        material = next((m for m in materials if m.get('descripcion') == selected_desc), None)
-
-        if material:
-            st.markdown("### 📋 Información Actual del Material")
-            modern_material_card(material)
-
-            st.markdown("---")
-            st.markdown("### ✨ Editar Información")
-
-            with st.form("edit_material_form"):
-                st.markdown('<div class="material-form">', unsafe_allow_html=True)
-                col1, col2 = st.columns(2)
-
-                with col1:
-                    material_tooltip("Clave del material", "Identificador único.")
-                    nueva_clave = st.text_input("Clave del material", value=material.get('clave_material', ''), label_visibility="collapsed")
-
-                    material_tooltip("Descripción del material", "Nombre descriptivo.")
-                    nueva_descripcion = st.text_input("Descripción del material", value=material.get('descripcion', ''), label_visibility="collapsed")
-
-                    material_tooltip("Clasificación", "Categoría del material.")
-                    clasificacion_actual = material.get('clasificacion', '')
-                    opciones_clasificacion = ["Herramientas", "Electricidad", "Fontanería", "Construcción", "Oficina", "Limpieza", "Otro"]
-                    index_actual = opciones_clasificacion.index(clasificacion_actual) if clasificacion_actual in opciones_clasificacion else 0
-                    nueva_clasificacion = st.selectbox("Clasificación", options=opciones_clasificacion, index=index_actual, label_visibility="collapsed")
-
-                    if nueva_clasificacion == "Otro" and clasificacion_actual not in opciones_clasificacion:
-                        nueva_clasificacion = st.text_input("Especifica clasificación", value=clasificacion_actual)
-
-                with col2:
-                    material_tooltip("Genérico", "Tipo genérico del material.")
-                    nuevo_generico = st.text_input("Genérico", value=material.get('generico', ''), label_visibility="collapsed")
-
-                    material_tooltip("Existencia en stock", "Cantidad disponible.")
-                    nueva_existencia = st.number_input("Existencia", min_value=0, step=1, value=int(material.get('existencia', 0)), label_visibility="collapsed")
-
-                    material_tooltip("Costo promedio unitario", "Costo por unidad.")
-                    nuevo_costo = st.number_input("Costo promedio", min_value=0.0, step=0.01, value=float(material.get('costo_promedio', 0.0)), format="%.2f", label_visibility="collapsed")
-
-                    material_tooltip("ID del lugar de almacenamiento", "Identificador del lugar.")
-                    nuevo_lugar = st.text_input("ID del lugar", value=material.get('lugar_id', ''), label_visibility="collapsed")
-
-                st.markdown('</div>', unsafe_allow_html=True)
-
-                col_submit, col_reset, col_help = st.columns([1, 1, 2])
-                submitted = col_submit.form_submit_button("🔄 Actualizar Material", use_container_width=True)
-                reset_clicked = col_reset.form_submit_button("↩️ Restablecer", use_container_width=True)
-                col_help.caption("💡 Modifica solo los campos necesarios")
-
-            if reset_clicked:
-                st.session_state.refrescar_edicion = True
-                st.stop()
-
-            if submitted:
-                errors = validate_material_data(nueva_clave, nueva_descripcion, nueva_existencia, nuevo_costo)
-
-                if errors:
-                    for error in errors:
-                        st.error(error)
-                else:
-                    try:
-                        with st.spinner("🔄 Actualizando material..."):
-                            time.sleep(1)
-                            datos_actualizados = {
-                                "clave_material": nueva_clave.strip(),
-                                "descripcion": nueva_descripcion.strip(),
-                                "generico": nuevo_generico.strip(),
-                                "clasificacion": nueva_clasificacion.strip(),
-                                "existencia": nueva_existencia,
-                                "costo_promedio": round(nuevo_costo, 2),
-                                "lugar_id": nuevo_lugar.strip(),
-                                "fecha_actualizacion": datetime.now().isoformat(),
-                            }
-                            update_material(material["_id"], datos_actualizados)
+    if material:
+        # Versión con la que el usuario empezó a editar (compare-and-set al guardar)
+        versiones = st.session_state.setdefault("edit_material_versions", {})
+        versiones.setdefault(material["_id"], material.get("version", 0))
+
+        st.markdown("### 📋 Información Actual del Material")
+        modern_material_card(material)
+
+        st.markdown("---")
+        st.markdown("### ✨ Editar Información")
+
+        with st.form("edit_material_form"):
+            st.markdown('<div class="material-form">', unsafe_allow_html=True)
+            col1, col2 = st.columns(2)
+
+            with col1:
+                material_tooltip("Clave del material", "Identificador único.")
+                nueva_clave = st.text_input("Clave del material", value=material.get('clave_material', ''), label_visibility="collapsed")
+
+                material_tooltip("Descripción del material", "Nombre descriptivo.")
+                nueva_descripcion = st.text_input("Descripción del material", value=material.get('descripcion', ''), label_visibility="collapsed")
+
+                material_tooltip("Clasificación", "Categoría del material.")
+                clasificacion_actual = material.get('clasificacion', '')
+                opciones_clasificacion = ["Herramientas", "Electricidad", "Fontanería", "Construcción", "Oficina", "Limpieza", "Otro"]
+                index_actual = opciones_clasificacion.index(clasificacion_actual) if clasificacion_actual in opciones_clasificacion else 0
+                nueva_clasificacion = st.selectbox("Clasificación", options=opciones_clasificacion, index=index_actual, label_visibility="collapsed")
 
+                if nueva_clasificacion == "Otro" and clasificacion_actual not in opciones_clasificacion:
+                    nueva_clasificacion = st.text_input("Especifica clasificación", value=clasificacion_actual)
+
+            with col2:
+                material_tooltip("Genérico", "Tipo genérico del material.")
+                nuevo_generico = st.text_input("Genérico", value=material.get('generico', ''), label_visibility="collapsed")
+
+                material_tooltip("Existencia en stock", "Cantidad disponible.")
+                nueva_existencia = st.number_input("Existencia", min_value=0, step=1, value=int(material.get('existencia', 0)), label_visibility="collapsed")
+
+                material_tooltip("Costo promedio unitario", "Costo por unidad.")
+                nuevo_costo = st.number_input("Costo promedio", min_value=0.0, step=0.01, value=float(material.get('costo_promedio', 0.0)), format="%.2f", label_visibility="collapsed")
+
+                material_tooltip("ID del lugar de almacenamiento", "Identificador del lugar.")
+                nuevo_lugar = st.text_input("ID del lugar", value=material.get('lugar_id', ''), label_visibility="collapsed")
+
+            st.markdown('</div>', unsafe_allow_html=True)
+
+            col_submit, col_reset, col_help = st.columns([1, 1, 2])
+            submitted = col_submit.form_submit_button("🔄 Actualizar Material", use_container_width=True)
+            reset_clicked = col_reset.form_submit_button("↩️ Restablecer", use_container_width=True)
+            col_help.caption("💡 Modifica solo los campos necesarios")
+
+        if reset_clicked:
+            versiones.pop(material["_id"], None)
+            olvidar_seleccion("edit_material_selector")
+            st.session_state.pop("material_conflicto", None)
+            st.session_state.refrescar_edicion = True
+            st.stop()
+
+        if submitted:
+            errors = validate_material_data(nueva_clave, nueva_descripcion, nueva_existencia, nuevo_costo)
+
+            if errors:
+                for error in errors:
+                    st.error(error)
+            else:
+                try:
+                    with st.spinner("🔄 Actualizando material..."):
+                        time.sleep(1)
+                        datos_actualizados = {
+                            "clave_material": nueva_clave.strip(),
+                            "descripcion": nueva_descripcion.strip(),
+                            "generico": nuevo_generico.strip(),
+                            "clasificacion": nueva_clasificacion.strip(),
+                            "existencia": nueva_existencia,
+                            "costo_promedio": round(nuevo_costo, 2),
+                            "lugar_id": nuevo_lugar.strip(),
+                            "fecha_actualizacion": datetime.now().isoformat(),
+                        }
+                        resultado = update_material(
+                            material["_id"], datos_actualizados,
+                            expected_version=versiones[material["_id"]]
+                        )
+
+                    if resultado["conflicto"]:
+                        st.session_state.material_conflicto = {
+                            "_id": material["_id"],
+                            "mios": datos_actualizados,
+                            "actual": resultado["documento"],
+                        }
+                    elif not resultado["ok"]:
+                        st.error("❌ El material ya no existe")
+                        return
+                    else:
+                        anterior = dict(material)
+                        _aplicar_guardado(material, resultado["documento"], versiones)
                         st.success("🎉 ¡Material actualizado exitosamente!")
-                        with st.expander("📊 Resumen de cambios", expanded=True):
-                            col_old, col_new = st.columns(2)
-                            with col_old:
-                                st.markdown("**Valores anteriores:**")
-                                st.write(f"**Clave:** {material.get('clave_material', 'N/A')}")
-                                st.write(f"**Descripción:** {material.get('descripcion', 'N/A')}")
-                                st.write(f"**Existencia:** {material.get('existencia', 0)}")
-                                st.write(f"**Costo:** ${material.get('costo_promedio', 0):.2f}")
-                            with col_new:
-                                st.markdown("**Nuevos valores:**")
-                                st.write(f"**Clave:** {nueva_clave}")
-                                st.write(f"**Descripción:** {nueva_descripcion}")
-                                st.write(f"**Existencia:** {nueva_existencia}")
-                                st.write(f"**Costo:** ${nuevo_costo:.2f}")
-
-                        time.sleep(2)
-                        st.session_state.refrescar_edicion = True
-                        st.stop()
-
-                    except Exception as e:
-                        st.error(f"❌ Error al actualizar material: {str(e)}")
+                        _resumen_cambios(anterior, material)
+
+                except Exception as e:
+                    st.error(f"❌ Error al actualizar material: {str(e)}")
+
+        conflicto = st.session_state.get("material_conflicto")
+        if conflicto and conflicto["_id"] == material["_id"]:
+            accion, fusion = merge_conflict_prompt(
+                "merge_material", conflicto["mios"], conflicto["actual"], CAMPOS_MATERIAL
+            )
+            if accion == "guardar":
+                resultado = update_material(
+                    material["_id"], fusion,
+                    expected_version=conflicto["actual"].get("version", 0)
+                )
+                if resultado["conflicto"]:
+                    conflicto["actual"] = resultado["documento"]
+                    st.warning("⚠️ El material volvió a cambiar; revisa los valores de nuevo")
+                elif resultado["ok"]:
+                    st.session_state.pop("material_conflicto")
+                    _aplicar_guardado(material, resultado["documento"], versiones)
+                    st.success("🎉 ¡Cambios fusionados y guardados!")
+            elif accion == "descartar":
+                st.session_state.pop("material_conflicto")
+                versiones[material["_id"]] = conflicto["actual"].get("version", 0)
+                st.info("💡 Se conservó la versión actual del material")
+
+
+def _etiqueta_material(material):
+    return f"{material.get('clave_material', 'S/C')} · {material.get('descripcion', 'Sin descripción')} ({material.get('existencia', 0)} u.)"
+
+
+def _aplicar_guardado(material, documento, versiones):
+    """Actualiza en memoria el material guardado en lugar de releer toda la colección."""
+    material.update(documento)
+    versiones[material["_id"]] = documento.get("version", 0)
+
+
+def _resumen_cambios(anterior, nuevo):
+    with st.expander("📊 Resumen de cambios", expanded=True):
+        col_old, col_new = st.columns(2)
+        for col, titulo, datos in ((col_old, "**Valores anteriores:**", anterior), (col_new, "**Nuevos valores:**", nuevo)):
+            with col:
+                st.markdown(titulo)
+                st.write(f"**Clave:** {datos.get('clave_material', 'N/A')}")
+                st.write(f"**Descripción:** {datos.get('descripcion', 'N/A')}")
+                st.write(f"**Existencia:** {datos.get('existencia', 0)}")
+                st.write(f"**Costo:** ${datos.get('costo_promedio', 0):.2f}")
+
+
+def bulk_edit_material_section(materials):
+    """
+    Edición masiva: por selección múltiple, o a todos los materiales que
+    cumplan un filtro (se envía el filtro, no la lista mostrada), en una sola operación
+    """
+    st.markdown("### 📚 Edición Masiva")
+
+    alcance = st.radio(
+        "Aplicar cambios a",
+        ["Materiales seleccionados", "Todos los que cumplan un filtro"],
+        horizontal=True,
+        key="bulk_material_scope"
+    )
+
+    seleccionados = []
+    filtro_objetivo = None
+    if alcance == "Materiales seleccionados":
+        etiquetas = {
+            f"{m.get('clave_material', 'N/A')} — {m.get('descripcion', 'Sin descripción')}": m
+            for m in materials
+        }
+        elegidos = st.multiselect("Materiales a editar", list(etiquetas.keys()), key="bulk_material_select")
+        seleccionados = [etiquetas[e] for e in elegidos]
+    else:
+        # Opciones y conteos de toda la colección (facetas), no de la lista acotada
+        seleccion = {
+            "clasificacion": st.session_state.get("bulk_material_class"),
+            "generico": st.session_state.get("bulk_material_generico"),
+            "lugar_id": st.session_state.get("bulk_material_lugar"),
+        }
+        resultado = buscar_materiales_facetado(limit=1, **seleccion)
+        facetas = resultado["facetas"]
+        col_clasif, col_generico, col_lugar = st.columns(3)
+        with col_clasif:
+            _selector_faceta("🏷️ Clasificación", "bulk_material_class", facetas["clasificacion"])
+        with col_generico:
+            _selector_faceta("🧩 Genérico", "bulk_material_generico", facetas["generico"])
+        with col_lugar:
+            nombres_lugar = {l["_id"]: l.get("nombre", l["_id"]) for l in get_all_lugares() or []}
+            _selector_faceta("📍 Lugar", "bulk_material_lugar", facetas["lugar_id"], nombres_lugar)
+        if not any(seleccion.values()):
+            st.info("💡 Elige al menos una clasificación, genérico o lugar")
+            return
+        filtro_objetivo = filtro_catalogo(**seleccion)
+        st.caption(f"Se modificarán {resultado['total']:,} materiales")
+
+    with st.form("bulk_edit_material_form"):
+        col1, col2 = st.columns(2)
+
+        with col1:
+            material_tooltip("Nuevo costo promedio", "Deja en 0 para conservar el costo actual.")
+            nuevo_costo = st.number_input("Nuevo costo", min_value=0.0, step=0.01, format="%.2f", label_visibility="collapsed")
+
+            material_tooltip("Nueva clasificación", "Deja vacío para conservar la clasificación actual.")
+            nueva_clasificacion = st.text_input("Nueva clasificación", label_visibility="collapsed")
+
+        with col2:
+            material_tooltip("Ajuste de existencia", "Cantidad a sumar (positiva) o restar (negativa).")
+            ajuste_existencia = st.number_input("Ajuste de existencia", step=1, value=0, label_visibility="collapsed")
+
+            material_tooltip("Nuevo ID del lugar", "Deja vacío para conservar el lugar actual.")
+            nuevo_lugar = st.text_input("Nuevo lugar", label_visibility="collapsed")
+
+        submitted = st.form_submit_button("🔄 Aplicar Edición Masiva", use_container_width=True)
+
+    if not submitted:
+        return
+
+    set_data = {}
+    if nuevo_costo > 0:
+        set_data["costo_promedio"] = round(nuevo_costo, 2)
+    if nueva_clasificacion.strip():
+        set_data["clasificacion"] = nueva_clasificacion.strip()
+    if nuevo_lugar.strip():
+        set_data["lugar_id"] = nuevo_lugar.strip()
+    inc_data = {"existencia": int(ajuste_existencia)} if ajuste_existencia else {}
+    # Evita dejar existencias negativas al restar
+    guarda = {"existencia": {"$gte": -int(ajuste_existencia)}} if ajuste_existencia < 0 else {}
+
+    if not set_data and not inc_data:
+        st.warning("⚠️ No hay cambios que aplicar")
+        return
+    set_data["fecha_actualizacion"] = datetime.now().isoformat()
+
+    try:
+        with st.spinner("🔄 Aplicando edición masiva..."):
+            if filtro_objetivo is not None:
+                resultado = bulk_update_materiales({**filtro_objetivo, **guarda}, set_data, inc_data)
+            elif seleccionados:
+                resultado = bulk_patch_materiales([
+                    {"_id": m["_id"], "set": set_data, "inc": inc_data, "filtro": guarda}
+                    for m in seleccionados
+                ])
+            else:
+                st.warning("⚠️ Selecciona al menos un material")
+                return
+
+        st.success(
+            f"🎉 Edición masiva aplicada: {resultado['matched']} encontrados, "
+            f"{resultado['modified']} modificados"
+        )
+    except Exception as e:
+        st.error(f"❌ Error en la edición masiva: {str(e)}")
+
 def delete_material_section():
     st.subheader("🗑️ Eliminar Material")
     
-    materials = get_all_materials()
-    
-    if not materials:
-        st.markdown("""
-            <div class="material-card material-fade-in">
-                <div style="text-align: center; padding: 2rem;">
-                    <h3 style="color: #6B7280;">📭 No hay materiales para eliminar</h3>
-                    <p>No hay materiales registrados en el sistema</p>
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
-        return
-
     # Selector de materiales
     st.markdown("### 🔍 Seleccionar Material a Eliminar")
-    material_options = ["-- Selecciona un material --"] + [m.get('descripcion', 'Sin descripción') for m in materials]
-    selected_desc = st.selectbox(
-        "Material a eliminar",
-        material_options,
-        key="delete_material_selector"
+    material = selector_remoto(
+        "Material a eliminar (clave o descripción)",
+        "delete_material_selector",
+        buscar_materiales,
+        get_material_by_id,
+        _etiqueta_material
     )
     
-    if selected_desc != "-- Selecciona un material --":
-        material = next((m for m in materials if m.get('descripcion') == selected_desc), None)
-        
-        if material:
-            # Tarjeta de advertencia con animación
-            st.markdown("""
-                <div class="material-card material-fade-in" style="border-left-color: var(--material-error); background: linear-gradient(135deg, #FEF2F2, #FFFFFF);">
-                    <div style="display: flex; align-items: center; margin-bottom: 1rem;">
-                        <span style="font-size: 2rem; margin-right: 1rem;">⚠️</span>
-                        <div>
-                            <h3 style="margin: 0; color: var(--material-error);">¡Atención! Acción Crítica</h3>
-                            <p style="margin: 0; color: #6B7280;">Esta acción no se puede deshacer</p>
-                        </div>
+    if material:
+        selected_desc = material.get('descripcion', 'Sin descripción')
+        # Tarjeta de advertencia con animación
+        st.markdown("""
+            <div class="material-card material-fade-in" style="border-left-color: var(--material-error); background: linear-gradient(135deg, #FEF2F2, #FFFFFF);">
+                <div style="display: flex; align-items: center; margin-bottom: 1rem;">
+                    <span style="font-size: 2rem; margin-right: 1rem;">⚠️</span>
+                    <div>
+                        <h3 style="margin: 0; color: var(--material-error);">¡Atención! Acción Crítica</h3>
+                        <p style="margin: 0; color: #6B7280;">Esta acción no se puede deshacer</p>
                     </div>
-                    <p style="margin: 0; color: var(--material-dark);">
-                        Estás a punto de eliminar permanentemente este material del sistema. 
-                        Todos los datos asociados se perderán irreversiblemente.
-                    </p>
                 </div>
-            """, unsafe_allow_html=True)
-            
-            st.markdown("### 📋 Material Seleccionado para Eliminación")
-            modern_material_card(material)
-            
-            # Mostrar impacto de la eliminación
-            existencia = material.get('existencia', 0)
-            costo_promedio = material.get('costo_promedio', 0)
-            valor_total = existencia * costo_promedio
-            
-            st.markdown("""
-                <div class="material-card" style="background: #FFFBEB; border-left-color: #F59E0B;">
-                    <h4 style="color: #92400E; margin-bottom: 1rem;">📊 Impacto de la Eliminación</h4>
-            """, unsafe_allow_html=True)
-            
-            col1, col2, col3 = st.columns(3)
-            
-            with col1:
-                st.metric("🔢 Existencia a Perder", existencia)
-            with col2:
-                st.metric("💰 Valor Inventario", f"${valor_total:,.2f}")
-            with col3:
-                st.metric("📅 Última Actualización", "Permanente")
-            
-            st.markdown("</div>", unsafe_allow_html=True)
-            
-            # Sistema de confirmación en dos pasos
-            st.markdown("### 🔒 Confirmación de Eliminación")
-            
-            st.warning("**Paso 1:** Marca la casilla para confirmar que entiendes las consecuencias")
-            confirm_understanding = st.checkbox(
-                "✅ Comprendo que esta acción es permanente e irreversible"
+                <p style="margin: 0; color: var(--material-dark);">
+                    Estás a punto de eliminar permanentemente este material del sistema. 
+                    Todos los datos asociados se perderán irreversiblemente.
+                </p>
+            </div>
+        """, unsafe_allow_html=True)
+        
+        st.markdown("### 📋 Material Seleccionado para Eliminación")
+        modern_material_card(material)
+        
+        # Mostrar impacto de la eliminación
+        existencia = material.get('existencia', 0)
+        costo_promedio = material.get('costo_promedio', 0)
+        valor_total = existencia * costo_promedio
+        
+        st.markdown("""
+            <div class="material-card" style="background: #FFFBEB; border-left-color: #F59E0B;">
+                <h4 style="color: #92400E; margin-bottom: 1rem;">📊 Impacto de la Eliminación</h4>
+        """, unsafe_allow_html=True)
+        
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            st.metric("🔢 Existencia a Perder", existencia)
+        with col2:
+            st.metric("💰 Valor Inventario", f"${valor_total:,.2f}")
+        with col3:
+            st.metric("📅 Última Actualización", "Permanente")
+        
+        st.markdown("</div>", unsafe_allow_html=True)
+        
+        # Sistema de confirmación en dos pasos
+        st.markdown("### 🔒 Confirmación de Eliminación")
+        
+        st.warning("**Paso 1:** Marca la casilla para confirmar que entiendes las consecuencias")
+        confirm_understanding = st.checkbox(
+            "✅ Comprendo que esta acción es permanente e irreversible"
+        )
+        
+        if existencia > 0:
+            st.error("**Paso 2:** Este material tiene existencias en inventario")
+            confirm_stock_loss = st.checkbox(
+                f"✅ Comprendo que se perderán {existencia} unidades valoradas en ${valor_total:,.2f}"
+            )
+            confirmation_required = confirm_understanding and confirm_stock_loss
+        else:
+            confirmation_required = confirm_understanding
+        
+        if confirmation_required:
+            st.error("**Paso 3:** Verificación final")
+            st.write(f"Escribe el nombre del material para confirmar: **{selected_desc}**")
+            confirm_name = st.text_input(
+                "Escribe el nombre exacto del material:",
+                placeholder="Copie y pegue el nombre mostrado arriba"
             )
             
-            if existencia > 0:
-                st.error("**Paso 2:** Este material tiene existencias en inventario")
-                confirm_stock_loss = st.checkbox(
-                    f"✅ Comprendo que se perderán {existencia} unidades valoradas en ${valor_total:,.2f}"
-                )
-                confirmation_required = confirm_understanding and confirm_stock_loss
-            else:
-                confirmation_required = confirm_understanding
-            
-            if confirmation_required:
-                st.error("**Paso 3:** Verificación final")
-                st.write(f"Escribe el nombre del material para confirmar: **{selected_desc}**")
-                confirm_name = st.text_input(
-                    "Escribe el nombre exacto del material:",
-                    placeholder="Copie y pegue el nombre mostrado arriba"
-                )
-                
-                final_confirmation = confirm_name.strip() == selected_desc
-            else:
-                final_confirmation = False
-            
-            # Botones de acción
-            st.markdown("---")
-            col_delete, col_cancel, col_spacer = st.columns([1, 1, 2])
-            
-            with col_delete:
-                delete_disabled = not (confirmation_required and final_confirmation)
-                delete_clicked = st.button(
-                    "🗑️ ELIMINAR DEFINITIVAMENTE",
-                    disabled=delete_disabled,
-                    use_container_width=True,
-                    type="primary"
-                )
-            
-            with col_cancel:
-                if st.button("❌ Cancelar Eliminación", use_container_width=True):
-                    st.success("✅ Eliminación cancelada")
-                    time.sleep(1)
-                    st.rerun()
-            
-            # Ejecutar eliminación si está confirmada
-            if delete_clicked and final_confirmation:
-                try:
-                    with st.spinner("🔄 Eliminando material..."):
-                        # Simular proceso de eliminación
-                        time.sleep(2)
-                        
-                        # Guardar información para el mensaje de confirmación
-                        material_info = {
-                            'nombre': selected_desc,
-                            'existencia': existencia,
-                            'valor': valor_total
-                        }
-                        
-                        # Ejecutar eliminación
-                        delete_material(material["_id"])
-                    
-                    # Mensaje de confirmación con detalles
-                    st.markdown("""
-                        <div style="text-align: center; padding: 2rem; background: linear-gradient(135deg, #D1FAE5, #A7F3D0); border-radius: 12px;">
-                            <h2 style="color: #065F46;">🎉 Material Eliminado Exitosamente</h2>
-                    """, unsafe_allow_html=True)
-                    
-                    col_success1, col_success2, col_success3 = st.columns(3)
-                    
-                    with col_success1:
-                        st.metric("📦 Material", selected_desc)
-                    with col_success2:
-                        st.metric("🔢 Existencia Eliminada", existencia)
-                    with col_success3:
-                        st.metric("💰 Valor Perdido", f"${valor_total:,.2f}")
-                    
-                    st.markdown("</div>", unsafe_allow_html=True)
-                    
-                    # Recomendación
-                    st.info("""
-                        **💡 Recomendación:** Considera realizar un backup regular de tu inventario 
-                        para prevenir pérdidas accidentales de información importante.
-                    """)
+            final_confirmation = confirm_name.strip() == selected_desc
+        else:
+            final_confirmation = False
+        
+        # Botones de acción
+        st.markdown("---")
+        col_delete, col_cancel, col_spacer = st.columns([1, 1, 2])
+        
+        with col_delete:
+            delete_disabled = not (confirmation_required and final_confirmation)
+            delete_clicked = st.button(
+                "🗑️ ELIMINAR DEFINITIVAMENTE",
+                disabled=delete_disabled,
+                use_container_width=True,
+                type="primary"
+            )
+        
+        with col_cancel:
+            if st.button("❌ Cancelar Eliminación", use_container_width=True):
+                st.success("✅ Eliminación cancelada")
+                time.sleep(1)
+                st.rerun()
+        
+        # Ejecutar eliminación si está confirmada
+        if delete_clicked and final_confirmation:
+            try:
+                with st.spinner("🔄 Eliminando material..."):
+                    # Simular proceso de eliminación
+                    time.sleep(2)
                     
-                    time.sleep(3)
-                    st.rerun()
+                    # Guardar información para el mensaje de confirmación
+                    material_info = {
+                        'nombre': selected_desc,
+                        'existencia': existencia,
+                        'valor': valor_total
+                    }
                     
-                except Exception as e:
-                    st.error(f"❌ Error al eliminar el material: {str(e)}")
-                    st.info("""
-                        **🛠️ Solución:** 
-                        - Verifica que el material no esté siendo usado en transacciones activas
-                        - Revisa la conexión con la base de datos
-                        - Contacta al administrador del sistema si el problema persiste
-                    """)
+                    # Ejecutar eliminación
+                    delete_material(material["_id"])
+                    olvidar_seleccion("delete_material_selector")
+                
+                # Mensaje de confirmación con detalles
+                st.markdown("""
+                    <div style="text-align: center; padding: 2rem; background: linear-gradient(135deg, #D1FAE5, #A7F3D0); border-radius: 12px;">
+                        <h2 style="color: #065F46;">🎉 Material Eliminado Exitosamente</h2>
+                """, unsafe_allow_html=True)
+                
+                col_success1, col_success2, col_success3 = st.columns(3)
+                
+                with col_success1:
+                    st.metric("📦 Material", selected_desc)
+                with col_success2:
+                    st.metric("🔢 Existencia Eliminada", existencia)
+                with col_success3:
+                    st.metric("💰 Valor Perdido", f"${valor_total:,.2f}")
+                
+                st.markdown("</div>", unsafe_allow_html=True)
+                
+                # Recomendación
+                st.info("""
+                    **💡 Recomendación:** Considera realizar un backup regular de tu inventario 
+                    para prevenir pérdidas accidentales de información importante.
+                """)
+                
+                time.sleep(3)
+                st.rerun()
+                
+            except Exception as e:
+                st.error(f"❌ Error al eliminar el material: {str(e)}")
+                st.info("""
+                    **🛠️ Solución:** 
+                    - Verifica que el material no esté siendo usado en transacciones activas
+                    - Revisa la conexión con la base de datos
+                    - Contacta al administrador del sistema si el problema persiste
+                """)
+
+def scan_material_section():
+    """Búsqueda por clave exacta pensada para lectores de código: cada lectura termina en Enter"""
+    st.subheader("📷 Escanear Material")
+
+    with st.form("form_escaneo", clear_on_submit=True):
+        clave = st.text_input("Clave del material", placeholder="Escanea o escribe la clave y presiona Enter")
+        escaneado = st.form_submit_button("🔎 Buscar", use_container_width=True)
+
+    historial = st.session_state.setdefault("escaneos", [])
+    if escaneado and clave.strip():
+        material = get_material_por_clave(clave)
+        historial.insert(0, {"clave": clave.strip(), "material": material})
+        del historial[20:]
+
+    if historial:
+        ultimo = historial[0]
+        if ultimo["material"]:
+            modern_material_card(ultimo["material"])
+        else:
+            st.warning(f"⚠️ No existe ningún material con la clave {ultimo['clave']}")
+
+    with st.expander("📦 Lote de claves"):
+        texto = st.text_area("Una clave por línea", height=150, key="lote_claves")
+        if st.button("Resolver lote", use_container_width=True) and texto.strip():
+            resultado = get_materiales_por_clave(texto.splitlines())
+            filas = [
+                {
+                    "Clave": c,
+                    "Descripción": m.get("descripcion") if m else "❌ No encontrada",
+                    "Existencia": m.get("existencia") if m else None,
+                }
+                for c, m in resultado.items()
+            ]
+            encontrados = sum(1 for m in resultado.values() if m)
+            st.write(f"**{encontrados} de {len(resultado)} claves encontradas**")
+            st.dataframe(pd.DataFrame(filas), use_container_width=True, hide_index=True)
+
+    if len(historial) > 1:
+        st.markdown("#### 🕒 Lecturas recientes")
+        st.dataframe(pd.DataFrame([
+            {
+                "Clave": h["clave"],
+                "Descripción": h["material"].get("descripcion") if h["material"] else "❌ No encontrada",
+                "Existencia": h["material"].get("existencia") if h["material"] else None,
+            }
+            for h in historial
+        ]), use_container_width=True, hide_index=True)
+
+
+def transfer_material_section():
+    """Mueve existencia entre lugares; varias líneas se aplican juntas en una transacción"""
+    st.subheader("🔁 Transferir entre Lugares")
+
+    lugares = get_all_lugares() or []
+    nombres = {l["_id"]: l.get("nombre", l["_id"]) for l in lugares}
+    lote = st.session_state.setdefault("lote_transferencias", [])
+
+    material = selector_remoto(
+        "🔍 Material de origen", "transfer_selector",
+        buscar_materiales, get_material_by_id, _etiqueta_material,
+        placeholder="Clave o descripción del material a mover"
+    )
+    if material:
+        origen = str(material.get("lugar_id") or "")
+        existencia = int(material.get("existencia") or 0)
+        st.caption(f"📍 Origen: {nombres.get(origen, origen or 'Sin lugar')} · 📦 Existencia: {existencia}")
+        destinos = [l for l in nombres if l != origen]
+        if not origen or not destinos or existencia <= 0:
+            st.info("💡 El material necesita un lugar de origen con existencia y al menos otro lugar de destino")
+        else:
+            with st.form("form_transferencia", clear_on_submit=True):
+                col_destino, col_cantidad = st.columns([2, 1])
+                destino = col_destino.selectbox("📍 Destino", destinos, format_func=nombres.get)
+                cantidad = col_cantidad.number_input("Cantidad", min_value=1, max_value=existencia, value=1, step=1)
+                nota = st.text_input("📝 Nota", placeholder="Opcional")
+                if st.form_submit_button("➕ Agregar al lote", use_container_width=True):
+                    lote.append({
+                        "clave_material": material["clave_material"],
+                        "origen": origen,
+                        "destino": destino,
+                        "cantidad": int(cantidad),
+                        "nota": nota.strip() or None,
+                    })
+
+    if lote:
+        st.markdown("#### 📋 Lote por aplicar")
+        st.dataframe(pd.DataFrame([
+            {
+                "Clave": t["clave_material"],
+                "Origen": nombres.get(t["origen"], t["origen"]),
+                "Destino": nombres.get(t["destino"], t["destino"]),
+                "Cantidad": t["cantidad"],
+                "Nota": t["nota"] or "",
+            }
+            for t in lote
+        ]), use_container_width=True, hide_index=True)
+
+        col_aplicar, col_limpiar = st.columns(2)
+        if col_limpiar.button("🗑️ Vaciar lote", use_container_width=True):
+            lote.clear()
+            st.rerun()
+        if col_aplicar.button("✅ Aplicar transferencias", type="primary", use_container_width=True):
+            try:
+                usuario = (st.session_state.get("user") or {}).get("correo")
+                resultado = transferir_stock(lote, usuario=usuario)
+            except ValueError as e:
+                # Incluye StockInsuficienteError: no se aplicó ninguna línea
+                st.error(f"❌ {e}")
+            else:
+                lote.clear()
+                olvidar_seleccion("transfer_selector")
+                st.success(f"🎉 {len(resultado['movimientos'])} transferencias aplicadas")
+                time.sleep(1)
+                st.rerun()
+
+    movimientos = get_movimientos_material(limit=20)
+    if movimientos:
+        st.markdown("#### 🕒 Movimientos recientes")
+        st.dataframe(pd.DataFrame([
+            {
+                "Fecha": m["fecha"].strftime("%d/%m/%Y %H:%M"),
+                "Clave": m["clave_material"],
+                "Origen": nombres.get(m["lugar_origen"], m["lugar_origen"]),
+                "Destino": nombres.get(m["lugar_destino"], m["lugar_destino"]),
+                "Cantidad": m["cantidad"],
+                "Usuario": m.get("usuario") or "",
+            }
+            for m in movimientos
+        ]), use_container_width=True, hide_index=True)
+
 
 # VISTA PRINCIPAL MODERNA
 def build_material_frame():
@@ -777,8 +1122,10 @@ def build_material_frame():
     # Navegación con pestañas
     st.markdown("<br>", unsafe_allow_html=True)
     
-    tab1, tab2, tab3, tab4 = st.tabs([
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
         "📋 Lista de Materiales", 
+        "📷 Escanear",
+        "🔁 Transferir",
         "➕ Crear Nuevo", 
         "✏️ Editar Existente", 
         "🗑️ Eliminar"
@@ -788,12 +1135,18 @@ def build_material_frame():
         show_material_list()
     
     with tab2:
+        scan_material_section()
+
+    with tab3:
+        transfer_material_section()
+
+    with tab4:
         create_material_section()
     
-    with tab3:
+    with tab5:
         edit_material_section()
 
-    with tab4:
+    with tab6:
         delete_material_section()
 
 if __name__ == "__main__":
@@ -0,0 +1,173 @@
+import streamlit as st
+import pandas as pd
+from datetime import datetime
+
+from backend.services.instrumentation import (
+    get_metricas, get_reruns, reiniciar, exportar_prometheus, exportar_json
+)
+from backend.services.query_log import leer_registro
+from backend.services.profiler import MODOS, get_perfiles
+from config import settings
+
+
+def mostrar_rendimiento():
+    """Pestaña ⚡ Rendimiento del panel de administración"""
+    st.markdown("### ⚡ Rendimiento por página")
+
+    # El modo se guarda fuera del widget para que siga activo al navegar a otras páginas
+    opciones = [None] + list(MODOS)
+    actual = st.session_state.get("perfilado")
+    st.session_state.perfilado = st.selectbox(
+        "🔬 Perfilar mis páginas",
+        opciones,
+        index=opciones.index(actual) if actual in opciones else 0,
+        format_func=lambda m: {None: "Desactivado", "cprofile": "cProfile", "muestreo": "Muestreo de pila"}[m],
+        help="También puede activarse con ?perfil=cprofile o ?perfil=muestreo en la URL"
+    )
+
+    reruns = get_reruns()
+    metricas = get_metricas()
+    if not reruns and not metricas:
+        st.info("💡 Aún no hay mediciones: navega por la aplicación y vuelve aquí")
+        return
+
+    # Resumen por página a partir de los últimos reruns
+    if reruns:
+        reruns_df = pd.DataFrame(reruns)
+        reruns_df["inicio"] = reruns_df["inicio"].map(lambda t: datetime.fromtimestamp(t).strftime("%H:%M:%S"))
+        por_pagina = reruns_df.groupby("pagina").agg(
+            reruns=("ms", "size"),
+            ms_promedio=("ms", "mean"),
+            ms_p95=("ms", lambda s: s.quantile(0.95)),
+            consultas_promedio=("consultas", "mean"),
+            ms_mongo_promedio=("ms_mongo", "mean"),
+            kb_promedio=("bytes", lambda s: s.mean() / 1024),
+        ).sort_values("ms_promedio", ascending=False)
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Reruns medidos", len(reruns_df))
+        col2.metric("Página más lenta", por_pagina.index[0], f"{por_pagina['ms_promedio'].iloc[0]:.0f} ms")
+        col3.metric("Consultas por rerun", f"{reruns_df['consultas'].mean():.1f}")
+
+        st.markdown("#### 📄 Por página")
+        st.dataframe(por_pagina.round(1), use_container_width=True)
+
+        st.markdown("#### 🕒 Últimos reruns")
+        st.dataframe(reruns_df.round(1), use_container_width=True, hide_index=True)
+
+    # Detalle por controlador y comando
+    if metricas:
+        st.markdown("#### 🔍 Llamadas acumuladas")
+        metricas_df = pd.DataFrame(metricas)
+        pagina = st.selectbox("Página", ["Todas"] + sorted(metricas_df["pagina"].unique()))
+        if pagina != "Todas":
+            metricas_df = metricas_df[metricas_df["pagina"] == pagina]
+        metricas_df["ms_total"] = metricas_df["segundos"] * 1000
+        metricas_df["ms_max"] = metricas_df["max_segundos"] * 1000
+        st.dataframe(
+            metricas_df[[
+                "pagina", "tipo", "nombre", "llamadas", "ms_total", "ms_promedio",
+                "ms_max", "documentos", "bytes", "errores"
+            ]].sort_values("ms_total", ascending=False).round(2),
+            use_container_width=True,
+            hide_index=True
+        )
+
+    mostrar_perfiles()
+
+    # Exportación para análisis fuera de línea
+    st.markdown("#### 📤 Exportar")
+    col_prom, col_json, col_reset = st.columns(3)
+    with col_prom:
+        st.download_button(
+            "Prometheus (.prom)", exportar_prometheus(),
+            file_name="fonttrack_metricas.prom", mime="text/plain", use_container_width=True
+        )
+    with col_json:
+        st.download_button(
+            "JSON", exportar_json(),
+            file_name="fonttrack_metricas.json", mime="application/json", use_container_width=True
+        )
+    with col_reset:
+        if st.button("🗑️ Reiniciar métricas", use_container_width=True):
+            reiniciar()
+            st.rerun()
+
+
+def mostrar_perfiles():
+    """Perfiles de página capturados con el modo de perfilado activo"""
+    perfiles = get_perfiles()
+    if not perfiles:
+        return
+
+    st.markdown("#### 🔬 Perfiles capturados")
+    indice = st.selectbox(
+        "Perfil",
+        range(len(perfiles)),
+        format_func=lambda i: (
+            f"{datetime.fromtimestamp(perfiles[i]['inicio']).strftime('%H:%M:%S')} · "
+            f"{perfiles[i]['pagina']} · {perfiles[i]['modo']} · {perfiles[i]['ms']:.0f} ms"
+        )
+    )
+    perfil = perfiles[indice]
+
+    col_funciones, col_controladores = st.columns([3, 2])
+    with col_funciones:
+        st.markdown("**Funciones de render y servicios**")
+        st.dataframe(pd.DataFrame(perfil["funciones"]).head(50).round(1), use_container_width=True, hide_index=True)
+    with col_controladores:
+        st.markdown("**Llamadas a controladores**")
+        if perfil.get("controladores"):
+            st.dataframe(pd.DataFrame(perfil["controladores"]).round(2), use_container_width=True, hide_index=True)
+        else:
+            st.caption("Sin llamadas a controladores")
+
+    if perfil["modo"] == "cprofile":
+        st.download_button(
+            "⬇️ Descargar .prof (snakeviz / gprof2dot)", perfil["descarga"],
+            file_name=f"perfil_{indice}.prof", mime="application/octet-stream"
+        )
+    else:
+        st.download_button(
+            "⬇️ Descargar pilas colapsadas (flamegraph / speedscope)", perfil["descarga"],
+            file_name=f"perfil_{indice}.folded", mime="text/plain"
+        )
+
+
+def mostrar_consultas_problematicas():
+    """Resumen del log de consultas duplicadas, lentas y COLLSCAN"""
+    st.markdown("### 🐢 Consultas problemáticas")
+    st.caption(
+        f"Umbral de lentitud: {settings.SLOW_QUERY_MS} ms · explain sobre el "
+        f"{settings.EXPLAIN_SAMPLE_RATE:.0%} de las consultas nuevas · log: {settings.QUERY_LOG_PATH}"
+    )
+
+    registros = leer_registro()
+    if not registros:
+        st.success("✅ No hay consultas problemáticas registradas")
+        return
+
+    df = pd.DataFrame(registros)
+    etiquetas = {"duplicada": "🔁 Duplicadas (N+1)", "lenta": "🐢 Lentas", "collscan": "📚 COLLSCAN"}
+    columnas = st.columns(len(etiquetas))
+    for col, (tipo, etiqueta) in zip(columnas, etiquetas.items()):
+        col.metric(etiqueta, int((df["tipo"] == tipo).sum()))
+
+    tipo = st.selectbox("Tipo", list(etiquetas), format_func=etiquetas.get)
+    df_tipo = df[df["tipo"] == tipo]
+    if df_tipo.empty:
+        st.info("💡 Sin registros de este tipo")
+        return
+
+    # Una fila por consulta y página, con la ocurrencia más reciente
+    agregados = {"veces": ("ts", "size"), "ultima": ("ts", "max"), "comando": ("comando", "first")}
+    if tipo == "duplicada":
+        agregados["max_repeticiones"] = ("repeticiones", "max")
+    elif tipo == "lenta":
+        agregados["ms_max"] = ("ms", "max")
+        agregados["ms_promedio"] = ("ms", "mean")
+    resumen = (
+        df_tipo.groupby(["pagina", "consulta", "firma"]).agg(**agregados)
+        .reset_index().sort_values("veces", ascending=False)
+    )
+    st.dataframe(resumen, use_container_width=True, hide_index=True)
@@ -1,15 +1,63 @@
+import uuid
 import streamlit as st
-from backend.controllers.material_controller import get_all_materiales
-from frontend.gui.cart_view import build_cart_frame
+from backend.controllers.material_controller import get_all_material
+from backend.controllers.cart_controller import (
+    agregar_al_carrito, quitar_del_carrito, get_carrito, confirmar_pedido, calculate_total
+)
+from backend.services.stock_service import StockInsuficienteError
 
-def build_material_frame(on_cart_view=None):
-    st.title("🧱 Catálogo de Materiales")
 
-    # Inicializar el carrito en el estado de sesión
-    if "cart" not in st.session_state:
-        st.session_state.cart = []
+def _carrito_id():
+    # Los apartados se guardan en MongoDB; la sesión sólo recuerda de qué carrito son
+    if "carrito_id" not in st.session_state:
+        st.session_state.carrito_id = uuid.uuid4().hex
+    return st.session_state.carrito_id
+
+
+def _mostrar_carrito(carrito_id, user_id):
+    items = get_carrito(carrito_id)
+    st.subheader("🛒 Carrito")
+    if not items:
+        st.info("El carrito está vacío o sus apartados vencieron.")
+        return
+
+    for item in items:
+        col1, col2, col3, col4 = st.columns([4, 2, 2, 2])
+        with col1:
+            st.markdown(f"**{item['name']}**")
+            st.caption(f"Apartado hasta {item['expira_en']:%H:%M:%S} UTC")
+        with col2:
+            st.markdown(f"x{item['quantity']}")
+        with col3:
+            st.markdown(f"${item['price'] * item['quantity']:.2f}")
+        with col4:
+            if st.button("Quitar", key=f"quitar_{item['material_id']}"):
+                quitar_del_carrito(carrito_id, item["material_id"])
+                st.rerun()
+
+    st.markdown(f"**Total: ${calculate_total(items):.2f}** (precios vigentes)")
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("✅ Confirmar pedido", type="primary"):
+            try:
+                pedido_id = confirmar_pedido(carrito_id, user_id)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                # El carrito ya se convirtió: el siguiente empieza vacío
+                st.session_state.pop("carrito_id", None)
+                st.success(f"Pedido {pedido_id} registrado")
+    with col2:
+        if st.button("🗑️ Vaciar carrito"):
+            quitar_del_carrito(carrito_id)
+            st.rerun()
+
+
+def build_material_frame(on_cart_view=None):
+    st.title("🛒 Pedidos de Materiales")
+    carrito_id = _carrito_id()
 
-    materiales = get_all_materiales(limit=20)
+    materiales = get_all_material(limit=20)
 
     for material in materiales:
         col1, col2, col3, col4 = st.columns([4, 2, 2, 2])
@@ -22,21 +70,18 @@ def build_material_frame(on_cart_view=None):
             st.markdown(f"📦 {material.get('existencia', 0)} en stock")
         with col4:
             if st.button("Agregar", key=str(material["_id"])):
-                # Buscar si ya está en el carrito
-                for item in st.session_state.cart:
-                    if item["_id"] == material["_id"]:
-                        item["quantity"] += 1
-                        break
+                try:
+                    agregar_al_carrito(carrito_id, material["_id"])
+                except StockInsuficienteError:
+                    st.warning("Sin existencia disponible: otro carrito apartó las últimas unidades.")
+                except ValueError as e:
+                    st.error(str(e))
                 else:
-                    st.session_state.cart.append({
-                        **material,
-                        "quantity": 1
-                    })
-                st.success(f"{material.get('descripcion', 'Material')} agregado al carrito")
+                    st.success(f"{material.get('descripcion', 'Material')} apartado en el carrito")
 
     st.markdown("---")
-    if st.button("🛒 Ver carrito"):
-        if on_cart_view:
-            on_cart_view(st.session_state.cart)
-        else:
-            build_cart_frame(st.session_state.cart)
+    user = st.session_state.get("user") or {}
+    if on_cart_view:
+        on_cart_view(get_carrito(carrito_id))
+    else:
+        _mostrar_carrito(carrito_id, user.get("correo"))
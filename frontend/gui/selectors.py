@@ -0,0 +1,64 @@
+# frontend/gui/selectors.py
+#
+# Selector con búsqueda en el servidor para las pantallas de edición y
+# borrado: en vez de leer toda la colección para llenar un st.selectbox, se
+# consulta el controlador con el prefijo escrito (≤20 opciones ligeras) y sólo
+# se lee completo el documento elegido, por _id.
+
+import streamlit as st
+
+OPCION_VACIA = "-- Selecciona --"
+MAX_BUSQUEDAS_RECORDADAS = 20
+
+
+def selector_remoto(etiqueta, key, buscar, obtener, formato,
+                    placeholder="Escribe para buscar...", min_caracteres=1):
+    """
+    Devuelve el documento elegido o None.
+
+    buscar(prefijo) -> lista de documentos ligeros con "_id"
+    obtener(_id)    -> documento completo
+    formato(doc)    -> texto de cada opción
+
+    st.text_input sólo provoca un rerun al presionar Enter o salir del campo,
+    y cada prefijo se recuerda en la sesión, así que escribir no genera una
+    consulta por tecla ni los reruns posteriores repiten la búsqueda.
+    """
+    prefijo = st.text_input(etiqueta, key=f"{key}_prefijo", placeholder=placeholder).strip()
+    if len(prefijo) < min_caracteres:
+        st.caption("💡 Escribe el inicio de la clave, nombre o correo y presiona Enter")
+        return None
+
+    memo = st.session_state.setdefault(f"{key}_memo", {})
+    if prefijo not in memo:
+        if len(memo) >= MAX_BUSQUEDAS_RECORDADAS:
+            memo.pop(next(iter(memo)))
+        memo[prefijo] = buscar(prefijo)
+    opciones = memo[prefijo]
+
+    if not opciones:
+        st.info(f"🔍 Sin coincidencias para '{prefijo}'")
+        return None
+
+    etiquetas = {o["_id"]: formato(o) for o in opciones}
+    elegido = st.selectbox(
+        f"Resultados ({len(opciones)})",
+        [None] + list(etiquetas),
+        format_func=lambda i: OPCION_VACIA if i is None else etiquetas[i],
+        key=f"{key}_opcion"
+    )
+    if elegido is None:
+        return None
+
+    # El documento completo se lee una vez por selección y se conserva entre reruns
+    documento = st.session_state.get(f"{key}_doc")
+    if documento is None or documento["_id"] != elegido:
+        documento = obtener(elegido)
+        st.session_state[f"{key}_doc"] = documento
+    return documento
+
+
+def olvidar_seleccion(key):
+    """Descarta búsquedas y documento recordados (tras guardar o eliminar)."""
+    st.session_state.pop(f"{key}_memo", None)
+    st.session_state.pop(f"{key}_doc", None)
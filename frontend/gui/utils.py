@@ -16,3 +16,30 @@ def df_to_csv_bytes(df):
     csv_buffer = io.StringIO()
     df.to_csv(csv_buffer, index=False)
     return csv_buffer.getvalue().encode("utf-8")
+
+def merge_conflict_prompt(key, mis_cambios, actual, etiquetas):
+    """
+    Muestra los campos que difieren entre mis cambios y la versión vigente y deja
+    elegir cuál conservar. Devuelve ("guardar", fusion), ("descartar", None) o (None, None).
+    """
+    st.warning("⚠️ Otro usuario modificó este registro mientras lo editabas. Elige qué valores conservar.")
+    fusion = dict(mis_cambios)
+    for campo, etiqueta in etiquetas.items():
+        mio, vigente = mis_cambios.get(campo), actual.get(campo)
+        if mio == vigente:
+            continue
+        opcion = st.radio(
+            etiqueta,
+            [0, 1],
+            format_func=lambda i, mio=mio, vigente=vigente: f"Mi valor: {mio}" if i == 0 else f"Valor actual: {vigente}",
+            horizontal=True,
+            key=f"{key}_{campo}"
+        )
+        fusion[campo] = mio if opcion == 0 else vigente
+
+    col1, col2 = st.columns(2)
+    if col1.button("💾 Guardar fusión", key=f"{key}_save", use_container_width=True):
+        return "guardar", fusion
+    if col2.button("↩️ Descartar mis cambios", key=f"{key}_discard", use_container_width=True):
+        return "descartar", None
+    return None, None
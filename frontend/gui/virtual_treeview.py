@@ -0,0 +1,150 @@
+# frontend/gui/virtual_treeview.py
+#
+# ttk.Treeview virtual: sólo existen tantos items como filas caben en la
+# ventana. Al desplazarse se reescriben sus valores con la porción visible de
+# los datos, así una lista de 100 000 materiales cuesta lo mismo que una de 30.
+# La barra de desplazamiento y la rueda del ratón mueven un desplazamiento
+# propio, no el yview del Treeview.
+
+import ttkbootstrap as ttk
+
+ALTO_FILA = 22
+
+
+class VirtualTreeview(ttk.Frame):
+    """
+    Lista de sólo lectura sobre una secuencia de filas. `columnas` es una lista
+    de (nombre, ancho); `valores(fila)` convierte una fila en la tupla que se
+    muestra (por defecto la fila misma).
+    """
+
+    def __init__(self, parent, columnas, valores=None, al_seleccionar=None, **kwargs):
+        super().__init__(parent, **kwargs)
+        self._datos = []
+        self._valores = valores or tuple
+        self._al_seleccionar = al_seleccionar
+        self._inicio = 0
+        self._visibles = 0
+        self._seleccion = None
+        # True mientras llega el <<TreeviewSelect>> que provocó _pintar
+        self._pintando = False
+
+        nombres = [nombre for nombre, _ in columnas]
+        self.tree = ttk.Treeview(self, columns=nombres, show="headings", selectmode="browse", height=1)
+        for nombre, ancho in columnas:
+            self.tree.heading(nombre, text=nombre)
+            self.tree.column(nombre, width=ancho, stretch=True)
+        self.barra = ttk.Scrollbar(self, orient="vertical", command=self._desde_barra)
+        self.barra.pack(side="right", fill="y")
+        self.tree.pack(side="left", fill="both", expand=True)
+
+        self.tree.bind("<Configure>", self._al_redimensionar)
+        self.tree.bind("<<TreeviewSelect>>", self._al_cambiar_seleccion)
+        self.tree.bind("<MouseWheel>", lambda e: self._desplazar(-1 if e.delta > 0 else 1, "units"))
+        self.tree.bind("<Button-4>", lambda e: self._desplazar(-1, "units"))
+        self.tree.bind("<Button-5>", lambda e: self._desplazar(1, "units"))
+        for tecla, paso, unidad in (("<Up>", -1, "units"), ("<Down>", 1, "units"),
+                                    ("<Prior>", -1, "pages"), ("<Next>", 1, "pages")):
+            self.tree.bind(tecla, lambda e, p=paso, u=unidad: self._mover_seleccion(p, u))
+        self.tree.bind("<Home>", lambda e: self._ir_a(0))
+        self.tree.bind("<End>", lambda e: self._ir_a(len(self._datos) - 1))
+
+    # Datos
+
+    def set_datos(self, datos):
+        """Reemplaza las filas (cualquier secuencia indexable) y vuelve al inicio."""
+        self._datos = datos
+        self._inicio = 0
+        self._seleccion = None
+        self._pintar()
+
+    def __len__(self):
+        return len(self._datos)
+
+    def fila_seleccionada(self):
+        if self._seleccion is None or self._seleccion >= len(self._datos):
+            return None
+        return self._datos[self._seleccion]
+
+    # Geometría y desplazamiento
+
+    def _alto_fila(self):
+        alto = ttk.Style().lookup("Treeview", "rowheight")
+        return int(alto) if alto else ALTO_FILA
+
+    def _al_redimensionar(self, evento):
+        # El encabezado ocupa aproximadamente una fila
+        visibles = max(evento.height // self._alto_fila() - 1, 1)
+        if visibles != self._visibles:
+            self._visibles = visibles
+            self.tree.configure(height=visibles)
+            self._pintar()
+
+    def _maximo_inicio(self):
+        return max(len(self._datos) - self._visibles, 0)
+
+    def _desplazar(self, cantidad, unidad):
+        paso = cantidad * (self._visibles if unidad == "pages" else 3 if unidad == "units" else 1)
+        self._inicio = min(max(self._inicio + paso, 0), self._maximo_inicio())
+        self._pintar()
+        return "break"
+
+    def _desde_barra(self, accion, cantidad, unidad=None):
+        if accion == "moveto":
+            self._inicio = min(max(int(float(cantidad) * len(self._datos)), 0), self._maximo_inicio())
+            self._pintar()
+        else:
+            self._desplazar(int(cantidad), unidad)
+
+    def _ir_a(self, indice):
+        if not self._datos:
+            return "break"
+        self._seleccion = min(max(indice, 0), len(self._datos) - 1)
+        if self._seleccion < self._inicio:
+            self._inicio = self._seleccion
+        elif self._seleccion >= self._inicio + self._visibles:
+            self._inicio = self._seleccion - self._visibles + 1
+        self._pintar()
+        if self._al_seleccionar:
+            self._al_seleccionar(self.fila_seleccionada())
+        return "break"
+
+    def _mover_seleccion(self, paso, unidad):
+        actual = self._inicio if self._seleccion is None else self._seleccion
+        return self._ir_a(actual + paso * (self._visibles if unidad == "pages" else 1))
+
+    # Pintado
+
+    def _pintar(self):
+        """Ajusta los items existentes a la porción visible: nunca crea más que _visibles."""
+        items = self.tree.get_children()
+        fin = min(self._inicio + self._visibles, len(self._datos))
+        necesarios = fin - self._inicio
+        for i in range(len(items), necesarios):
+            self.tree.insert("", "end", iid=str(i))
+        for iid in items[necesarios:]:
+            self.tree.delete(iid)
+        for i in range(necesarios):
+            self.tree.item(str(i), values=self._valores(self._datos[self._inicio + i]))
+
+        visible = self._seleccion is not None and self._inicio <= self._seleccion < fin
+        seleccion = (str(self._seleccion - self._inicio),) if visible else ()
+        if tuple(self.tree.selection()) != seleccion:
+            self._pintando = True
+            self.tree.selection_set(seleccion)
+
+        total = len(self._datos)
+        if total:
+            self.barra.set(self._inicio / total, fin / total)
+        else:
+            self.barra.set(0, 1)
+
+    def _al_cambiar_seleccion(self, _evento):
+        if self._pintando:
+            self._pintando = False
+            return
+        seleccion = self.tree.selection()
+        if seleccion:
+            self._seleccion = self._inicio + int(seleccion[0])
+            if self._al_seleccionar:
+                self._al_seleccionar(self.fila_seleccionada())
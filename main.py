@@ -1,9 +1,23 @@
 import streamlit as st
+from backend.services.instrumentation import instrumentar_controladores, medir_rerun
+from backend.services.query_log import activar_registro_consultas
+from backend.services.profiler import perfilar
+from backend.services.reserva_service import iniciar_barrendero
+
+# Debe ir antes de importar la GUI: las vistas hacen `from controlador import funcion`
+instrumentar_controladores()
+activar_registro_consultas()
+# Devuelve al inventario los apartados de carritos vencidos (un hilo por proceso)
+iniciar_barrendero()
+
 from frontend.gui.auth_view import build_auth_frame
 from frontend.gui.user_view import build_user_frame
 from frontend.gui.material_window import build_material_frame
+# Catálogo con apartado de existencias y carrito de pedidos
+from frontend.gui.product_window import build_material_frame as build_pedidos_frame
 from frontend.gui.admin_view import build_admin_frame
 from frontend.gui.lugares_window import build_lugar_frame
+from frontend.gui.fallas_window import build_falla_frame
 from frontend.gui.analytics_view import mostrar_analytics  # 🆕 NUEVO IMPORT
 
 
@@ -25,13 +39,14 @@ def main():
             else:
                 st.experimental_rerun()
 
-        build_auth_frame(on_success)
+        with medir_rerun("Login"):
+            build_auth_frame(on_success)
 
     else:
         user = st.session_state.user
 
         # Opciones base del menú
-        opciones = ["Catálogo de Materiales", "Lugares", "Perfil",   "📊 Analytics"]  
+        opciones = ["Catálogo de Materiales", "🛒 Pedidos", "Lugares", "Fallas", "Perfil",   "📊 Analytics"]  
         # Solo los administradores ven el panel de administración
         if user.get("role") == "admin":
             opciones.append("Administración")
@@ -39,17 +54,29 @@ def main():
         # Menú lateral
         menu = st.sidebar.selectbox("Menú", opciones)
 
+        # Perfilado opcional: ?perfil=cprofile|muestreo o el selector de ⚡ Rendimiento.
+        # El parámetro de la URL sólo cuenta para administradores: cualquiera podría editarlo
+        perfil_url = st.query_params.get("perfil") if user.get("role") == "admin" else None
+        modo_perfil = perfil_url or st.session_state.get("perfilado")
+        # Las vistas (p. ej. el peso de las figuras) leen el modo ya validado
+        st.session_state.modo_perfil = modo_perfil
+
         # Rutas de navegación según menú
-        if menu == "Catálogo de Materiales":
-            build_material_frame()
-        elif menu == "Lugares":
-            build_lugar_frame()
-        elif menu == "Perfil":
-            build_user_frame(user)
-        elif menu == "📊 Analytics":  
-            mostrar_analytics()
-        elif menu == "Administración":
-            build_admin_frame()
+        with medir_rerun(menu) as rerun, perfilar(menu, modo_perfil, rerun, user.get("correo")):
+            if menu == "Catálogo de Materiales":
+                build_material_frame()
+            elif menu == "🛒 Pedidos":
+                build_pedidos_frame()
+            elif menu == "Lugares":
+                build_lugar_frame()
+            elif menu == "Fallas":
+                build_falla_frame()
+            elif menu == "Perfil":
+                build_user_frame(user)
+            elif menu == "📊 Analytics":  
+                mostrar_analytics()
+            elif menu == "Administración":
+                build_admin_frame()
 
         # Botón para cerrar sesión
         if st.sidebar.button("Cerrar sesión"):